@@ -1,17 +1,19 @@
 """
 Admin API Endpoints for Dashboard
 Provides comprehensive analytics, user management, and business insights.
-Uses Supabase Postgres via psycopg2.
+Uses Supabase Postgres via psycopg (read-only pooled connections).
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional, List, Dict
 from pydantic import BaseModel
 import os
-from psycopg2.extras import RealDictCursor
+from datetime import datetime, timezone
+from psycopg.rows import dict_row
 from database import (
     get_db_connection, list_api_keys, get_usage_stats,
     update_plan, deactivate_api_key
 )
+from usage_rollups import days_ago, usage_source_sql, window_params
 import logging
 
 def get_logger(name):
@@ -56,8 +58,8 @@ def get_analytics_summary(
     admin: bool = Depends(require_admin)
 ):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             cur.execute("SELECT COUNT(DISTINCT id) as count FROM profiles")
             total_users = cur.fetchone()['count']
@@ -73,16 +75,16 @@ def get_analytics_summary(
             """, (days,))
             active_users = cur.fetchone()['count']
 
-            cur.execute("""
+            window = window_params(cur, days_ago(days))
+            cur.execute(f"""
                 SELECT
-                    COALESCE(SUM(request_count), 0) as total_requests,
-                    COALESCE(SUM(cache_hits), 0) as total_hits,
-                    COALESCE(SUM(cache_misses), 0) as total_misses,
-                    COALESCE(SUM(tokens_used), 0) as total_tokens,
-                    COALESCE(SUM(cost_estimate), 0) as total_cost
-                FROM usage_logs
-                WHERE logged_at >= NOW() - INTERVAL '1 day' * %s
-            """, (days,))
+                    COALESCE(SUM(request_count), 0)::bigint as total_requests,
+                    COALESCE(SUM(cache_hits), 0)::bigint as total_hits,
+                    COALESCE(SUM(cache_misses), 0)::bigint as total_misses,
+                    COALESCE(SUM(tokens_used), 0)::bigint as total_tokens,
+                    COALESCE(SUM(cost_estimate), 0)::float8 as total_cost
+                FROM {usage_source_sql(window)} u
+            """, window)
             usage = cur.fetchone()
 
             total_requests = usage['total_requests'] or 0
@@ -113,8 +115,8 @@ def get_user_growth(
     admin: bool = Depends(require_admin)
 ):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             if period == "daily":
                 date_expr = "DATE(created_at)"
@@ -167,8 +169,8 @@ def get_user_growth(
 @admin_router.get("/analytics/plan-distribution")
 def get_plan_distribution(admin: bool = Depends(require_admin)):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             cur.execute("""
                 SELECT plan, COUNT(*) as count, COALESCE(SUM(usage_count), 0) as total_requests
@@ -178,13 +180,18 @@ def get_plan_distribution(admin: bool = Depends(require_admin)):
             plans = [dict(row) for row in cur.fetchall()]
             total_active = sum(p['count'] for p in plans)
 
-            cur.execute("""
-                SELECT ak.plan, COALESCE(SUM(ul.cost_estimate), 0) as total_cost
+            window = window_params(cur, datetime(1970, 1, 1, tzinfo=timezone.utc))
+            cur.execute(f"""
+                SELECT ak.plan, COALESCE(SUM(ul.cost), 0)::float8 as total_cost
                 FROM api_keys ak
-                LEFT JOIN usage_logs ul ON ak.api_key = ul.api_key
+                LEFT JOIN (
+                    SELECT api_key, SUM(cost_estimate) as cost
+                    FROM {usage_source_sql(window)} u
+                    GROUP BY api_key
+                ) ul ON ak.api_key = ul.api_key
                 WHERE ak.is_active = TRUE
                 GROUP BY ak.plan
-            """)
+            """, window)
             costs = {row['plan']: row['total_cost'] or 0 for row in cur.fetchall()}
 
             result = []
@@ -211,29 +218,29 @@ def get_usage_trends(
     admin: bool = Depends(require_admin)
 ):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             if period == "daily":
-                date_expr = "DATE(logged_at)"
+                date_expr = "DATE(bucket_start)"
             elif period == "weekly":
-                date_expr = "TO_CHAR(logged_at, 'IYYY-\"W\"IW')"
+                date_expr = "TO_CHAR(bucket_start, 'IYYY-\"W\"IW')"
             else:
-                date_expr = "TO_CHAR(logged_at, 'YYYY-MM')"
+                date_expr = "TO_CHAR(bucket_start, 'YYYY-MM')"
 
+            window = window_params(cur, days_ago(days))
             cur.execute(f"""
                 SELECT
                     {date_expr} as period,
-                    COALESCE(SUM(request_count), 0) as requests,
-                    COALESCE(SUM(cache_hits), 0) as hits,
-                    COALESCE(SUM(cache_misses), 0) as misses,
-                    COALESCE(SUM(tokens_used), 0) as tokens,
-                    COALESCE(SUM(cost_estimate), 0) as cost
-                FROM usage_logs
-                WHERE logged_at >= NOW() - INTERVAL '1 day' * %s
+                    COALESCE(SUM(request_count), 0)::bigint as requests,
+                    COALESCE(SUM(cache_hits), 0)::bigint as hits,
+                    COALESCE(SUM(cache_misses), 0)::bigint as misses,
+                    COALESCE(SUM(tokens_used), 0)::bigint as tokens,
+                    COALESCE(SUM(cost_estimate), 0)::float8 as cost
+                FROM {usage_source_sql(window)} u
                 GROUP BY {date_expr}
                 ORDER BY period ASC
-            """, (days,))
+            """, window)
 
             trends = []
             for row in cur.fetchall():
@@ -265,8 +272,8 @@ def get_top_users(
     admin: bool = Depends(require_admin)
 ):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             if sort_by == "usage_count":
                 order_by = "ak.usage_count DESC"
@@ -275,27 +282,31 @@ def get_top_users(
             else:
                 order_by = "total_cost DESC"
 
+            window = window_params(cur, days_ago(days))
             cur.execute(f"""
                 SELECT
                     ak.tenant_id, ak.api_key, ak.plan, ak.usage_count,
                     p.email, p.name,
                     ak.created_at, ak.last_used_at,
-                    COALESCE(SUM(ul.request_count), 0) as total_requests,
-                    COALESCE(SUM(ul.cache_hits), 0) as total_hits,
-                    COALESCE(SUM(ul.cache_misses), 0) as total_misses,
-                    COALESCE(SUM(ul.tokens_used), 0) as total_tokens,
-                    COALESCE(SUM(ul.cost_estimate), 0) as total_cost
+                    COALESCE(ul.requests, 0)::bigint as total_requests,
+                    COALESCE(ul.hits, 0)::bigint as total_hits,
+                    COALESCE(ul.misses, 0)::bigint as total_misses,
+                    COALESCE(ul.tokens, 0)::bigint as total_tokens,
+                    COALESCE(ul.cost, 0)::float8 as total_cost
                 FROM api_keys ak
                 LEFT JOIN profiles p ON ak.user_id = p.id
-                LEFT JOIN usage_logs ul ON ak.api_key = ul.api_key
-                    AND ul.logged_at >= NOW() - INTERVAL '1 day' * %s
+                LEFT JOIN (
+                    SELECT api_key,
+                           SUM(request_count) as requests, SUM(cache_hits) as hits,
+                           SUM(cache_misses) as misses, SUM(tokens_used) as tokens,
+                           SUM(cost_estimate) as cost
+                    FROM {usage_source_sql(window)} u
+                    GROUP BY api_key
+                ) ul ON ak.api_key = ul.api_key
                 WHERE ak.is_active = TRUE
-                GROUP BY ak.id, ak.tenant_id, ak.api_key, ak.plan,
-                         ak.usage_count, p.email, p.name,
-                         ak.created_at, ak.last_used_at
                 ORDER BY {order_by}
-                LIMIT %s
-            """, (days, limit))
+                LIMIT %(limit)s
+            """, {**window, "limit": limit})
 
             users = []
             for row in cur.fetchall():
@@ -334,8 +345,8 @@ def list_all_users(
     admin: bool = Depends(require_admin)
 ):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             if search:
                 cur.execute("""
@@ -398,8 +409,8 @@ def list_all_users(
 @admin_router.get("/users/{tenant_id}/details")
 def get_user_details(tenant_id: str, admin: bool = Depends(require_admin)):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             cur.execute("""
                 SELECT ak.*, p.email, p.name
@@ -423,18 +434,18 @@ def get_user_details(tenant_id: str, admin: bool = Depends(require_admin)):
             except Exception:
                 pass
 
-            cur.execute("""
+            window = window_params(cur, days_ago(7))
+            cur.execute(f"""
                 SELECT
-                    endpoint,
-                    COALESCE(SUM(request_count), 0) as requests,
-                    COALESCE(SUM(cache_hits), 0) as hits,
-                    COALESCE(SUM(cache_misses), 0) as misses,
-                    COALESCE(SUM(tokens_used), 0) as tokens,
-                    COALESCE(SUM(cost_estimate), 0) as cost
-                FROM usage_logs
-                WHERE tenant_id = %s AND logged_at >= NOW() - INTERVAL '7 days'
-                GROUP BY endpoint
-            """, (tenant_id,))
+                    NULLIF(endpoint, '') as endpoint,
+                    COALESCE(SUM(request_count), 0)::bigint as requests,
+                    COALESCE(SUM(cache_hits), 0)::bigint as hits,
+                    COALESCE(SUM(cache_misses), 0)::bigint as misses,
+                    COALESCE(SUM(tokens_used), 0)::bigint as tokens,
+                    COALESCE(SUM(cost_estimate), 0)::float8 as cost
+                FROM {usage_source_sql(window, "tenant_id = %(tenant_id)s")} u
+                GROUP BY NULLIF(endpoint, '')
+            """, {**window, "tenant_id": tenant_id})
             recent_activity = [dict(row) for row in cur.fetchall()]
 
             return {
@@ -481,16 +492,16 @@ def update_user_plan(
 @admin_router.post("/users/{tenant_id}/deactivate")
 def deactivate_user(tenant_id: str, admin: bool = Depends(require_admin)):
     try:
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
             cur.execute("SELECT api_key FROM api_keys WHERE tenant_id = %s", (tenant_id,))
             key_row = cur.fetchone()
-            if not key_row:
-                raise HTTPException(status_code=404, detail="Tenant not found")
-            success = deactivate_api_key(key_row['api_key'])
-            if success:
-                return {"success": True, "message": f"API key deactivated for tenant {tenant_id}"}
-            raise HTTPException(status_code=500, detail="Failed to deactivate")
+        if not key_row:
+            raise HTTPException(status_code=404, detail="Tenant not found")
+        success = deactivate_api_key(key_row['api_key'])
+        if success:
+            return {"success": True, "message": f"API key deactivated for tenant {tenant_id}"}
+        raise HTTPException(status_code=500, detail="Failed to deactivate")
     except HTTPException:
         raise
     except Exception as e:
@@ -505,8 +516,8 @@ def get_system_stats(admin: bool = Depends(require_admin)):
         total_tenants = len(svc_instance.tenants)
         total_entries = sum(len(t.rows) for t in svc_instance.tenants.values())
 
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
 
             cur.execute("SELECT COUNT(*) as count FROM profiles")
             total_users = cur.fetchone()['count']
@@ -514,14 +525,14 @@ def get_system_stats(admin: bool = Depends(require_admin)):
             cur.execute("SELECT COUNT(*) as count FROM api_keys WHERE is_active = TRUE")
             active_keys = cur.fetchone()['count']
 
-            cur.execute("""
+            window = window_params(cur, days_ago(1))
+            cur.execute(f"""
                 SELECT
-                    COALESCE(SUM(request_count), 0) as total_requests,
-                    COALESCE(SUM(cache_hits), 0) as total_hits,
-                    COALESCE(SUM(cache_misses), 0) as total_misses
-                FROM usage_logs
-                WHERE logged_at >= NOW() - INTERVAL '24 hours'
-            """)
+                    COALESCE(SUM(request_count), 0)::bigint as total_requests,
+                    COALESCE(SUM(cache_hits), 0)::bigint as total_hits,
+                    COALESCE(SUM(cache_misses), 0)::bigint as total_misses
+                FROM {usage_source_sql(window)} u
+            """, window)
             daily_stats = cur.fetchone()
 
         return {
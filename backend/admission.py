@@ -0,0 +1,298 @@
+"""
+Admission control and per-tenant fair scheduling for the cache-miss path.
+
+Hits are answered from memory and never pass through here. A miss holds a
+request thread for a whole LLM round trip, so when OpenAI slows down, or one
+tenant runs a cold-cache batch job, unbounded misses take every worker thread
+and starve hit traffic and health checks. MissAdmission bounds that work:
+
+  - at most MISS_MAX_CONCURRENCY misses call the LLM at once, and at most the
+    plan's max_misses_in_flight (billing.PLANS) per tenant;
+  - further misses wait in per-tenant FIFO queues. Freed slots are handed out
+    by deficit round-robin: each visit credits a tenant MISS_DRR_QUANTUM x its
+    plan's miss_weight, and a queued miss costs its estimated prompt tokens,
+    so under contention tenants share the LLM in proportion to their weight
+    however large their requests are;
+  - a miss is shed immediately, without taking a thread for the wait, when
+    the queue holds MISS_MAX_QUEUE misses or its expected wait (queue depth
+    x observed miss latency / concurrency) exceeds MISS_MAX_QUEUE_WAIT_SECONDS
+    (503), or when its tenant already has MISS_TENANT_MAX_QUEUE misses
+    queued (429). Both carry a Retry-After.
+  - optional LLM work (speculative calls, background refreshes) takes a slot
+    only if one is free right away, and is skipped otherwise.
+
+MISS_MAX_CONCURRENCY + MISS_MAX_QUEUE should stay below the server's worker
+threads (40 for Starlette's default threadpool) so hits always find one.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+from upstream import UpstreamBusy
+
+logger = logging.getLogger("semantis.admission")
+
+MISS_MAX_CONCURRENCY = int(os.getenv("MISS_MAX_CONCURRENCY", "16"))
+MISS_MAX_QUEUE = int(os.getenv("MISS_MAX_QUEUE", "16"))
+MISS_TENANT_MAX_QUEUE = int(os.getenv("MISS_TENANT_MAX_QUEUE", "8"))
+MISS_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("MISS_MAX_QUEUE_WAIT_SECONDS", "5"))
+MISS_DRR_QUANTUM = float(os.getenv("MISS_DRR_QUANTUM", "256"))  # estimated tokens per weight unit
+
+# Weight of the newest sample in the miss service time estimate
+_LATENCY_ALPHA = 0.1
+
+
+class Overloaded(UpstreamBusy):
+    """A miss was shed: the server (503) or the tenant's share of the queue (429) is full."""
+
+    def __init__(self, message: str, retry_after: float = 1.0, status_code: int = 503):
+        super().__init__(message, retry_after=retry_after)
+        self.status_code = status_code
+
+
+class _Waiter:
+    __slots__ = ("cost", "event", "granted")
+
+    def __init__(self, cost: float):
+        self.cost = cost
+        self.event = threading.Event()
+        self.granted = False
+
+
+class _Tenant:
+    """Scheduling state and counters of one tenant."""
+
+    def __init__(self, plan: str = "free"):
+        self.queue: Deque[_Waiter] = deque()
+        self.deficit = 0.0
+        self.in_flight = 0
+        self.set_plan(plan)
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def set_plan(self, plan: str) -> None:
+        from billing import get_plan_limits
+        limits = get_plan_limits(plan)
+        self.plan = plan
+        self.weight = max(1, limits.get("miss_weight") or 1)
+        self.cap = limits.get("max_misses_in_flight")  # None: only the global limit applies
+
+    def below_cap(self) -> bool:
+        return self.cap is None or self.in_flight < self.cap
+
+    def as_dict(self) -> dict:
+        return {
+            "plan": self.plan,
+            "weight": self.weight,
+            "max_in_flight": self.cap,
+            "in_flight": self.in_flight,
+            "waiting": len(self.queue),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "wait_ms_avg": round(self.wait_ms_total / self.queued, 2) if self.queued else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 2),
+        }
+
+
+class MissAdmission:
+    """Bounded miss concurrency with plan-weighted deficit round-robin across tenants."""
+
+    def __init__(self, max_concurrency: int = MISS_MAX_CONCURRENCY, max_queue: int = MISS_MAX_QUEUE,
+                 tenant_max_queue: int = MISS_TENANT_MAX_QUEUE, max_wait: float = MISS_MAX_QUEUE_WAIT_SECONDS,
+                 quantum: float = MISS_DRR_QUANTUM):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.tenant_max_queue = max(0, tenant_max_queue)
+        self.max_wait = max_wait
+        self.quantum = max(1.0, quantum)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._tenants: Dict[str, _Tenant] = {}
+        self._active: "OrderedDict[str, _Tenant]" = OrderedDict()  # tenants with queued misses, DRR order
+        self._queued = 0
+        self._latency_s = 0.0  # EWMA of the time a miss holds its slot
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.shed_tenant = 0
+        self.queue_timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def set_plan(self, tenant_id: str, plan: Optional[str]) -> None:
+        """Record the tenant's billing plan, which sets its weight and in-flight cap."""
+        plan = plan or "free"
+        with self._lock:
+            ts = self._tenants.get(tenant_id)
+            if ts is None:
+                self._tenants[tenant_id] = _Tenant(plan)
+            elif ts.plan != plan:
+                ts.set_plan(plan)
+                self._dispatch()
+
+    def _tenant(self, tenant_id: str) -> _Tenant:
+        ts = self._tenants.get(tenant_id)
+        if ts is None:
+            ts = self._tenants[tenant_id] = _Tenant()
+        return ts
+
+    def _expected_wait(self) -> float:
+        return (self._queued + 1) * self._latency_s / self.max_concurrency
+
+    @contextmanager
+    def slot(self, tenant_id: str, cost: float = 1.0) -> Iterator[None]:
+        """Hold one miss slot for the body of the with block; raises Overloaded when shed."""
+        self.acquire(tenant_id, cost)
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.release(tenant_id, time.time() - started)
+
+    def try_acquire(self, tenant_id: str) -> bool:
+        """
+        Take a slot only if one is free right away (never queues or sheds);
+        for optional work such as speculative calls and background refreshes.
+        The caller must release() it.
+        """
+        with self._lock:
+            return self._take_free_slot(self._tenant(tenant_id))
+
+    def _take_free_slot(self, ts: _Tenant) -> bool:
+        # Queued misses of other tenants can only be waiting on their own caps
+        if self._in_flight < self.max_concurrency and ts.below_cap() and not ts.queue:
+            self._in_flight += 1
+            ts.in_flight += 1
+            self.admitted += 1
+            ts.admitted += 1
+            return True
+        return False
+
+    def acquire(self, tenant_id: str, cost: float = 1.0) -> None:
+        with self._lock:
+            ts = self._tenant(tenant_id)
+            if self._take_free_slot(ts):
+                return
+            retry_after = max(1.0, self._expected_wait())
+            if len(ts.queue) >= self.tenant_max_queue:
+                self.shed_tenant += 1
+                ts.shed += 1
+                raise Overloaded(f"Tenant {tenant_id} has {len(ts.queue)} misses queued",
+                                 retry_after=retry_after, status_code=429)
+            if self._queued >= self.max_queue or self._expected_wait() > self.max_wait:
+                self.shed += 1
+                ts.shed += 1
+                raise Overloaded(f"Miss queue full ({self._queued} waiting)", retry_after=retry_after)
+            waiter = _Waiter(max(1.0, cost))
+            ts.queue.append(waiter)
+            if tenant_id not in self._active:
+                self._active[tenant_id] = ts
+            self._queued += 1
+            self.queued += 1
+            ts.queued += 1
+
+        t0 = time.time()
+        if not waiter.event.wait(self.max_wait):
+            with self._lock:
+                if not waiter.granted:
+                    self._remove(tenant_id, ts, waiter)
+                    self.queue_timeouts += 1
+                    ts.shed += 1
+                    raise Overloaded(f"Miss queued for more than {self.max_wait}s", retry_after=retry_after)
+        wait_ms = (time.time() - t0) * 1000
+        with self._lock:
+            self.admitted += 1
+            ts.admitted += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            ts.wait_ms_total += wait_ms
+            ts.wait_ms_max = max(ts.wait_ms_max, wait_ms)
+
+    def release(self, tenant_id: str, elapsed: float) -> None:
+        with self._lock:
+            if self._latency_s == 0.0:
+                self._latency_s = elapsed
+            else:
+                self._latency_s += _LATENCY_ALPHA * (elapsed - self._latency_s)
+            self._in_flight -= 1
+            self._tenants[tenant_id].in_flight -= 1
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant free slots to queued misses in deficit round-robin order."""
+        while self._in_flight < self.max_concurrency:
+            picked = self._next_waiter()
+            if picked is None:
+                return
+            ts, waiter = picked
+            self._in_flight += 1
+            ts.in_flight += 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def _next_waiter(self):
+        capped = 0
+        while self._active and capped < len(self._active):
+            tenant_id, ts = next(iter(self._active.items()))
+            if not ts.below_cap():
+                capped += 1
+                self._active.move_to_end(tenant_id)
+                continue
+            capped = 0
+            if ts.queue[0].cost <= ts.deficit:
+                waiter = ts.queue.popleft()
+                ts.deficit -= waiter.cost
+                self._queued -= 1
+                if not ts.queue:
+                    ts.deficit = 0.0
+                    del self._active[tenant_id]
+                return ts, waiter
+            ts.deficit += self.quantum * ts.weight
+            self._active.move_to_end(tenant_id)
+        return None
+
+    def _remove(self, tenant_id: str, ts: _Tenant, waiter: _Waiter) -> None:
+        try:
+            ts.queue.remove(waiter)
+        except ValueError:
+            return
+        self._queued -= 1
+        if not ts.queue:
+            ts.deficit = 0.0
+            self._active.pop(tenant_id, None)
+
+    def tenant_stats(self, tenant_id: str) -> dict:
+        with self._lock:
+            ts = self._tenants.get(tenant_id)
+            return ts.as_dict() if ts is not None else _Tenant().as_dict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "waiting": self._queued,
+                "tenants_waiting": len(self._active),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "shed": self.shed,
+                "shed_tenant": self.shed_tenant,
+                "queue_timeouts": self.queue_timeouts,
+                "wait_ms_avg": round(self.wait_ms_total / self.queued, 2) if self.queued else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 2),
+                "miss_latency_ms": round(self._latency_s * 1000, 2),
+                "tenants": {tid: ts.as_dict() for tid, ts in self._tenants.items()
+                            if ts.in_flight or ts.queue or ts.queued},
+            }
+
+
+admission = MissAdmission()
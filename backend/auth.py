@@ -6,12 +6,16 @@ Supports both:
   - Legacy HS256 shared secret (fallback)
 
 All signup/login/password-reset is handled client-side by @supabase/supabase-js.
-The backend only verifies incoming Supabase JWT tokens.
+The backend only verifies incoming Supabase JWT tokens. Verified payloads are
+cached by token hash until the token's `exp`, so a polling dashboard pays for
+one signature check per token rather than one per request.
 """
 import os
 import time
+import hashlib
 import threading
-from typing import Optional, Dict
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
 from jose import jwt, JWTError
 import requests
 
@@ -24,6 +28,11 @@ _jwks_cache_time: float = 0
 _jwks_lock = threading.Lock()
 _JWKS_CACHE_TTL = 600  # 10 minutes
 
+# Verified token cache: sha256(token) -> (exp, payload), LRU-bounded
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+_token_cache: "OrderedDict[bytes, Tuple[float, Dict]]" = OrderedDict()
+_token_lock = threading.Lock()
+
 
 def _get_jwks() -> Dict:
     """Fetch and cache the JWKS from Supabase's discovery endpoint."""
@@ -83,15 +92,61 @@ def _get_signing_key_from_jwks(token: str) -> Optional[Dict]:
     return None
 
 
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def _cached_payload(key: bytes) -> Optional[Dict]:
+    with _token_lock:
+        hit = _token_cache.get(key)
+        if hit is None:
+            return None
+        exp, payload = hit
+        if exp <= time.time():
+            del _token_cache[key]
+            return None
+        _token_cache.move_to_end(key)
+        return dict(payload)
+
+
+def _cache_payload(key: bytes, payload: Dict) -> None:
+    exp = payload.get("exp")
+    if JWT_CACHE_SIZE <= 0 or not isinstance(exp, (int, float)):
+        return
+    with _token_lock:
+        _token_cache[key] = (float(exp), dict(payload))
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > JWT_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+
+def forget_token(token: str) -> None:
+    """Drop a token from the verification cache (e.g. on logout)."""
+    with _token_lock:
+        _token_cache.pop(_token_key(token), None)
+
+
 def verify_token(token: str) -> Optional[Dict]:
     """
     Verify a Supabase JWT access token.
 
-    Tries JWKS-based verification first (ES256/RS256), then falls back
-    to the legacy HS256 shared secret if configured.
+    A token that was already verified is answered from the cache until its
+    `exp`. Otherwise tries JWKS-based verification first (ES256/RS256), then
+    falls back to the legacy HS256 shared secret if configured.
 
     Returns the decoded payload or None if invalid/expired.
     """
+    key = _token_key(token)
+    payload = _cached_payload(key)
+    if payload is not None:
+        return payload
+    payload = _verify_token_signature(token)
+    if payload is not None:
+        _cache_payload(key, payload)
+    return payload
+
+
+def _verify_token_signature(token: str) -> Optional[Dict]:
     # Strategy 1: JWKS-based verification (asymmetric keys)
     if SUPABASE_URL:
         jwk = _get_signing_key_from_jwks(token)
@@ -41,6 +41,8 @@ def is_enabled() -> bool:
 
 # ── Plan definitions ──
 
+# miss_weight: share of the LLM miss queue under contention (admission.py);
+# max_misses_in_flight: concurrent misses per tenant, None for no own cap
 PLANS = {
     "free": {
         "name": "Free",
@@ -51,6 +53,8 @@ PLANS = {
         "byok_required": False,
         "audit_logs": False,
         "custom_threshold": False,
+        "miss_weight": 1,
+        "max_misses_in_flight": 2,
     },
     "pro": {
         "name": "Pro",
@@ -61,6 +65,8 @@ PLANS = {
         "byok_required": False,
         "audit_logs": False,
         "custom_threshold": True,
+        "miss_weight": 4,
+        "max_misses_in_flight": 6,
     },
     "team": {
         "name": "Team",
@@ -71,6 +77,8 @@ PLANS = {
         "byok_required": False,
         "audit_logs": True,
         "custom_threshold": True,
+        "miss_weight": 8,
+        "max_misses_in_flight": 12,
     },
     "enterprise": {
         "name": "Enterprise",
@@ -81,6 +89,8 @@ PLANS = {
         "byok_required": True,
         "audit_logs": True,
         "custom_threshold": True,
+        "miss_weight": 16,
+        "max_misses_in_flight": None,
     },
 }
 
@@ -3,6 +3,7 @@ Cache Persistence Module
 Saves and loads cache data to/from disk for persistence across restarts.
 """
 import os
+import re
 import pickle
 import json
 import time
@@ -15,6 +16,10 @@ from datetime import datetime
 CACHE_DIR = "cache_data"
 CACHE_FILE = os.path.join(CACHE_DIR, "cache.pkl")
 KEYS_FILE = os.path.join(CACHE_DIR, "api_keys.json")
+TENANTS_DIR = os.path.join(CACHE_DIR, "tenants")
+
+# Generations kept on disk per tenant; older ones may still be mmap'd by readers
+SNAPSHOT_KEEP_GENERATIONS = 3
 
 def ensure_cache_dir():
     """Ensure cache directory exists."""
@@ -57,7 +62,7 @@ def save_cache(tenants: Dict, filepath: str = CACHE_FILE):
             entry_dict = {
                 "prompt_norm": entry.prompt_norm,
                 "response_text": entry.response_text,
-                "embedding": entry.embedding.tolist(),  # Convert numpy array to list
+                "embedding": entry.embedding.tolist() if entry.embedding is not None else None,  # Convert numpy array to list
                 "model": entry.model,
                 "ttl_seconds": entry.ttl_seconds,
                 "created_at": entry.created_at,
@@ -74,7 +79,7 @@ def save_cache(tenants: Dict, filepath: str = CACHE_FILE):
             exact_cache_data[key] = {
                 "prompt_norm": entry.prompt_norm,
                 "response_text": entry.response_text,
-                "embedding": entry.embedding.tolist(),
+                "embedding": entry.embedding.tolist() if entry.embedding is not None else None,
                 "model": entry.model,
                 "ttl_seconds": entry.ttl_seconds,
                 "created_at": entry.created_at,
@@ -130,63 +135,36 @@ def load_cache(filepath: str = CACHE_FILE):
             cache_data = pickle.load(f)
         
         # Reconstruct tenant states
-        from semantic_cache_server import TenantState, CacheEntry, CacheEvent
+        from semantic_cache_server import TenantState, CacheEvent
+        from columnar_store import ColumnarStore
+        
+        def _fields(entry_data):
+            embedding = entry_data.get("embedding")
+            return dict(
+                prompt_norm=entry_data["prompt_norm"],
+                response_text=entry_data["response_text"],
+                embedding=np.array(embedding, dtype="float32") if embedding is not None else None,
+                model=entry_data["model"],
+                ttl_seconds=entry_data["ttl_seconds"],
+                created_at=entry_data["created_at"],
+                last_used_at=entry_data.get("last_used_at", time.time()),
+                use_count=entry_data.get("use_count", 0),
+                domain=entry_data.get("domain", "general"),
+                strategy=entry_data.get("strategy", "miss"),
+            )
         
         tenants = {}
         for tenant_id, tenant_data in cache_data.get("tenants", {}).items():
-            # Reconstruct exact cache
-            exact_cache = {}
-            for key, entry_data in tenant_data.get("exact", {}).items():
-                entry = CacheEntry(
-                    prompt_norm=entry_data["prompt_norm"],
-                    response_text=entry_data["response_text"],
-                    embedding=np.array(entry_data["embedding"]),
-                    model=entry_data["model"],
-                    ttl_seconds=entry_data["ttl_seconds"],
-                    created_at=entry_data["created_at"],
-                    last_used_at=entry_data.get("last_used_at", time.time()),
-                    use_count=entry_data.get("use_count", 0),
-                    domain=entry_data.get("domain", "general"),
-                    strategy=entry_data.get("strategy", "miss"),
-                )
-                exact_cache[key] = entry
-            
-            # Reconstruct rows
-            rows = []
+            # Rows (in FAISS order) rebuild the columns and the index
+            store = ColumnarStore()
             for entry_data in tenant_data.get("rows", []):
-                entry = CacheEntry(
-                    prompt_norm=entry_data["prompt_norm"],
-                    response_text=entry_data["response_text"],
-                    embedding=np.array(entry_data["embedding"]),
-                    model=entry_data["model"],
-                    ttl_seconds=entry_data["ttl_seconds"],
-                    created_at=entry_data["created_at"],
-                    last_used_at=entry_data.get("last_used_at", time.time()),
-                    use_count=entry_data.get("use_count", 0),
-                    domain=entry_data.get("domain", "general"),
-                    strategy=entry_data.get("strategy", "miss"),
-                )
-                rows.append(entry)
-            
-            # Reconstruct FAISS index
-            index = None
-            dim = tenant_data.get("dim")
-            if dim and len(rows) > 0:
-                # Create FAISS index
-                index = faiss.IndexFlatIP(dim)
-                # Add embeddings to index (must match order of rows)
-                embeddings_list = []
-                for entry in rows:
-                    if entry.embedding is not None:
-                        embeddings_list.append(entry.embedding)
-                
-                if embeddings_list:
-                    embeddings = np.array(embeddings_list).astype('float32')
-                    # Ensure embeddings are normalized
-                    faiss.normalize_L2(embeddings)
-                    # Add to index
-                    index.add(embeddings)
-                    print(f"Reconstructed FAISS index with {len(embeddings_list)} vectors for tenant {tenant_id}")
+                store.add(**_fields(entry_data))
+            # Exact-only entries that never made it into the index
+            for key, entry_data in tenant_data.get("exact", {}).items():
+                if key not in store.exact:
+                    store.add(**_fields(entry_data), index_vector=False)
+            if store.nvec:
+                print(f"Reconstructed FAISS index with {store.nvec} vectors for tenant {tenant_id}")
             
             # Reconstruct events
             events = []
@@ -205,10 +183,7 @@ def load_cache(filepath: str = CACHE_FILE):
             
             # Create tenant state
             tenant_state = TenantState(
-                exact=exact_cache,
-                index=index,
-                rows=rows,
-                dim=dim,
+                store=store,
                 hits=tenant_data.get("hits", 0),
                 misses=tenant_data.get("misses", 0),
                 semantic_hits=tenant_data.get("semantic_hits", 0),
@@ -227,6 +202,193 @@ def load_cache(filepath: str = CACHE_FILE):
         print(f"Error loading cache: {e}")
         return None
 
+# -----------------------------
+# Per-tenant snapshots (FAISS index file + entry metadata)
+# -----------------------------
+
+def _tenant_dir(tenant_id: str, base_dir: str = TENANTS_DIR) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", tenant_id)
+    return os.path.join(base_dir, safe)
+
+def current_generation(tenant_id: str, base_dir: str = TENANTS_DIR) -> int:
+    """Return the published snapshot generation for a tenant (0 if none)."""
+    try:
+        with open(os.path.join(_tenant_dir(tenant_id, base_dir), "CURRENT"), "r") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def list_snapshot_tenants(base_dir: str = TENANTS_DIR) -> List[str]:
+    """Return tenant ids that have a published snapshot."""
+    if not os.path.isdir(base_dir):
+        return []
+    tenant_ids = []
+    for name in os.listdir(base_dir):
+        meta_path = os.path.join(base_dir, name, "TENANT")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                tenant_ids.append(f.read().strip())
+    return tenant_ids
+
+def snapshot_tenant(tenant_state) -> Dict:
+    """
+    Capture a tenant's index bytes, text arena and entry columns in memory.
+
+    Cheap enough to run under the service lock; the slow disk write happens
+    afterwards in write_tenant_snapshot().
+    """
+    store = tenant_state.store
+    index_bytes = None
+    if store.index is not None and store.index.ntotal > 0:
+        index_bytes = faiss.serialize_index(store.index)
+    return {
+        "index": index_bytes,
+        "text": store.text.to_bytes(),
+        "store": store.to_state(),
+        "hits": tenant_state.hits,
+        "misses": tenant_state.misses,
+        "semantic_hits": tenant_state.semantic_hits,
+        "latencies_ms": list(tenant_state.latencies_ms[-1000:]),
+        "sim_threshold": tenant_state.sim_threshold,
+        "domain_thresholds": dict(getattr(tenant_state, 'domain_thresholds', {})),
+        # per-tenant settings (PUT /settings)
+        "speculative_llm": tenant_state.speculative_llm,
+        "speculative_max_hit_prob": tenant_state.speculative_max_hit_prob,
+        "stale_grace_seconds": tenant_state.stale_grace_seconds,
+        "refresh_ahead_seconds": tenant_state.refresh_ahead_seconds,
+        "refresh_min_uses": tenant_state.refresh_min_uses,
+        "admission_policy": tenant_state.admission_policy,
+        "sketch": tenant_state.sketch.to_state() if tenant_state.sketch is not None else None,
+        "events": [
+            {
+                "timestamp": e.timestamp,
+                "tenant_id": e.tenant_id,
+                "prompt_hash": e.prompt_hash,
+                "decision": e.decision,
+                "similarity": e.similarity,
+                "latency_ms": e.latency_ms,
+                "confidence": e.confidence,
+                "hybrid_score": e.hybrid_score,
+            }
+            for e in tenant_state.events
+        ],
+        "saved_at": time.time(),
+    }
+
+def write_tenant_snapshot(tenant_id: str, snapshot: Dict, base_dir: str = TENANTS_DIR) -> int:
+    """
+    Publish a snapshot as a new generation and atomically flip CURRENT to it.
+
+    Returns the new generation number.
+    """
+    tdir = _tenant_dir(tenant_id, base_dir)
+    os.makedirs(tdir, exist_ok=True)
+    gen = current_generation(tenant_id, base_dir) + 1
+    index_bytes = snapshot.pop("index", None)
+    text_bytes = snapshot.pop("text", b"")
+
+    if index_bytes is not None:
+        index_path = os.path.join(tdir, f"{gen:012d}.faiss")
+        with open(index_path + ".tmp", "wb") as f:
+            index_bytes.tofile(f)
+        os.replace(index_path + ".tmp", index_path)
+
+    text_path = os.path.join(tdir, f"{gen:012d}.text")
+    with open(text_path + ".tmp", "wb") as f:
+        f.write(text_bytes)
+    os.replace(text_path + ".tmp", text_path)
+
+    meta_path = os.path.join(tdir, f"{gen:012d}.pkl")
+    with open(meta_path + ".tmp", "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    with open(os.path.join(tdir, "TENANT"), "w") as f:
+        f.write(tenant_id)
+    with open(os.path.join(tdir, "CURRENT.tmp"), "w") as f:
+        f.write(str(gen))
+    os.replace(os.path.join(tdir, "CURRENT.tmp"), os.path.join(tdir, "CURRENT"))
+
+    # Drop old generations. Unlinking a file another process has mmap'd is
+    # safe on POSIX: the mapping stays valid until that process releases it.
+    for name in os.listdir(tdir):
+        stem = name.split(".")[0]
+        if stem.isdigit() and int(stem) <= gen - SNAPSHOT_KEEP_GENERATIONS:
+            try:
+                os.remove(os.path.join(tdir, name))
+            except OSError:
+                pass
+    return gen
+
+def load_tenant_snapshot(tenant_id: str, base_dir: str = TENANTS_DIR, mmap: bool = False):
+    """
+    Load the current snapshot generation for a tenant.
+
+    With mmap=True the FAISS index is opened with IO_FLAG_MMAP_IFC and the
+    text arena is mmap'd too, so vectors and prompt/response text are shared
+    through the OS page cache. Such an index is read-only: calling add() on
+    it aborts.
+
+    Returns (generation, TenantState) or (0, None) if no snapshot exists.
+    """
+    from semantic_cache_server import (
+        TenantState, CacheEvent, SPECULATIVE_LLM, SPECULATIVE_MAX_HIT_PROB,
+        STALE_GRACE_SECONDS, REFRESH_AHEAD_SECONDS, REFRESH_AHEAD_MIN_USES, CACHE_ADMISSION_POLICY,
+    )
+    from tinylfu import FrequencySketch
+    from columnar_store import ColumnarStore, map_text_file
+
+    gen = current_generation(tenant_id, base_dir)
+    if gen == 0:
+        return 0, None
+    tdir = _tenant_dir(tenant_id, base_dir)
+    with open(os.path.join(tdir, f"{gen:012d}.pkl"), "rb") as f:
+        snapshot = pickle.load(f)
+
+    index = None
+    index_path = os.path.join(tdir, f"{gen:012d}.faiss")
+    if os.path.exists(index_path):
+        flags = faiss.IO_FLAG_MMAP_IFC if mmap else 0
+        index = faiss.read_index(index_path, flags)
+
+    if "store" in snapshot:
+        text_path = os.path.join(tdir, f"{gen:012d}.text")
+        if mmap:
+            text = map_text_file(text_path)
+        else:
+            with open(text_path, "rb") as f:
+                text = f.read()
+        store = ColumnarStore.from_state(snapshot["store"], text_base=text, index=index)
+    else:
+        # Row-per-entry snapshot from before the columnar layout
+        store = ColumnarStore()
+        vectors = None
+        if index is not None:
+            vectors = faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+        rows = snapshot.get("rows", [])
+        for i, entry_data in enumerate(rows):
+            store.add(embedding=vectors[i] if vectors is not None else None, **entry_data)
+        store.exact = {key: i for key, i in snapshot.get("exact", {}).items() if i < len(rows)}
+
+    tenant_state = TenantState(
+        store=store,
+        hits=snapshot.get("hits", 0),
+        misses=snapshot.get("misses", 0),
+        semantic_hits=snapshot.get("semantic_hits", 0),
+        latencies_ms=snapshot.get("latencies_ms", []),
+        sim_threshold=snapshot.get("sim_threshold", 0.75),
+        domain_thresholds=snapshot.get("domain_thresholds", {}),
+        speculative_llm=snapshot.get("speculative_llm", SPECULATIVE_LLM),
+        speculative_max_hit_prob=snapshot.get("speculative_max_hit_prob", SPECULATIVE_MAX_HIT_PROB),
+        stale_grace_seconds=snapshot.get("stale_grace_seconds", STALE_GRACE_SECONDS),
+        refresh_ahead_seconds=snapshot.get("refresh_ahead_seconds", REFRESH_AHEAD_SECONDS),
+        refresh_min_uses=snapshot.get("refresh_min_uses", REFRESH_AHEAD_MIN_USES),
+        admission_policy=snapshot.get("admission_policy", CACHE_ADMISSION_POLICY),
+        sketch=FrequencySketch.from_state(snapshot["sketch"]) if snapshot.get("sketch") else None,
+        events=[CacheEvent(**e) for e in snapshot.get("events", [])],
+    )
+    return gen, tenant_state
+
 def save_api_keys(keys: List[Dict], filepath: str = KEYS_FILE):
     """
     Save API keys to JSON file.
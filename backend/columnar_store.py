@@ -0,0 +1,532 @@
+"""
+Columnar Store Module
+Struct-of-arrays storage for one tenant's cache entries.
+
+Instead of one Python object (with its own __dict__ and numpy array) per
+entry, a tenant keeps parallel numpy columns for timestamps, counters, TTLs
+and interned model/domain/strategy ids, a single byte arena for prompts and
+(deduplicated, compressed) response bodies, and the tenant's FAISS
+IndexFlatIP, whose contiguous float32
+storage doubles as the embedding matrix. CacheEntry objects are thin views
+over a row, created on demand; freshness and model filters are vectorized
+mask operations over the columns.
+"""
+import mmap
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from response_store import ResponseStore
+
+# name -> dtype for every per-row column
+COLUMNS = {
+    "created_at": np.float64,
+    "last_used_at": np.float64,
+    "use_count": np.int64,
+    "ttl_seconds": np.int64,
+    "expires_at": np.float64,  # created_at + ttl_seconds, for one-compare freshness
+    "model_id": np.int32,
+    "domain_id": np.int32,
+    "strategy_id": np.int8,
+    "prompt_off": np.int64,
+    "prompt_len": np.int32,
+    "response_id": np.int32,  # into the tenant's ResponseStore
+    "vec_pos": np.int64,  # position in the FAISS index, -1 if not indexed
+}
+
+_MIN_CAPACITY = 64
+
+# compacted() copies this many rows per hold of the store's lock
+_COMPACT_CHUNK = 256
+
+# search_eligible() over-fetches this many candidates per requested result
+# before falling back to an IDSelector-restricted search
+SEARCH_OVERFETCH = 4
+
+
+class Interner:
+    """Bidirectional str <-> small int table (models, domains, strategies)."""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self._ids: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def id(self, value: str) -> int:
+        i = self._ids.get(value)
+        if i is None:
+            i = len(self.values)
+            self.values.append(value)
+            self._ids[value] = i
+        return i
+
+    def get_id(self, value: str) -> int:
+        """Return the id for value, or -1 if it was never interned."""
+        return self._ids.get(value, -1)
+
+    def __getitem__(self, i: int) -> str:
+        return self.values[i]
+
+
+class TextArena:
+    """
+    Append-only UTF-8 text storage addressed by (offset, length).
+
+    The base can be a read-only mmap of a snapshot file, so text is shared
+    across processes; text appended afterwards goes to an in-process tail.
+    """
+
+    def __init__(self, base=b""):
+        self.base = base
+        self.base_len = len(base)
+        self.tail = bytearray()
+
+    def append_bytes(self, data: bytes) -> Tuple[int, int]:
+        off = self.base_len + len(self.tail)
+        self.tail += data
+        return off, len(data)
+
+    def get_bytes(self, off: int, length: int) -> bytes:
+        if off >= self.base_len:
+            off -= self.base_len
+            return bytes(self.tail[off:off + length])
+        return bytes(self.base[off:off + length])
+
+    def append(self, text: str) -> Tuple[int, int]:
+        return self.append_bytes(text.encode("utf-8"))
+
+    def get(self, off: int, length: int) -> str:
+        return self.get_bytes(off, length).decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return self.base_len + len(self.tail)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.base[:self.base_len]) + bytes(self.tail)
+
+
+class ColumnarStore:
+    """All cache entries of one tenant."""
+
+    def __init__(self, capacity: int = 0):
+        self.size = 0
+        self._capacity = 0
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        self.row_of_vec = np.zeros(0, dtype=np.int64)  # FAISS position -> row
+        self.models = Interner()
+        self.domains = Interner()
+        self.strategies = Interner()
+        self.text = TextArena()
+        self.responses = ResponseStore(self.text)
+        self.exact: Dict[str, int] = {}  # prompt_norm -> row
+        self.index: Optional[faiss.IndexFlatIP] = None
+        self.dim: Optional[int] = None
+        if capacity:
+            self._grow(capacity)
+
+    # ── Growth ──
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(_MIN_CAPACITY, self._capacity * 2, min_capacity)
+        for name, dtype in COLUMNS.items():
+            col = np.zeros(capacity, dtype=dtype)
+            col[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, col)
+        row_of_vec = np.zeros(capacity, dtype=np.int64)
+        row_of_vec[:len(self.row_of_vec)] = self.row_of_vec[:capacity]
+        self.row_of_vec = row_of_vec
+        self._capacity = capacity
+
+    # ── Writes ──
+
+    def add(
+        self,
+        prompt_norm: str,
+        response_text: str,
+        embedding: Optional[np.ndarray],
+        model: str,
+        ttl_seconds: int,
+        created_at: float,
+        last_used_at: Optional[float] = None,
+        use_count: int = 0,
+        domain: str = "general",
+        strategy: str = "miss",
+        index_vector: bool = True,
+    ) -> int:
+        """
+        Append a row and register it for exact lookup. With index_vector the
+        embedding is also added to the FAISS index (which must be writable,
+        i.e. not an mmap'd snapshot). Returns the row id.
+        """
+        row = self.size
+        if row >= self._capacity:
+            self._grow(row + 1)
+        self.created_at[row] = created_at
+        self.last_used_at[row] = created_at if last_used_at is None else last_used_at
+        self.use_count[row] = use_count
+        self.ttl_seconds[row] = ttl_seconds
+        self.expires_at[row] = created_at + ttl_seconds
+        self.model_id[row] = self.models.id(model)
+        self.domain_id[row] = self.domains.id(domain)
+        self.strategy_id[row] = self.strategies.id(strategy)
+        self.prompt_off[row], self.prompt_len[row] = self.text.append(prompt_norm)
+        self.response_id[row] = self.responses.put(response_text)
+        self.vec_pos[row] = -1
+        self.size = row + 1
+        if index_vector and embedding is not None:
+            self._add_vector(row, embedding)
+        self.exact[prompt_norm] = row
+        return row
+
+    def index_row(self, row: int, embedding: np.ndarray) -> None:
+        """Add the embedding of a row stored without one (exact-only) to the FAISS index."""
+        if self.vec_pos[row] < 0:
+            self._add_vector(row, embedding)
+
+    def _add_vector(self, row: int, embedding: np.ndarray) -> None:
+        v = np.asarray(embedding, dtype="float32").reshape(1, -1).copy()
+        faiss.normalize_L2(v)
+        if self.index is None:
+            self.dim = v.shape[1]
+            self.index = faiss.IndexFlatIP(self.dim)
+        pos = self.index.ntotal
+        # Map the position first: searches read row_of_vec without the cache lock
+        self.vec_pos[row] = pos
+        self.row_of_vec[pos] = row
+        self.index.add(v)
+
+    def touch(self, row: int, now: float) -> None:
+        self.use_count[row] += 1
+        self.last_used_at[row] = now
+
+    # ── Compaction ──
+
+    def compacted(self, size: int, redirect: np.ndarray, vectors: np.ndarray, exact: Dict[str, int],
+                  lock=None, pace: Optional[Callable[[], None]] = None) -> Tuple["ColumnarStore", np.ndarray]:
+        """
+        New store with the first `size` rows except those merged into another
+        (redirect[row] != row), and the row -> new row map in which merged rows
+        point at their survivor. `vectors` and `exact` are copies of the
+        embedding matrix and exact map taken when `size` was read: the live
+        ones change under concurrent inserts. The exact map is carried over
+        through the row map, so prompts of merged rows still hit exactly and
+        get their survivor's answer. Rows are read in chunks while holding
+        `lock` (the lock writers of this store hold), if given.
+        """
+        lock = lock if lock is not None else nullcontext()
+        new = ColumnarStore(capacity=size)
+        new_of = np.full(size, -1, dtype=np.int64)
+        kept = np.nonzero(redirect[:size] == np.arange(size))[0]
+        for start in range(0, len(kept), _COMPACT_CHUNK):
+            with lock:
+                if start == 0:
+                    new.responses._set_dictionary(self.responses.dictionary)
+                for row in kept[start:start + _COMPACT_CHUNK]:
+                    pos = int(self.vec_pos[row])
+                    new_of[row] = new.add(
+                        prompt_norm=self.prompt(row),
+                        response_text=self.response(row),
+                        embedding=vectors[pos] if 0 <= pos < len(vectors) else None,  # indexed later: left exact-only
+                        model=self.models[int(self.model_id[row])],
+                        ttl_seconds=int(self.ttl_seconds[row]),
+                        created_at=float(self.created_at[row]),
+                        last_used_at=float(self.last_used_at[row]),
+                        use_count=int(self.use_count[row]),
+                        domain=self.domains[int(self.domain_id[row])],
+                        strategy=self.strategies[int(self.strategy_id[row])],
+                    )
+            if pace is not None:
+                pace()
+        merged = new_of < 0
+        new_of[merged] = new_of[redirect[:size][merged]]
+        new.exact = {p: int(new_of[r]) for p, r in exact.items() if r < size}
+        return new, new_of
+
+    def merge_usage(self, source: "ColumnarStore", new_of: np.ndarray) -> None:
+        """Current use counts and last use of source's compacted rows, merged rows summed into their survivor."""
+        kept = int(new_of.max()) + 1 if len(new_of) else 0
+        self.use_count[:kept] = 0
+        np.add.at(self.use_count, new_of, source.use_count[:len(new_of)])
+        np.maximum.at(self.last_used_at, new_of, source.last_used_at[:len(new_of)])
+
+    # ── Reads ──
+
+    @property
+    def nvec(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """(nvec, dim) float32 view of the FAISS flat storage (no copy)."""
+        if self.index is None or self.index.ntotal == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        n, d = self.index.ntotal, self.index.d
+        return faiss.rev_swig_ptr(self.index.get_xb(), n * d).reshape(n, d)
+
+    def vector(self, row: int) -> Optional[np.ndarray]:
+        pos = int(self.vec_pos[row])
+        return self.embeddings[pos] if pos >= 0 else None
+
+    def prompt(self, row: int) -> str:
+        return self.text.get(int(self.prompt_off[row]), int(self.prompt_len[row]))
+
+    def response(self, row: int) -> str:
+        """Response body of a row, decompressed on demand."""
+        return self.responses.get(int(self.response_id[row]))
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k cosine search. Returns (similarities, row ids); missing slots have row -1."""
+        k = min(k, self.nvec)
+        if k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        q = np.asarray(query, dtype="float32").reshape(1, -1).copy()
+        faiss.normalize_L2(q)
+        sims, pos = self.index.search(q, k)
+        pos = pos[0]
+        rows = np.where(pos >= 0, self.row_of_vec[np.maximum(pos, 0)], -1)
+        return sims[0], rows
+
+    def search_eligible(
+        self, query: np.ndarray, k: int, model: str, now: float, grace: float = 0.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k search restricted to rows that are fresh (or expired less than
+        grace seconds ago) and match model.
+
+        Over-fetches k * SEARCH_OVERFETCH neighbours and filters them with one
+        mask operation; if that leaves fewer than k eligible candidates (most
+        of the index expired or belongs to other models) it searches again
+        with an IDSelectorBitmap built from the eligibility mask of every
+        vector, so FAISS only scores eligible rows.
+        """
+        sims, rows = self.search(query, k * SEARCH_OVERFETCH)
+        ok = self.eligible_mask(rows, model, now, grace)
+        if ok.sum() >= k or len(rows) == self.nvec:
+            return sims[ok][:k], rows[ok][:k]
+
+        vec_ok = self.eligible_mask(self.row_of_vec[:self.nvec], model, now, grace)
+        n_ok = int(vec_ok.sum())
+        if n_ok == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        bitmap = np.packbits(vec_ok, bitorder="little")
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBitmap(len(vec_ok), faiss.swig_ptr(bitmap)))
+        q = np.asarray(query, dtype="float32").reshape(1, -1).copy()
+        faiss.normalize_L2(q)
+        sims, pos = self.index.search(q, min(k, n_ok), params=params)
+        pos = pos[0]
+        keep = pos >= 0
+        return sims[0][keep], self.row_of_vec[pos[keep]]
+
+    def fresh_mask(self, rows: np.ndarray, now: float, grace: float = 0.0) -> np.ndarray:
+        return self.expires_at[rows] + grace > now
+
+    def eligible_mask(self, rows: np.ndarray, model: str, now: float, grace: float = 0.0) -> np.ndarray:
+        """
+        Vectorized `entry.fresh() and entry.model == model` over row ids (-1 is
+        never eligible). With grace, rows expired less than grace seconds ago
+        still count (stale-while-revalidate).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        valid = (rows >= 0) & (rows < self.size)
+        safe = np.where(valid, rows, 0)
+        model_id = self.models.get_id(model)
+        return valid & (self.model_id[safe] == model_id) & self.fresh_mask(safe, now, grace)
+
+    def nbytes(self) -> int:
+        cols = sum(getattr(self, name)[:self.size].nbytes for name in COLUMNS)
+        return cols + self.nvec * (self.dim or 0) * 4 + self.text.nbytes
+
+    # ── Serialization ──
+
+    def to_state(self) -> Dict:
+        """Picklable state without the FAISS index and text (written to separate files)."""
+        return {
+            "size": self.size,
+            "columns": {name: getattr(self, name)[:self.size].copy() for name in COLUMNS},
+            "row_of_vec": self.row_of_vec[:self.nvec].copy(),
+            "models": list(self.models.values),
+            "domains": list(self.domains.values),
+            "strategies": list(self.strategies.values),
+            "responses": self.responses.to_state(),
+            "exact": dict(self.exact),
+            "dim": self.dim,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict, text_base=b"", index=None) -> "ColumnarStore":
+        store = cls()
+        size = state["size"]
+        store._grow(size)
+        columns = state["columns"]
+        for name in COLUMNS:
+            if name in columns:
+                getattr(store, name)[:size] = columns[name]
+        if "expires_at" not in columns:
+            store.expires_at[:size] = store.created_at[:size] + store.ttl_seconds[:size]
+        store.size = size
+        row_of_vec = state["row_of_vec"]
+        store.row_of_vec[:len(row_of_vec)] = row_of_vec
+        store.models = Interner(state["models"])
+        store.domains = Interner(state["domains"])
+        store.strategies = Interner(state["strategies"])
+        store.text = TextArena(text_base)
+        if "responses" in state:
+            store.responses = ResponseStore.from_state(state["responses"], store.text)
+        else:
+            # Snapshot with inline response text: move bodies into the response store
+            store.responses = ResponseStore(store.text)
+            for row in range(size):
+                body = store.text.get(int(columns["response_off"][row]), int(columns["response_len"][row]))
+                store.response_id[row] = store.responses.put(body)
+        store.exact = state["exact"]
+        store.index = index
+        store.dim = state.get("dim") or (index.d if index is not None else None)
+        return store
+
+
+def map_text_file(path: str):
+    """Read-only mmap of a text arena file (b"" for an empty file)."""
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CacheEntry:
+    """Lightweight view of one row of a ColumnarStore."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: ColumnarStore, row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    @property
+    def prompt_norm(self) -> str:
+        return self._store.prompt(self._row)
+
+    @property
+    def response_text(self) -> str:
+        return self._store.response(self._row)
+
+    @property
+    def embedding(self) -> Optional[np.ndarray]:
+        return self._store.vector(self._row)
+
+    @property
+    def model(self) -> str:
+        return self._store.models[int(self._store.model_id[self._row])]
+
+    @property
+    def domain(self) -> str:
+        return self._store.domains[int(self._store.domain_id[self._row])]
+
+    @property
+    def strategy(self) -> str:
+        return self._store.strategies[int(self._store.strategy_id[self._row])]
+
+    @property
+    def ttl_seconds(self) -> int:
+        return int(self._store.ttl_seconds[self._row])
+
+    @property
+    def created_at(self) -> float:
+        return float(self._store.created_at[self._row])
+
+    @property
+    def last_used_at(self) -> float:
+        return float(self._store.last_used_at[self._row])
+
+    @last_used_at.setter
+    def last_used_at(self, value: float) -> None:
+        self._store.last_used_at[self._row] = value
+
+    @property
+    def use_count(self) -> int:
+        return int(self._store.use_count[self._row])
+
+    @use_count.setter
+    def use_count(self, value: int) -> None:
+        self._store.use_count[self._row] = value
+
+    def fresh(self, now: Optional[float] = None) -> bool:
+        import time
+        now = time.time() if now is None else now
+        return float(self._store.expires_at[self._row]) > now
+
+    def fields(self) -> Dict:
+        """All fields as a dict (the shape ColumnarStore.add accepts)."""
+        return {
+            "prompt_norm": self.prompt_norm,
+            "response_text": self.response_text,
+            "embedding": self.embedding,
+            "model": self.model,
+            "ttl_seconds": self.ttl_seconds,
+            "created_at": self.created_at,
+            "last_used_at": self.last_used_at,
+            "use_count": self.use_count,
+            "domain": self.domain,
+            "strategy": self.strategy,
+        }
+
+
+class RowsView:
+    """Sequence of CacheEntry views in row order (what TenantState.rows used to be)."""
+
+    __slots__ = ("_store",)
+
+    def __init__(self, store: ColumnarStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store.size
+
+    def __getitem__(self, i: int) -> CacheEntry:
+        if i < 0:
+            i += self._store.size
+        if not 0 <= i < self._store.size:
+            raise IndexError(i)
+        return CacheEntry(self._store, i)
+
+    def __iter__(self) -> Iterator[CacheEntry]:
+        store = self._store
+        return (CacheEntry(store, i) for i in range(store.size))
+
+
+class ExactView:
+    """Read-only mapping prompt_norm -> CacheEntry over ColumnarStore.exact."""
+
+    __slots__ = ("_store",)
+
+    def __init__(self, store: ColumnarStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store.exact)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._store.exact
+
+    def __getitem__(self, key: str) -> CacheEntry:
+        return CacheEntry(self._store, self._store.exact[key])
+
+    def get(self, key: str, default=None):
+        row = self._store.exact.get(key)
+        return default if row is None else CacheEntry(self._store, row)
+
+    def keys(self):
+        return self._store.exact.keys()
+
+    def items(self):
+        store = self._store
+        return ((k, CacheEntry(store, row)) for k, row in list(store.exact.items()))
+
+    def __iter__(self):
+        return iter(self._store.exact)
@@ -0,0 +1,119 @@
+"""
+Semantic deduplication of a tenant's cache entries.
+
+Semantic hits never insert, but every miss does, so near-misses and
+concurrent misses for the same question leave clusters of near-identical
+entries (similarity above COMPACTION_SIM_THRESHOLD) that inflate the store
+and every FAISS scan without adding hits. The compaction job, run by the
+service every COMPACTION_INTERVAL_SECONDS on tenants whose index has grown
+since their last run:
+
+  - compares the tenant's embeddings block by block (one matrix product per
+    block of rows, at most COMPACTION_BLOCK_MB of similarities at a time);
+  - clusters them greedily around the best entry of each neighbourhood:
+    fresh before expired, then most used, then most recent. Every member is
+    within the threshold of that survivor and has the same model (RAG
+    answers also the same document set: they embed only the question);
+  - rebuilds a compact store with one entry per cluster. Merged prompts stay
+    in the exact map pointing at the survivor, and use counts are summed.
+
+Work is paced so the job takes at most COMPACTION_CPU_SHARE of wall time.
+"""
+
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger("semantis.compaction")
+
+COMPACTION_INTERVAL_SECONDS = int(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))  # 0 disables
+COMPACTION_SIM_THRESHOLD = float(os.getenv("COMPACTION_SIM_THRESHOLD", "0.97"))
+COMPACTION_MIN_ENTRIES = int(os.getenv("COMPACTION_MIN_ENTRIES", "1000"))
+COMPACTION_CPU_SHARE = float(os.getenv("COMPACTION_CPU_SHARE", "0.25"))
+COMPACTION_BLOCK_MB = int(os.getenv("COMPACTION_BLOCK_MB", "64"))
+
+# A tenant is compacted again once its index has grown by this factor
+_REGROWTH = 1.1
+
+# Model suffix of RAG answers (semantic_cache_server.RAG_MODEL_SUFFIX)
+_RAG_MODEL_SUFFIX = "#rag"
+
+
+class Pacer:
+    """Call between units of work: sleeps so that work is at most `share` of elapsed time."""
+
+    def __init__(self, share: float = COMPACTION_CPU_SHARE):
+        self.share = min(1.0, max(0.01, share))
+        self._since = time.perf_counter()
+
+    def __call__(self) -> None:
+        worked = time.perf_counter() - self._since
+        if self.share < 1.0:
+            time.sleep(worked * (1.0 - self.share) / self.share)
+        self._since = time.perf_counter()
+
+
+def due(nvec: int, compacted_nvec: int) -> bool:
+    """Whether a tenant's index is large enough and has grown enough since its last compaction."""
+    return nvec >= COMPACTION_MIN_ENTRIES and nvec >= compacted_nvec * _REGROWTH
+
+
+def _merge_groups(store, rows: np.ndarray) -> np.ndarray:
+    """
+    Group id per row; rows only merge within their group. The group is the
+    model, and for RAG answers the model plus the document fingerprints of
+    their "rag|<fingerprints>|<question>" key: the same question over other
+    documents has the same embedding but not the same answer.
+    """
+    groups = store.model_id[rows].astype(np.int64)
+    rag_ids = [i for i, m in enumerate(store.models.values) if m.endswith(_RAG_MODEL_SUFFIX)]
+    if not rag_ids:
+        return groups
+    doc_sets: dict = {}
+    base = len(store.models.values)
+    for k in np.nonzero(np.isin(groups, rag_ids))[0]:
+        parts = store.prompt(int(rows[k])).split("|", 2)
+        key = (int(groups[k]), parts[1] if len(parts) == 3 else "")
+        groups[k] = base + doc_sets.setdefault(key, len(doc_sets))
+    return groups
+
+
+def plan(store, size: int, vectors: np.ndarray, now: float,
+         threshold: float = COMPACTION_SIM_THRESHOLD,
+         pace: Optional[Callable[[], None]] = None) -> np.ndarray:
+    """
+    redirect[row] for rows [0, size): the surviving row of the row's
+    near-duplicate cluster, or the row itself. vectors are the first
+    len(vectors) FAISS positions (L2-normalised, so dot product = cosine).
+    """
+    redirect = np.arange(size)
+    n = len(vectors)
+    if n < 2:
+        return redirect
+    rows = store.row_of_vec[:n].copy()
+    fresh = store.expires_at[rows] > now
+    # Survivor preference: fresh, then most used, then most recent (lexsort: last key first)
+    order = np.lexsort((-store.created_at[rows], -store.use_count[rows], ~fresh))
+    ranked = vectors[order]
+    groups = _merge_groups(store, rows)[order]
+    assigned = np.zeros(n, dtype=bool)
+    block = max(1, min(n, COMPACTION_BLOCK_MB * 1024 * 1024 // (4 * n)))
+    for start in range(0, n, block):
+        sims = ranked[start:start + block] @ ranked.T
+        close = sims >= threshold
+        # Every row is close to itself; only rows with another neighbour can lead a cluster
+        for k in np.nonzero(close.sum(axis=1) > 1)[0]:
+            i = start + k
+            if assigned[i]:
+                continue
+            assigned[i] = True
+            members = np.nonzero(close[k] & ~assigned & (groups == groups[i]))[0]
+            if len(members):
+                assigned[members] = True
+                redirect[rows[order[members]]] = rows[order[i]]
+        if pace is not None:
+            pace()
+    return redirect
@@ -2,18 +2,44 @@
 Database Module - Supabase Postgres (Phase 1.1: Organization Tenancy)
 Handles API keys, user profiles, organizations, audit logs, cache entries,
 and usage logging via Supabase Postgres.
+
+Connections come from a psycopg 3 pool shared by request and background
+threads. Statements a connection has run DB_PREPARE_THRESHOLD times are
+prepared server-side, and lookups run in READ ONLY transactions.
 """
 import os
 import json
-import psycopg2
-import psycopg2.pool
-from psycopg2.extras import RealDictCursor
+import time
+import logging
+import threading
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from typing import Optional, Dict, List, Any
 from contextlib import contextmanager
 
+logger = logging.getLogger("semantis.database")
+
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Empty disables server-side prepared statements (needed behind a
+# transaction-mode pooler such as PgBouncer or Supabase port 6543)
+_prepare = os.getenv("DB_PREPARE_THRESHOLD", "5").strip()
+DB_PREPARE_THRESHOLD = int(_prepare) if _prepare else None
 
 _pool = None
+_pool_lock = threading.Lock()
+_checkout_stats = {"checkouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "timeouts": 0}
+
+
+def _configure(conn) -> None:
+    conn.prepare_threshold = DB_PREPARE_THRESHOLD
+
+
+def _reset(conn) -> None:
+    conn.read_only = False
 
 
 def _get_pool():
@@ -24,20 +50,42 @@ def _get_pool():
                 "DATABASE_URL is not set. "
                 "Get it from Supabase: Settings > Database > Connection string (URI)"
             )
-        _pool = psycopg2.pool.ThreadedConnectionPool(
-            minconn=2,
-            maxconn=10,
-            dsn=DATABASE_URL
-        )
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    configure=_configure,
+                    reset=_reset,
+                    name="semantis",
+                    open=True,
+                )
     return _pool
 
 
 @contextmanager
-def get_db_connection():
-    """Get a Postgres connection from the pool."""
+def get_db_connection(readonly: bool = False):
+    """
+    Get a Postgres connection from the pool. The transaction is committed on
+    success and rolled back on error; readonly=True runs it as READ ONLY.
+    """
     pool = _get_pool()
-    conn = pool.getconn()
+    start = time.perf_counter()
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _checkout_stats["timeouts"] += 1
+        raise
+    wait_ms = (time.perf_counter() - start) * 1000
+    _checkout_stats["checkouts"] += 1
+    _checkout_stats["wait_ms_total"] += wait_ms
+    if wait_ms > _checkout_stats["wait_ms_max"]:
+        _checkout_stats["wait_ms_max"] = wait_ms
     try:
+        if readonly:
+            conn.read_only = True
         yield conn
         conn.commit()
     except Exception:
@@ -47,13 +95,33 @@ def get_db_connection():
         pool.putconn(conn)
 
 
+def get_pool_stats() -> Dict:
+    """Pool size and checkout/wait counters (for /health and Prometheus)."""
+    if _pool is None:
+        return {"status": "not_initialized"}
+    stats = _pool.get_stats()
+    checkouts = _checkout_stats["checkouts"]
+    return {
+        "pool_min": stats.get("pool_min", DB_POOL_MIN_SIZE),
+        "pool_max": stats.get("pool_max", DB_POOL_MAX_SIZE),
+        "pool_size": stats.get("pool_size", 0),
+        "pool_available": stats.get("pool_available", 0),
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "checkouts": checkouts,
+        "checkout_timeouts": _checkout_stats["timeouts"],
+        "wait_ms_avg": round(_checkout_stats["wait_ms_total"] / checkouts, 3) if checkouts else 0.0,
+        "wait_ms_max": round(_checkout_stats["wait_ms_max"], 3),
+        "prepare_threshold": DB_PREPARE_THRESHOLD,
+    }
+
+
 # ==========================================================================
 # Profile (User) Functions
 # ==========================================================================
 
 def get_user_by_id(user_id: str) -> Optional[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT id, email, name, is_admin, company,
                       openai_api_key_encrypted, created_at, updated_at
@@ -65,8 +133,8 @@ def get_user_by_id(user_id: str) -> Optional[Dict]:
 
 
 def get_user_by_email(email: str) -> Optional[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT id, email, name, is_admin, company,
                       openai_api_key_encrypted, created_at, updated_at
@@ -102,7 +170,7 @@ def set_user_openai_key(user_id: str, encrypted_key: str) -> bool:
 
 
 def get_user_openai_key_encrypted(user_id: str) -> Optional[str]:
-    with get_db_connection() as conn:
+    with get_db_connection(readonly=True) as conn:
         cur = conn.cursor()
         cur.execute(
             'SELECT openai_api_key_encrypted FROM profiles WHERE id = %s',
@@ -134,7 +202,7 @@ def create_organization(
 ) -> Optional[Dict]:
     """Create a new organization and add the creator as owner."""
     with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """INSERT INTO organizations (name, slug, plan)
                VALUES (%s, %s, %s)
@@ -151,8 +219,8 @@ def create_organization(
 
 
 def get_organization(org_id: str) -> Optional[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT id, name, slug, plan, settings, created_at, updated_at
                FROM organizations WHERE id = %s""",
@@ -163,8 +231,8 @@ def get_organization(org_id: str) -> Optional[Dict]:
 
 
 def get_org_by_slug(slug: str) -> Optional[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT id, name, slug, plan, settings, created_at, updated_at
                FROM organizations WHERE slug = %s""",
@@ -176,8 +244,8 @@ def get_org_by_slug(slug: str) -> Optional[Dict]:
 
 def get_user_orgs(user_id: str) -> List[Dict]:
     """Return all organizations a user belongs to, with their role."""
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT o.id, o.name, o.slug, o.plan, o.settings,
                       om.role, o.created_at, o.updated_at
@@ -200,7 +268,7 @@ def add_org_member(org_id: str, user_id: str, role: str = 'member') -> bool:
                 (org_id, user_id, role)
             )
             return True
-        except psycopg2.IntegrityError:
+        except psycopg.IntegrityError:
             conn.rollback()
             return False
 
@@ -256,7 +324,7 @@ def create_api_key(
                  org_id, scope, label, allowed_ips, expires_at)
             )
             return True
-        except psycopg2.IntegrityError:
+        except psycopg.IntegrityError:
             conn.rollback()
             cur.execute(
                 """UPDATE api_keys
@@ -279,8 +347,8 @@ def create_api_key(
 
 
 def get_api_key_info(api_key: str) -> Optional[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT ak.*, p.email, p.name
                FROM api_keys ak
@@ -294,8 +362,8 @@ def get_api_key_info(api_key: str) -> Optional[Dict]:
 
 def get_org_for_api_key(api_key: str) -> Optional[Dict]:
     """Return the organization associated with an API key."""
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT o.id, o.name, o.slug, o.plan, o.settings
                FROM api_keys ak
@@ -308,8 +376,8 @@ def get_org_for_api_key(api_key: str) -> Optional[Dict]:
 
 
 def get_tenant_plan(tenant_id: str) -> Optional[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT plan, plan_expires_at, is_active, usage_count
                FROM api_keys
@@ -334,8 +402,8 @@ def update_api_key_usage(api_key: str, tenant_id: str):
 
 
 def list_api_keys(user_id: Optional[str] = None) -> List[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         if user_id:
             cur.execute(
                 """SELECT ak.*, p.email, p.name
@@ -393,14 +461,16 @@ def log_usage(
     user_id: Optional[str] = None,
     org_id: Optional[str] = None
 ):
+    # Resolve the key before checking out a connection so a log write never
+    # holds two pool connections at once
+    if user_id is None or org_id is None:
+        key_info = get_api_key_info(api_key)
+        if key_info:
+            user_id = user_id or key_info.get('user_id')
+            org_id = org_id or key_info.get('org_id')
+
     with get_db_connection() as conn:
         cur = conn.cursor()
-        if user_id is None or org_id is None:
-            key_info = get_api_key_info(api_key)
-            if key_info:
-                user_id = user_id or key_info.get('user_id')
-                org_id = org_id or key_info.get('org_id')
-
         cur.execute(
             """INSERT INTO usage_logs
                (api_key, tenant_id, user_id, org_id, endpoint, request_count,
@@ -411,20 +481,23 @@ def log_usage(
         )
 
 
+_USAGE_TOTALS = """SELECT
+                 COALESCE(SUM(u.request_count), 0)::bigint as total_requests,
+                 COALESCE(SUM(u.cache_hits), 0)::bigint    as total_hits,
+                 COALESCE(SUM(u.cache_misses), 0)::bigint  as total_misses,
+                 COALESCE(SUM(u.tokens_used), 0)::bigint   as total_tokens,
+                 COALESCE(SUM(u.cost_estimate), 0)::float8  as total_cost
+               FROM {source} u"""
+
+
 def get_usage_stats(tenant_id: str, days: int = 30) -> Dict:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    from usage_rollups import days_ago, usage_source_sql, window_params
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
+        window = window_params(cur, days_ago(days))
         cur.execute(
-            """SELECT
-                 COALESCE(SUM(request_count), 0) as total_requests,
-                 COALESCE(SUM(cache_hits), 0)    as total_hits,
-                 COALESCE(SUM(cache_misses), 0)  as total_misses,
-                 COALESCE(SUM(tokens_used), 0)   as total_tokens,
-                 COALESCE(SUM(cost_estimate), 0)  as total_cost
-               FROM usage_logs
-               WHERE tenant_id = %s
-                 AND logged_at >= NOW() - INTERVAL '1 day' * %s""",
-            (tenant_id, days)
+            _USAGE_TOTALS.format(source=usage_source_sql(window, "tenant_id = %(tenant_id)s")),
+            {**window, "tenant_id": tenant_id}
         )
         row = cur.fetchone()
         return dict(row) if row else {
@@ -435,35 +508,22 @@ def get_usage_stats(tenant_id: str, days: int = 30) -> Dict:
 
 def get_usage_stats_by_org(org_id: str, days: int = 30) -> Dict:
     """Get usage stats aggregated by org_id (for billing/savings)."""
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    from usage_rollups import days_ago, usage_source_sql, window_params
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
+        window = window_params(cur, days_ago(days))
         cur.execute(
-            """SELECT
-                 COALESCE(SUM(request_count), 0) as total_requests,
-                 COALESCE(SUM(cache_hits), 0)    as total_hits,
-                 COALESCE(SUM(cache_misses), 0)  as total_misses,
-                 COALESCE(SUM(tokens_used), 0)   as total_tokens,
-                 COALESCE(SUM(cost_estimate), 0)  as total_cost
-               FROM usage_logs
-               WHERE org_id = %s
-                 AND logged_at >= NOW() - INTERVAL '1 day' * %s""",
-            (org_id, days)
+            _USAGE_TOTALS.format(source=usage_source_sql(window, "org_id = %(org_id)s")),
+            {**window, "org_id": org_id}
         )
         row = cur.fetchone()
         if row:
             return dict(row)
         # Fallback: sum by tenant_id for API keys belonging to this org
         cur.execute(
-            """SELECT
-                 COALESCE(SUM(ul.request_count), 0) as total_requests,
-                 COALESCE(SUM(ul.cache_hits), 0)    as total_hits,
-                 COALESCE(SUM(ul.cache_misses), 0)  as total_misses,
-                 COALESCE(SUM(ul.tokens_used), 0)   as total_tokens,
-                 COALESCE(SUM(ul.cost_estimate), 0)  as total_cost
-               FROM usage_logs ul
-               JOIN api_keys ak ON ul.api_key = ak.api_key AND ak.org_id = %s
-               WHERE ul.logged_at >= NOW() - INTERVAL '1 day' * %s""",
-            (org_id, days)
+            _USAGE_TOTALS.format(source=usage_source_sql(window, "TRUE"))
+            + " JOIN api_keys ak ON u.api_key = ak.api_key AND ak.org_id = %(org_id)s",
+            {**window, "org_id": org_id}
         )
         row = cur.fetchone()
         return dict(row) if row else {
@@ -513,7 +573,7 @@ def store_cache_entry(
 ) -> Optional[Dict]:
     """Insert or update a cache entry. On conflict (same org + hash), update the response."""
     with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """INSERT INTO cache_entries
                (org_id, prompt_hash, prompt_norm, response_text, embedding,
@@ -531,7 +591,7 @@ def store_cache_entry(
 def get_cache_entry(org_id: str, prompt_hash: str) -> Optional[Dict]:
     """Retrieve a cache entry and bump its use_count / last_used_at."""
     with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT id, org_id, prompt_hash, prompt_norm, response_text,
                       model, ttl_expires_at, created_at, last_used_at, use_count, domain
@@ -555,8 +615,8 @@ def get_cache_entry(org_id: str, prompt_hash: str) -> Optional[Dict]:
 
 
 def list_cache_entries(org_id: str, limit: int = 50) -> List[Dict]:
-    with get_db_connection() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor(row_factory=dict_row)
         cur.execute(
             """SELECT id, org_id, prompt_hash, prompt_norm, response_text,
                       model, ttl_expires_at, created_at, last_used_at, use_count, domain
@@ -0,0 +1,235 @@
+"""
+L3 Vector Cache Module
+Postgres + pgvector cold tier behind the in-memory FAISS index.
+
+New cache entries are queued and written to `cache_vectors` in batches by a
+background thread, so the request path never waits on Postgres. When a
+tenant has no local snapshot (evicted, fresh node, lost disk) its lookups
+are answered from the pgvector HNSW index while the in-memory index is
+rebuilt from one streaming COPY of the tenant's live rows.
+
+Enabled with L3_VECTOR_CACHE=true; requires the pgvector extension (see
+supabase_schema.sql, section 8a).
+"""
+import os
+import csv
+import time
+import queue
+import logging
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("semantis.l3_cache")
+
+L3_ENABLED = os.getenv("L3_VECTOR_CACHE", "false").lower() == "true"
+L3_BATCH_SIZE = int(os.getenv("L3_BATCH_SIZE", "200"))
+L3_FLUSH_SECONDS = float(os.getenv("L3_FLUSH_SECONDS", "2"))
+L3_EF_SEARCH = int(os.getenv("L3_EF_SEARCH", "100"))
+
+_MAX_QUEUE = 50000
+_PURGE_INTERVAL_SECONDS = 3600
+# COPY output is spooled in memory up to this size, then to a temp file
+_COPY_SPOOL_BYTES = 64 * 1024 * 1024
+
+_queue: "queue.Queue[Tuple]" = queue.Queue(maxsize=_MAX_QUEUE)
+_writer_thread: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+_stats = {"written": 0, "dropped": 0, "failed_batches": 0}
+_iterative_scan: Optional[bool] = None  # pgvector >= 0.8
+
+
+def _vector_literal(embedding: np.ndarray) -> str:
+    """pgvector text literal of the L2-normalized embedding (inner product == cosine)."""
+    v = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(v))
+    if norm > 0:
+        v = v / norm
+    return "[" + ",".join(f"{x:.6g}" for x in v) + "]"
+
+
+def _parse_halfvec_send(hex_field: str) -> np.ndarray:
+    """Decode halfvec_send() output (int16 dim, int16 unused, big-endian float16s) from COPY's \\x hex."""
+    raw = bytes.fromhex(hex_field[2:])
+    return np.frombuffer(raw, dtype=">f2", offset=4).astype(np.float32)
+
+
+# ── Writes (async, batched) ──
+
+def enqueue(tenant_id: str, prompt_hash: str, fields: Dict) -> bool:
+    """Queue a new entry (ColumnarStore.add fields) for the background writer."""
+    if fields.get("embedding") is None:
+        return False
+    _ensure_writer()
+    try:
+        _queue.put_nowait((tenant_id, prompt_hash, fields))
+        return True
+    except queue.Full:
+        _stats["dropped"] += 1
+        return False
+
+
+def _flush(batch: List[Tuple]) -> None:
+    from database import get_db_connection
+    rows = []
+    for tenant_id, prompt_hash, f in batch:
+        created_at = f.get("created_at") or time.time()
+        rows.append((
+            tenant_id, prompt_hash, f["prompt_norm"], f["response_text"], f["model"],
+            f.get("domain", "general"), f.get("strategy", "miss"), _vector_literal(f["embedding"]),
+            int(f["ttl_seconds"]), created_at, created_at + int(f["ttl_seconds"]),
+        ))
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        # executemany() sends the batch pipelined through one prepared statement
+        cur.executemany(
+            """INSERT INTO cache_vectors
+               (tenant_id, prompt_hash, prompt_norm, response_text, model, domain,
+                strategy, embedding, ttl_seconds, created_at, expires_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s::halfvec, %s, to_timestamp(%s), to_timestamp(%s))
+               ON CONFLICT (tenant_id, prompt_hash, model) DO UPDATE SET
+                 response_text = EXCLUDED.response_text,
+                 embedding = EXCLUDED.embedding,
+                 ttl_seconds = EXCLUDED.ttl_seconds,
+                 created_at = EXCLUDED.created_at,
+                 expires_at = EXCLUDED.expires_at""",
+            rows,
+        )
+
+
+def _purge_expired() -> int:
+    from database import get_db_connection
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM cache_vectors WHERE expires_at < NOW()")
+        return cur.rowcount
+
+
+def _writer_loop() -> None:
+    last_purge = time.time()
+    while True:
+        batch = []
+        deadline = time.time() + L3_FLUSH_SECONDS
+        while len(batch) < L3_BATCH_SIZE:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        if batch:
+            try:
+                _flush(batch)
+                _stats["written"] += len(batch)
+            except Exception as e:
+                _stats["failed_batches"] += 1
+                logger.warning("L3 batch write failed | rows=%d | %s", len(batch), e)
+        if time.time() - last_purge > _PURGE_INTERVAL_SECONDS:
+            last_purge = time.time()
+            try:
+                logger.info("L3 purge | expired=%d", _purge_expired())
+            except Exception as e:
+                logger.warning("L3 purge failed: %s", e)
+
+
+def _ensure_writer() -> None:
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name="l3-writer", daemon=True)
+            _writer_thread.start()
+
+
+# ── Reads ──
+
+def _supports_iterative_scan(cur) -> bool:
+    global _iterative_scan
+    if _iterative_scan is None:
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        row = cur.fetchone()
+        version = tuple(int(p) for p in row[0].split(".")[:2]) if row else (0, 0)
+        _iterative_scan = version >= (0, 8)
+    return _iterative_scan
+
+
+def search(tenant_id: str, embedding: np.ndarray, model: str, k: int = 5) -> List[Tuple[float, Dict]]:
+    """
+    Nearest live entries of a tenant/model from the HNSW index.
+    Returns [(cosine similarity, {prompt_norm, response_text, ...}), ...] best first.
+    """
+    from database import get_db_connection
+    vec = _vector_literal(embedding)
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor()
+        # SET cannot take bound parameters; set_config(..., true) is SET LOCAL
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(L3_EF_SEARCH),))
+        if _supports_iterative_scan(cur):
+            # Keep scanning the graph until enough rows pass the tenant filter
+            cur.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+        cur.execute(
+            """SELECT prompt_norm, response_text, domain, -(embedding <#> %s::halfvec) AS similarity
+               FROM cache_vectors
+               WHERE tenant_id = %s AND model = %s AND expires_at > NOW()
+               ORDER BY embedding <#> %s::halfvec
+               LIMIT %s""",
+            (vec, tenant_id, model, vec, k),
+        )
+        results = []
+        for prompt_norm, response_text, domain, similarity in cur.fetchall():
+            results.append((float(similarity), {
+                "prompt_norm": prompt_norm,
+                "response_text": response_text,
+                "domain": domain,
+            }))
+        return results
+
+
+def load_tenant(tenant_id: str):
+    """
+    Rebuild a tenant's ColumnarStore (and FAISS index) from its live L3 rows
+    with one streaming COPY. Returns None if the tenant has no rows.
+    """
+    import io
+    from database import get_db_connection
+    from columnar_store import ColumnarStore
+
+    sink = tempfile.SpooledTemporaryFile(max_size=_COPY_SPOOL_BYTES, mode="w+b")
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor()
+        with cur.copy(
+            """COPY (SELECT prompt_norm, response_text, model, domain, strategy, ttl_seconds,
+                            EXTRACT(EPOCH FROM created_at), use_count, halfvec_send(embedding)
+                     FROM cache_vectors
+                     WHERE tenant_id = %s AND expires_at > NOW()
+                     ORDER BY id) TO STDOUT WITH (FORMAT csv)""",
+            (tenant_id,),
+        ) as copy:
+            for block in copy:
+                sink.write(block)
+
+    sink.seek(0)
+    store = ColumnarStore()
+    reader = csv.reader(io.TextIOWrapper(sink, encoding="utf-8", newline=""))
+    for prompt_norm, response_text, model, domain, strategy, ttl, created_at, use_count, emb in reader:
+        store.add(
+            prompt_norm=prompt_norm,
+            response_text=response_text,
+            embedding=_parse_halfvec_send(emb),
+            model=model,
+            ttl_seconds=int(ttl),
+            created_at=float(created_at),
+            use_count=int(use_count or 0),
+            domain=domain or "general",
+            strategy=strategy or "miss",
+        )
+    sink.close()
+    return store if store.size else None
+
+
+def stats() -> Dict:
+    return {"queued": _queue.qsize(), **_stats}
@@ -0,0 +1,181 @@
+"""
+Log Partitions Module
+Partition maintenance and retention for the monthly-partitioned usage_logs
+and audit_logs tables (supabase_schema.sql, section 7a).
+
+A background job keeps LOG_PARTITION_MONTHS_AHEAD upcoming months created so
+inserts never miss a partition. Months older than the retention window are
+detached, exported with COPY to a compressed CSV under LOG_ARCHIVE_DIR and
+then dropped, which keeps the live indexes (and INSERT cost) bounded.
+Billing/analytics history is unaffected: it is served from the usage
+rollup tables (see usage_rollups.py).
+"""
+import os
+import re
+import gzip
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("semantis.log_partitions")
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional dependency; archives fall back to gzip
+    zstd = None
+
+LOG_PARTITIONS_ENABLED = os.getenv("LOG_PARTITION_MAINTENANCE", "true").lower() == "true"
+LOG_PARTITION_MONTHS_AHEAD = int(os.getenv("LOG_PARTITION_MONTHS_AHEAD", "3"))
+LOG_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("LOG_MAINTENANCE_INTERVAL_SECONDS", "21600"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", os.path.join("cache_data", "log_archive"))
+# Months kept online, counting the current one; 0 keeps everything
+RETENTION_MONTHS = {
+    "usage_logs": int(os.getenv("USAGE_LOG_RETENTION_MONTHS", "13")),
+    "audit_logs": int(os.getenv("AUDIT_LOG_RETENTION_MONTHS", "25")),
+}
+
+_ADVISORY_LOCK_KEY = 0x5E3A_0036
+_PARTITION_RE = re.compile(r"^(usage_logs|audit_logs)_p(\d{4})_(\d{2})$")
+
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+_stats = {"runs": 0, "created": 0, "archived": 0, "failed_runs": 0}
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+def ensure_partitions(months_ahead: int = LOG_PARTITION_MONTHS_AHEAD) -> int:
+    """Create missing partitions from the current month through months_ahead. Returns how many were created."""
+    from database import get_db_connection
+    created = 0
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        for parent in RETENTION_MONTHS:
+            cur.execute(
+                "SELECT public.create_monthly_partitions(%s, (NOW() AT TIME ZONE 'UTC')::date, %s)",
+                (parent, months_ahead + 1),
+            )
+            created += cur.fetchone()[0]
+    return created
+
+
+def _expired_partitions(cur) -> List[Tuple[str, str, bool]]:
+    """(parent, partition, attached) for every monthly table past its parent's retention."""
+    cur.execute(
+        """SELECT c.relname, i.inhparent IS NOT NULL
+           FROM pg_class c
+           JOIN pg_namespace n ON n.oid = c.relnamespace
+           LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+           WHERE n.nspname = 'public' AND c.relkind = 'r'
+             AND (c.relname LIKE 'usage\\_logs\\_p%' OR c.relname LIKE 'audit\\_logs\\_p%')"""
+    )
+    now = datetime.now(timezone.utc)
+    current = _month_index(now.year, now.month)
+    expired = []
+    for name, attached in cur.fetchall():
+        m = _PARTITION_RE.match(name)
+        if not m:
+            continue
+        parent, year, month = m.group(1), int(m.group(2)), int(m.group(3))
+        keep = RETENTION_MONTHS[parent]
+        if keep > 0 and _month_index(year, month) <= current - keep:
+            expired.append((parent, name, attached))
+    return sorted(expired, key=lambda e: e[1])
+
+
+def _open_archive(partition: str):
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    if zstd is not None:
+        path = os.path.join(LOG_ARCHIVE_DIR, f"{partition}.csv.zst")
+        raw = open(path + ".tmp", "wb")
+        return path, raw, zstd.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+    path = os.path.join(LOG_ARCHIVE_DIR, f"{partition}.csv.gz")
+    raw = open(path + ".tmp", "wb")
+    return path, raw, gzip.GzipFile(fileobj=raw, mode="wb")
+
+
+def _archive_partition(conn, parent: str, partition: str, attached: bool) -> str:
+    """Detach (if needed), export to a compressed CSV and drop one partition. Returns the archive path."""
+    cur = conn.cursor()
+    if attached:
+        cur.execute(f'ALTER TABLE public."{parent}" DETACH PARTITION public."{partition}"')
+        conn.commit()
+    path, raw, writer = _open_archive(partition)
+    try:
+        with cur.copy(f'COPY public."{partition}" TO STDOUT WITH (FORMAT csv, HEADER)') as copy:
+            for block in copy:
+                writer.write(block)
+        writer.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    finally:
+        raw.close()
+    os.replace(path + ".tmp", path)
+    cur.execute(f'DROP TABLE public."{partition}"')
+    conn.commit()
+    return path
+
+
+def archive_expired() -> int:
+    """Archive and drop every partition past retention. Returns how many were archived."""
+    from database import get_db_connection
+    archived = 0
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        # Session lock: the archive steps commit in between
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (_ADVISORY_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return 0
+        try:
+            for parent, partition, attached in _expired_partitions(cur):
+                start = time.time()
+                path = _archive_partition(conn, parent, partition, attached)
+                archived += 1
+                logger.info(
+                    "Log partition archived | partition=%s | file=%s | time=%.0fms",
+                    partition, path, (time.time() - start) * 1000,
+                )
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_ADVISORY_LOCK_KEY,))
+    return archived
+
+
+def run_maintenance() -> Dict:
+    created = ensure_partitions()
+    archived = archive_expired()
+    _stats["runs"] += 1
+    _stats["created"] += created
+    _stats["archived"] += archived
+    return {"created": created, "archived": archived}
+
+
+def _loop() -> None:
+    while True:
+        try:
+            result = run_maintenance()
+            if result["created"] or result["archived"]:
+                logger.info("Log partition maintenance | created=%d | archived=%d", result["created"], result["archived"])
+        except Exception as e:
+            _stats["failed_runs"] += 1
+            logger.warning("Log partition maintenance failed: %s", e)
+        time.sleep(LOG_MAINTENANCE_INTERVAL_SECONDS)
+
+
+def start() -> None:
+    """Start the maintenance job (no-op without DATABASE_URL or with LOG_PARTITION_MAINTENANCE=false)."""
+    global _thread
+    if not LOG_PARTITIONS_ENABLED or not os.getenv("DATABASE_URL"):
+        return
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_loop, name="log-partitions", daemon=True)
+            _thread.start()
+
+
+def stats() -> Dict:
+    return dict(_stats)
@@ -116,6 +116,108 @@ system_cache_size_bytes = Gauge(
     registry=registry
 )
 
+# Database pool metrics (refreshed from database.get_pool_stats() at scrape time)
+db_pool_connections = Gauge(
+    'db_pool_connections',
+    'Postgres pool connections',
+    ['state'],  # state: open, available, max
+    registry=registry
+)
+
+db_pool_requests_waiting = Gauge(
+    'db_pool_requests_waiting',
+    'Requests currently waiting for a pooled connection',
+    registry=registry
+)
+
+db_pool_checkouts = Gauge(
+    'db_pool_checkouts',
+    'Connections checked out of the pool since startup',
+    registry=registry
+)
+
+db_pool_wait_ms = Gauge(
+    'db_pool_wait_ms',
+    'Pool checkout wait time in milliseconds',
+    ['stat'],  # stat: avg, max
+    registry=registry
+)
+
+# Upstream (OpenAI) call manager, refreshed from upstream.upstream.stats() at scrape time
+upstream_in_flight = Gauge(
+    'upstream_in_flight',
+    'OpenAI requests in flight, summed over API keys',
+    registry=registry
+)
+
+upstream_requests_waiting = Gauge(
+    'upstream_requests_waiting',
+    'Requests queued on a saturated per-key bulkhead or rate limit',
+    registry=registry
+)
+
+upstream_events = Gauge(
+    'upstream_events',
+    'Upstream call counters since startup, summed over API keys',
+    ['event'],  # event: calls, queued, queue_timeouts, rate_limited, timeouts, errors, retries, hedges, hedge_wins,
+                # circuit_opens, circuit_rejected
+    registry=registry
+)
+
+upstream_circuits_open = Gauge(
+    'upstream_circuits_open',
+    'API keys whose circuit breaker is open or half-open',
+    registry=registry
+)
+
+upstream_latency_ms = Gauge(
+    'upstream_latency_ms',
+    'Observed upstream latency percentiles in milliseconds',
+    ['op', 'stat'],  # op: embedding, chat; stat: p50, p95, p99
+    registry=registry
+)
+
+# Miss admission control, refreshed from admission.admission.stats() at scrape time
+miss_in_flight = Gauge(
+    'miss_in_flight',
+    'Cache misses currently calling the LLM',
+    registry=registry
+)
+
+miss_queue_depth = Gauge(
+    'miss_queue_depth',
+    'Cache misses waiting for an admission slot',
+    registry=registry
+)
+
+miss_admission_events = Gauge(
+    'miss_admission_events',
+    'Miss admission counters since startup',
+    ['event'],  # event: admitted, queued, shed, shed_tenant, queue_timeouts
+    registry=registry
+)
+
+miss_tenant_in_flight = Gauge(
+    'miss_tenant_in_flight',
+    'Cache misses of a tenant currently calling the LLM',
+    ['tenant_id'],
+    registry=registry
+)
+
+miss_tenant_queue_depth = Gauge(
+    'miss_tenant_queue_depth',
+    'Cache misses of a tenant waiting for an admission slot',
+    ['tenant_id'],
+    registry=registry
+)
+
+miss_tenant_queue_wait_ms = Gauge(
+    'miss_tenant_queue_wait_ms',
+    'Time a tenant\'s queued misses waited for an admission slot in milliseconds',
+    ['tenant_id', 'stat'],  # stat: avg, max
+    registry=registry
+)
+
 # Token metrics
 tokens_used_total = Counter(
     'tokens_used_total',
@@ -214,10 +316,70 @@ class CacheMetrics:
             logger.warning("psutil not available for system metrics")
         except Exception as e:
             logger.error(f"Error updating system metrics: {e}")
+    
+    @staticmethod
+    def update_db_pool_metrics():
+        """Update Postgres pool metrics."""
+        try:
+            from database import get_pool_stats
+            stats = get_pool_stats()
+        except Exception:
+            return
+        if "pool_size" not in stats:
+            return
+        db_pool_connections.labels(state='open').set(stats["pool_size"])
+        db_pool_connections.labels(state='available').set(stats["pool_available"])
+        db_pool_connections.labels(state='max').set(stats["pool_max"])
+        db_pool_requests_waiting.set(stats["requests_waiting"])
+        db_pool_checkouts.set(stats["checkouts"])
+        db_pool_wait_ms.labels(stat='avg').set(stats["wait_ms_avg"])
+        db_pool_wait_ms.labels(stat='max').set(stats["wait_ms_max"])
+
+    @staticmethod
+    def update_upstream_metrics():
+        """Update upstream call manager metrics."""
+        try:
+            from upstream import upstream
+            stats = upstream.stats()
+        except Exception:
+            return
+        keys = stats["keys"].values()
+        upstream_in_flight.set(sum(k["in_flight"] for k in keys))
+        upstream_requests_waiting.set(sum(k["waiting"] for k in keys))
+        for event in ("calls", "queued", "queue_timeouts", "rate_limited", "timeouts",
+                      "errors", "retries", "hedges", "hedge_wins", "circuit_opens", "circuit_rejected"):
+            upstream_events.labels(event=event).set(sum(k[event] for k in keys))
+        upstream_circuits_open.set(sum(1 for k in keys if k["circuit"] != "closed"))
+        for op, latency in stats["latency"].items():
+            for stat in ("p50", "p95", "p99"):
+                value = latency.get(f"{stat}_ms")
+                if value is not None:
+                    upstream_latency_ms.labels(op=op, stat=stat).set(value)
+
+    @staticmethod
+    def update_admission_metrics():
+        """Update miss admission control metrics."""
+        try:
+            from admission import admission
+            stats = admission.stats()
+        except Exception:
+            return
+        miss_in_flight.set(stats["in_flight"])
+        miss_queue_depth.set(stats["waiting"])
+        for event in ("admitted", "queued", "shed", "shed_tenant", "queue_timeouts"):
+            miss_admission_events.labels(event=event).set(stats[event])
+        for tenant_id, t in stats["tenants"].items():
+            miss_tenant_in_flight.labels(tenant_id=tenant_id).set(t["in_flight"])
+            miss_tenant_queue_depth.labels(tenant_id=tenant_id).set(t["waiting"])
+            miss_tenant_queue_wait_ms.labels(tenant_id=tenant_id, stat='avg').set(t["wait_ms_avg"])
+            miss_tenant_queue_wait_ms.labels(tenant_id=tenant_id, stat='max').set(t["wait_ms_max"])
 
 
 def get_metrics_response() -> Response:
     """Get Prometheus metrics response."""
+    CacheMetrics.update_db_pool_metrics()
+    CacheMetrics.update_upstream_metrics()
+    CacheMetrics.update_admission_metrics()
     return Response(
         content=generate_latest(registry),
         media_type=CONTENT_TYPE_LATEST
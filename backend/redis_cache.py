@@ -2,7 +2,8 @@
 Redis Cache Backend for Semantis AI
 
 Provides L1 (process-local) + L2 (Redis) + L3 (PostgreSQL) tiered caching.
-Redis stores exact-match cache entries and embedding vectors per org namespace.
+Redis stores one hash per cache entry (model, timestamps, use_count and the
+binary embedding) plus content-addressed response bodies, per org namespace.
 Falls back gracefully to in-memory-only mode if Redis is unavailable.
 """
 import os
@@ -58,11 +59,11 @@ def _get_redis():
 
 # ── Key naming ──
 
-def _exact_key(org_id: str, prompt_hash: str) -> str:
-    return f"org:{org_id}:exact:{prompt_hash}"
+def _entry_key(org_id: str, prompt_hash: str) -> str:
+    return f"org:{org_id}:entry:{prompt_hash}"
 
-def _emb_key(org_id: str, prompt_hash: str) -> str:
-    return f"org:{org_id}:emb:{prompt_hash}"
+def _resp_key(org_id: str, response_digest: str) -> str:
+    return f"org:{org_id}:resp:{response_digest}"
 
 def _meta_key(org_id: str) -> str:
     return f"org:{org_id}:meta"
@@ -84,59 +85,117 @@ def _unpack_embedding(data: bytes, dim: int = 3072) -> np.ndarray:
 
 # ── Public API ──
 
-def store_exact_match(org_id: str, prompt_hash: str, response: str, model: str, ttl_seconds: int = 604800):
-    """Store an exact-match cache entry in Redis. TTL defaults to 7 days."""
+def store_entry(
+    org_id: str,
+    prompt_hash: str,
+    response: str,
+    model: str,
+    embedding: Optional[np.ndarray] = None,
+    ttl_seconds: int = 604800,
+) -> bool:
+    """
+    Store a cache entry in one round trip. TTL defaults to 7 days.
+
+    The entry is a single hash (response_hash, model, created_at, use_count
+    and the binary embedding). The response body is stored once per org
+    under its content hash (compressed), so prompts sharing an answer share
+    the bytes.
+    """
     r = _get_redis()
     if r is None:
         return False
     try:
-        key = _exact_key(org_id, prompt_hash)
-        value = json.dumps({
-            "response": response,
+        from response_store import pack_response, response_hash
+        digest = response_hash(response).hex()
+        resp_key = _resp_key(org_id, digest)
+        key = _entry_key(org_id, prompt_hash)
+        fields = {
+            "response_hash": digest,
             "model": model,
-            "created_at": time.time(),
+            "created_at": repr(time.time()),
             "use_count": 0,
-        })
-        r.setex(key, ttl_seconds, value.encode("utf-8"))
+        }
+        if embedding is not None:
+            fields["embedding"] = _pack_embedding(embedding)
+        pipe = r.pipeline(transaction=False)
+        pipe.set(resp_key, pack_response(response), ex=ttl_seconds, nx=True)
+        pipe.expire(resp_key, ttl_seconds, gt=True)  # body outlives every entry pointing at it
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, ttl_seconds)
+        pipe.execute()
         return True
     except Exception as e:
-        logger.warning("Redis store_exact_match failed: %s", e)
+        logger.warning("Redis store_entry failed: %s", e)
         return False
 
 
+def store_exact_match(org_id: str, prompt_hash: str, response: str, model: str, ttl_seconds: int = 604800):
+    """Store an exact-match cache entry without an embedding (see store_entry)."""
+    return store_entry(org_id, prompt_hash, response, model, None, ttl_seconds)
+
+
 def get_exact_match(org_id: str, prompt_hash: str, model: str) -> Optional[str]:
-    """Retrieve an exact-match cache entry from Redis."""
+    """Retrieve an exact-match cache entry from Redis and bump its use_count."""
     r = _get_redis()
     if r is None:
         return None
     try:
-        key = _exact_key(org_id, prompt_hash)
-        data = r.get(key)
-        if data is None:
+        key = _entry_key(org_id, prompt_hash)
+        entry_model, digest = r.hmget(key, ["model", "response_hash"])
+        if entry_model is None or entry_model.decode() != model:
             return None
-        entry = json.loads(data.decode("utf-8"))
-        if entry.get("model") != model:
+        pipe = r.pipeline(transaction=False)
+        pipe.hincrby(key, "use_count", 1)
+        pipe.get(_resp_key(org_id, digest.decode()))
+        _, blob = pipe.execute()
+        if blob is None:
             return None
-        # Bump use_count async
-        entry["use_count"] = entry.get("use_count", 0) + 1
-        try:
-            r.set(key, json.dumps(entry).encode("utf-8"), keepttl=True)
-        except Exception:
-            pass
-        return entry["response"]
+        from response_store import unpack_response
+        return unpack_response(blob)
     except Exception as e:
         logger.warning("Redis get_exact_match failed: %s", e)
         return None
 
 
+def get_exact_matches(org_id: str, prompt_hashes: List[str], model: str) -> Dict[str, str]:
+    """Bulk exact-match lookup: one pipelined HMGET round trip plus one MGET for the bodies."""
+    r = _get_redis()
+    if r is None or not prompt_hashes:
+        return {}
+    try:
+        pipe = r.pipeline(transaction=False)
+        for prompt_hash in prompt_hashes:
+            pipe.hmget(_entry_key(org_id, prompt_hash), ["model", "response_hash"])
+        found = [
+            (prompt_hash, digest.decode())
+            for prompt_hash, (entry_model, digest) in zip(prompt_hashes, pipe.execute())
+            if entry_model is not None and entry_model.decode() == model
+        ]
+        if not found:
+            return {}
+        blobs = r.mget([_resp_key(org_id, digest) for _, digest in found])
+        from response_store import unpack_response
+        return {
+            prompt_hash: unpack_response(blob)
+            for (prompt_hash, _), blob in zip(found, blobs)
+            if blob is not None
+        }
+    except Exception as e:
+        logger.warning("Redis get_exact_matches failed: %s", e)
+        return {}
+
+
 def store_embedding(org_id: str, prompt_hash: str, embedding: np.ndarray, ttl_seconds: int = 604800):
-    """Store an embedding vector in Redis."""
+    """Attach an embedding vector to an existing entry (prefer store_entry for new entries)."""
     r = _get_redis()
     if r is None:
         return False
     try:
-        key = _emb_key(org_id, prompt_hash)
-        r.setex(key, ttl_seconds, _pack_embedding(embedding))
+        key = _entry_key(org_id, prompt_hash)
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(key, "embedding", _pack_embedding(embedding))
+        pipe.expire(key, ttl_seconds)
+        pipe.execute()
         return True
     except Exception as e:
         logger.warning("Redis store_embedding failed: %s", e)
@@ -149,8 +208,7 @@ def get_embedding(org_id: str, prompt_hash: str) -> Optional[np.ndarray]:
     if r is None:
         return None
     try:
-        key = _emb_key(org_id, prompt_hash)
-        data = r.get(key)
+        data = r.hget(_entry_key(org_id, prompt_hash), "embedding")
         if data is None:
             return None
         return _unpack_embedding(data)
@@ -223,10 +281,16 @@ def flush_org(org_id: str) -> int:
         return 0
     try:
         pattern = f"org:{org_id}:*"
-        keys = list(r.scan_iter(match=pattern, count=1000))
-        if keys:
-            return r.delete(*keys)
-        return 0
+        deleted = 0
+        batch = []
+        for key in r.scan_iter(match=pattern, count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                deleted += r.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += r.unlink(*batch)
+        return deleted
     except Exception as e:
         logger.warning("Redis flush_org failed: %s", e)
         return 0
@@ -0,0 +1,210 @@
+"""
+Response Store Module
+Content-addressed, compressed response bodies for one tenant.
+
+Identical responses (common when near-duplicate prompts get the same
+answer) are stored once, keyed by their hash. Bodies are zstd-compressed;
+once a tenant has enough responses a zstd dictionary is trained on them so
+short, similar answers compress well too. Bodies are only decompressed when
+a cache hit actually returns them. Without the optional `zstandard` package
+responses are still deduplicated but stored uncompressed.
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("semantis.response_store")
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional dependency
+    zstd = None
+
+ZSTD_LEVEL = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+ZSTD_DICT_TRAIN_SAMPLES = int(os.getenv("RESPONSE_ZSTD_DICT_SAMPLES", "256"))
+ZSTD_DICT_SIZE = 16 * 1024
+
+# Below this size compression framing costs more than it saves
+MIN_COMPRESS_BYTES = 64
+
+CODEC_RAW = 0
+CODEC_ZSTD = 1
+CODEC_ZSTD_DICT = 2
+
+_tls = threading.local()
+
+
+def response_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def pack_response(text: str) -> bytes:
+    """Standalone (dictionary-less) encoding for external stores such as Redis: codec byte + body."""
+    data = text.encode("utf-8")
+    if zstd is not None and len(data) >= MIN_COMPRESS_BYTES:
+        compressor = getattr(_tls, "compressor", None)
+        if compressor is None:
+            compressor = _tls.compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+        compressed = compressor.compress(data)
+        if len(compressed) < len(data):
+            return bytes([CODEC_ZSTD]) + compressed
+    return bytes([CODEC_RAW]) + data
+
+
+def unpack_response(blob: bytes) -> str:
+    codec, body = blob[0], blob[1:]
+    if codec == CODEC_ZSTD:
+        decompressor = getattr(_tls, "decompressor", None)
+        if decompressor is None:
+            decompressor = _tls.decompressor = zstd.ZstdDecompressor()
+        body = decompressor.decompress(body)
+    return body.decode("utf-8")
+
+
+class ResponseStore:
+    """
+    Deduplicated response bodies stored as blobs in a shared arena (see
+    columnar_store.TextArena); rows reference them by response id.
+    """
+
+    def __init__(self, arena):
+        self.arena = arena
+        self.size = 0
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self.codecs = np.zeros(0, dtype=np.int8)
+        self.raw_bytes = 0  # sum of uncompressed sizes of unique bodies
+        self.by_hash: Dict[bytes, int] = {}
+        self.dictionary: Optional[bytes] = None
+        self._dict_key: Optional[bytes] = None
+        self._samples: List[bytes] = []  # training input until a dictionary exists
+        self._compressor = None
+
+    def _set_dictionary(self, dictionary: Optional[bytes]) -> None:
+        self.dictionary = dictionary
+        # Thread-local decompressors are cached by dictionary content
+        self._dict_key = hashlib.blake2b(dictionary, digest_size=16).digest() if dictionary else None
+        self._compressor = None
+
+    # ── Codec helpers ──
+
+    def _get_compressor(self):
+        if self._compressor is None:
+            if self.dictionary is not None:
+                self._compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zstd.ZstdCompressionDict(self.dictionary))
+            else:
+                self._compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+        return self._compressor
+
+    def _decompressor(self, codec: int):
+        # ZstdDecompressor objects are not safe to share between threads
+        cache = getattr(_tls, "decompressors", None)
+        if cache is None:
+            cache = _tls.decompressors = {}
+        key = self._dict_key if codec == CODEC_ZSTD_DICT else None
+        d = cache.get(key)
+        if d is None:
+            if codec == CODEC_ZSTD_DICT:
+                d = zstd.ZstdDecompressor(dict_data=zstd.ZstdCompressionDict(self.dictionary))
+            else:
+                d = zstd.ZstdDecompressor()
+            cache[key] = d
+        return d
+
+    def _maybe_train(self, data: bytes) -> None:
+        if self.dictionary is not None:
+            return
+        self._samples.append(data)
+        if len(self._samples) < ZSTD_DICT_TRAIN_SAMPLES:
+            return
+        try:
+            trained = zstd.train_dictionary(ZSTD_DICT_SIZE, self._samples)
+            self._set_dictionary(trained.as_bytes())
+            logger.info("Response dictionary trained | samples=%d | size=%d", len(self._samples), len(self.dictionary))
+        except Exception as e:
+            # Too little or too uniform input; try again with more samples
+            logger.debug("Response dictionary training failed: %s", e)
+            if len(self._samples) < 4 * ZSTD_DICT_TRAIN_SAMPLES:
+                return
+        self._samples = []
+
+    # ── Public API ──
+
+    def put(self, text: str) -> int:
+        """Store a response body (once per distinct text) and return its id."""
+        h = response_hash(text)
+        rid = self.by_hash.get(h)
+        if rid is not None:
+            return rid
+        data = text.encode("utf-8")
+        codec, blob = CODEC_RAW, data
+        if zstd is not None and len(data) >= MIN_COMPRESS_BYTES:
+            self._maybe_train(data)
+            compressed = self._get_compressor().compress(data)
+            if len(compressed) < len(data):
+                codec = CODEC_ZSTD_DICT if self.dictionary is not None else CODEC_ZSTD
+                blob = compressed
+        rid = self.size
+        if rid >= len(self.offsets):
+            self._grow(rid + 1)
+        self.offsets[rid], self.lengths[rid] = self.arena.append_bytes(blob)
+        self.codecs[rid] = codec
+        self.raw_bytes += len(data)
+        self.size = rid + 1
+        self.by_hash[h] = rid
+        return rid
+
+    def get(self, rid: int) -> str:
+        """Decompress and return a response body."""
+        blob = self.arena.get_bytes(int(self.offsets[rid]), int(self.lengths[rid]))
+        codec = int(self.codecs[rid])
+        if codec != CODEC_RAW:
+            blob = self._decompressor(codec).decompress(blob)
+        return blob.decode("utf-8")
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(64, len(self.offsets) * 2, min_capacity)
+        for name in ("offsets", "lengths", "codecs"):
+            old = getattr(self, name)
+            col = np.zeros(capacity, dtype=old.dtype)
+            col[:self.size] = old[:self.size]
+            setattr(self, name, col)
+
+    def stats(self) -> Dict:
+        return {
+            "unique": self.size,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": int(self.lengths[:self.size].sum()),
+            "dictionary": self.dictionary is not None,
+        }
+
+    # ── Serialization ──
+
+    def to_state(self) -> Dict:
+        return {
+            "size": self.size,
+            "offsets": self.offsets[:self.size].copy(),
+            "lengths": self.lengths[:self.size].copy(),
+            "codecs": self.codecs[:self.size].copy(),
+            "raw_bytes": self.raw_bytes,
+            "by_hash": dict(self.by_hash),
+            "dictionary": self.dictionary,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict, arena) -> "ResponseStore":
+        store = cls(arena)
+        size = state["size"]
+        store._grow(size)
+        store.offsets[:size] = state["offsets"]
+        store.lengths[:size] = state["lengths"]
+        store.codecs[:size] = state["codecs"]
+        store.size = size
+        store.raw_bytes = state.get("raw_bytes", 0)
+        store.by_hash = state["by_hash"]
+        store._set_dictionary(state.get("dictionary"))
+        return store
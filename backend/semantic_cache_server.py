@@ -14,10 +14,10 @@ FastAPI service providing:
  - Audit logging, API key scoping, per-org rate limits
 """
 
-import os, time, re, logging, hashlib, json
+import os, time, re, logging, hashlib, json, secrets
 from logging.handlers import RotatingFileHandler
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from collections import OrderedDict
 from contextvars import ContextVar
 import threading
@@ -104,6 +104,13 @@ def domain_hint(text: str) -> str:
 # -----------------------------
 # Embeddings & LLM
 # -----------------------------
+# All OpenAI requests go through the upstream manager: per-key bulkheads and
+# 429-aware rate limits, adaptive timeouts, hedged embeddings (upstream.py)
+from upstream import UPSTREAM_TIMEOUT_MAX_SECONDS, UpstreamBusy, UpstreamUnavailable, upstream
+# Misses are admitted through bounded, per-tenant fair queues so that hits
+# keep their worker threads when the LLM slows down (admission.py)
+from admission import Overloaded, admission
+
 def _get_user_openai_key(user_id: Optional[str]) -> Optional[str]:
     """Retrieve and decrypt the user's BYOK OpenAI key, or return None."""
     if not user_id:
@@ -145,7 +152,8 @@ def _get_openai_client(api_key: str):
     from openai import OpenAI
     with _client_lock:
         if api_key not in _openai_clients:
-            _openai_clients[api_key] = OpenAI(api_key=api_key, timeout=30.0, max_retries=1)
+            # Retries and timeouts are managed per call by upstream.call()
+            _openai_clients[api_key] = OpenAI(api_key=api_key, timeout=UPSTREAM_TIMEOUT_MAX_SECONDS, max_retries=0)
         return _openai_clients[api_key]
 
 def get_embedding(text: str, user_id: Optional[str] = None) -> np.ndarray:
@@ -160,7 +168,11 @@ def get_embedding(text: str, user_id: Optional[str] = None) -> np.ndarray:
     
     try:
         client = _get_openai_client(key)
-        resp = client.embeddings.create(model=EMBED_MODEL, input=prefixed)
+        resp = upstream.call(
+            key, "embedding",
+            lambda timeout: client.embeddings.create(model=EMBED_MODEL, input=prefixed, timeout=timeout),
+            hedge=True,
+        )
         v = np.array(resp.data[0].embedding, dtype="float32")
         v /= (np.linalg.norm(v) + 1e-12)
         embedding_time = round((time.time() - start_time) * 1000, 2)
@@ -181,13 +193,14 @@ def call_llm_stream(messages: List[dict], temperature: float = 0.2, user_id: Opt
     """OpenAI chat call with streaming. Yields SSE chunks."""
     key = _resolve_openai_key(user_id)
     client = _get_openai_client(key)
-    stream = client.chat.completions.create(
+    stream = upstream.stream(key, "chat", lambda timeout: client.chat.completions.create(
         model=CHAT_MODEL,
         messages=messages,
         temperature=temperature,
         max_tokens=1024,
         stream=True,
-    )
+        timeout=timeout,
+    ))
     for chunk in stream:
         if chunk.choices and chunk.choices[0].delta.content:
             yield chunk.choices[0].delta.content
@@ -201,12 +214,13 @@ def call_llm(messages: List[dict], temperature: float = 0.2, user_id: Optional[s
     
     try:
         client = _get_openai_client(key)
-        resp = client.chat.completions.create(
+        resp = upstream.call(key, "chat", lambda timeout: client.chat.completions.create(
             model=CHAT_MODEL,
             messages=messages,
             temperature=temperature,
             max_tokens=1024,
-        )
+            timeout=timeout,
+        ))
         llm_time = round((time.time() - start_time) * 1000, 2)
         response_text = resp.choices[0].message.content.strip()
         completion_tokens = len(response_text.split())
@@ -226,24 +240,39 @@ def call_llm(messages: List[dict], temperature: float = 0.2, user_id: Optional[s
         )
         raise
 
+# Serve entries up to STALE_GRACE_SECONDS past expiry (flagged meta.stale) while
+# one background call refreshes them, and refresh entries used at least
+# REFRESH_AHEAD_MIN_USES times once they are within REFRESH_AHEAD_SECONDS of
+# expiry. Defaults for new tenants; each tenant can change them via /settings.
+STALE_GRACE_SECONDS = int(os.getenv("STALE_GRACE_SECONDS", "0"))
+REFRESH_AHEAD_SECONDS = int(os.getenv("REFRESH_AHEAD_SECONDS", "0"))
+REFRESH_AHEAD_MIN_USES = int(os.getenv("REFRESH_AHEAD_MIN_USES", "10"))
+
+# Degraded mode: when the upstream call fails (circuit open, saturated or
+# erroring), answer from the best cached entry whose similarity is within
+# DEGRADED_SIM_MARGIN of the tenant threshold and that expired less than
+# DEGRADED_MAX_STALE_SECONDS ago, flagged meta.degraded, instead of a 5xx.
+DEGRADED_MODE = os.getenv("DEGRADED_MODE", "true").lower() == "true"
+DEGRADED_SIM_MARGIN = float(os.getenv("DEGRADED_SIM_MARGIN", "0.08"))
+DEGRADED_MAX_STALE_SECONDS = int(os.getenv("DEGRADED_MAX_STALE_SECONDS", str(30 * 24 * 3600)))
+
+# Which new entries go into the vector index (tinylfu.py). "all" indexes every
+# miss; "exact_one_offs" keeps entries that are not yet frequent exact-only;
+# "drop_one_offs" does not store them at all. Default for new tenants.
+CACHE_ADMISSION_POLICY = os.getenv("CACHE_ADMISSION_POLICY", "all")
+_ADMISSION_POLICIES = ("all", "exact_one_offs", "drop_one_offs")
+
 # -----------------------------
 # Cache data models
 # -----------------------------
-@dataclass
-class CacheEntry:
-    prompt_norm: str
-    response_text: str
-    embedding: np.ndarray
-    model: str
-    ttl_seconds: int
-    created_at: float = field(default_factory=time.time)
-    last_used_at: float = field(default_factory=time.time)
-    use_count: int = 0
-    domain: str = "general"
-    strategy: str = "miss"  # exact | semantic | miss
-
-    def fresh(self) -> bool:
-        return (time.time() - self.created_at) < self.ttl_seconds
+# Entries live in a per-tenant ColumnarStore (numpy columns + text arena +
+# the FAISS flat storage as embedding matrix); CacheEntry is a view of one row.
+from columnar_store import CacheEntry, ColumnarStore, ExactView, RowsView
+import speculative_llm
+from speculative_llm import SPECULATIVE_LLM, SPECULATIVE_MAX_HIT_PROB, SpeculationStats
+import tinylfu
+from tinylfu import FrequencySketch
+import compaction
 
 @dataclass
 class CacheEvent:
@@ -258,10 +287,7 @@ class CacheEvent:
 
 @dataclass
 class TenantState:
-    exact: Dict[str, CacheEntry] = field(default_factory=dict)
-    index: Optional[faiss.IndexFlatIP] = None
-    rows: List[CacheEntry] = field(default_factory=list)
-    dim: Optional[int] = None
+    store: ColumnarStore = field(default_factory=ColumnarStore)
     # metrics
     hits: int = 0
     misses: int = 0
@@ -271,38 +297,126 @@ class TenantState:
     sim_threshold: float = 0.75
     # domain-specific thresholds
     domain_thresholds: Dict[str, float] = field(default_factory=dict)  # domain -> threshold
+    # speculative LLM calls on exact misses (see speculative_llm.py)
+    speculative_llm: bool = SPECULATIVE_LLM
+    speculative_max_hit_prob: float = SPECULATIVE_MAX_HIT_PROB
+    hit_prob: float = 0.5  # EWMA of semantic-tier hits, the speculation predictor
+    speculation: SpeculationStats = field(default_factory=SpeculationStats)
+    # stale-while-revalidate / refresh-ahead (0 disables either)
+    stale_grace_seconds: int = STALE_GRACE_SECONDS
+    refresh_ahead_seconds: int = REFRESH_AHEAD_SECONDS
+    refresh_min_uses: int = REFRESH_AHEAD_MIN_USES
+    stale_hits: int = 0
+    revalidations: int = 0
+    degraded_hits: int = 0  # answered in degraded mode while upstream was failing
+    admission_policy: str = CACHE_ADMISSION_POLICY
+    sketch: Optional[FrequencySketch] = None  # created on the first filtered insert
+    entries_admitted: int = 0
+    entries_exact_only: int = 0
+    entries_rejected: int = 0
+    entries_promoted: int = 0  # exact-only entries indexed once reused
+    compacted_nvec: int = 0  # index size after the last compaction
+    compaction_runs: int = 0
+    compaction_merged: int = 0
+    compaction_bytes_reclaimed: int = 0
+    last_compaction: Optional[dict] = None
     # events log
     events: List[CacheEvent] = field(default_factory=list)
+    # lazy loading: resident tenants idle past TENANT_IDLE_OFFLOAD_SECONDS are spilled
+    last_access_at: float = field(default_factory=time.time)
+    # True while the in-memory index is rebuilt from the L3 tier; lookups go to Postgres meanwhile
+    cold: bool = False
+
+    @property
+    def exact(self) -> ExactView:
+        return ExactView(self.store)
+
+    @property
+    def rows(self) -> RowsView:
+        return RowsView(self.store)
+
+    @property
+    def index(self) -> Optional[faiss.IndexFlatIP]:
+        return self.store.index
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.store.dim
+
+
+# TenantState fields set through PUT /settings. They are saved in the tenant's
+# snapshot, and reader workers take them from the writer's snapshot.
+TENANT_SETTINGS = (
+    "sim_threshold", "speculative_llm", "speculative_max_hit_prob", "stale_grace_seconds",
+    "refresh_ahead_seconds", "refresh_min_uses", "admission_policy",
+)
 
 # -----------------------------
 # Core semantic cache service
 # -----------------------------
+# Tenants are loaded on first access from their per-tenant snapshot and spilled
+# back to disk once idle, so RSS tracks the active tenant set.
+TENANT_IDLE_OFFLOAD_SECONDS = int(os.getenv("TENANT_IDLE_OFFLOAD_SECONDS", "1800"))
+TENANT_MEMORY_BUDGET_MB = int(os.getenv("TENANT_MEMORY_BUDGET_MB", "0"))  # 0 = unlimited
+TENANT_OFFLOAD_CHECK_SECONDS = 30
+
+# Neighbours considered per semantic lookup (after freshness/model filtering)
+SEMANTIC_SEARCH_K = int(os.getenv("SEMANTIC_SEARCH_K", "5"))
+
+# RAG answers are stored under "<model>#rag" so plain queries never match them
+RAG_MODEL_SUFFIX = "#rag"
+
+# Lookup-only misses hand out a token that lets PUT /v1/cache/entries reuse the
+# lookup's embedding. Tokens are process-local; PUT falls back to re-embedding.
+LOOKUP_TOKEN_TTL_SECONDS = int(os.getenv("LOOKUP_TOKEN_TTL_SECONDS", "600"))
+_LOOKUP_TOKEN_MAX = 10000
+
 class SemanticCacheService:
     def __init__(self):
-        self.tenants: Dict[str, TenantState] = {}
+        self.tenants: Dict[str, TenantState] = {}  # resident tenants only
         self._embedding_cache: OrderedDict[str, np.ndarray] = OrderedDict()
         self._embedding_cache_max_size = 1000
         self._cache_lock = threading.Lock()
+        self._tenants_lock = threading.Lock()
+        self._dirty_tenants: set = set()
+        self._shared = None  # SharedIndexSync when SEMANTIS_MULTIWORKER=true
+        self._l3_enabled = False  # Postgres/pgvector cold tier (L3_VECTOR_CACHE=true)
+        # lookup token -> (expires_at, tenant, prompt_norm, model, embedding, user text)
+        self._lookup_tokens: OrderedDict[str, tuple] = OrderedDict()
+        self._lookup_lock = threading.Lock()
+        # (tenant, model, prompt_norm) of entries with a background refresh in flight
+        self._revalidating: set = set()
+        # (tenant, prompt_norm) of exact-only entries being embedded for the index
+        self._promoting: set = set()
+        self._revalidate_lock = threading.Lock()
         self._load_cache()
     
     def _load_cache(self):
-        """Load cache from pickle (local fallback), then warm from Redis if available."""
+        """Prepare lazy per-tenant loading (migrating a legacy cache.pkl once), then check Redis."""
         try:
-            from cache_persistence import load_cache
-            start_time = time.time()
-            loaded_tenants = load_cache()
-            load_time = round((time.time() - start_time) * 1000, 2)
-            if loaded_tenants:
-                total_entries = sum(len(t.rows) for t in loaded_tenants.values())
-                self.tenants.update(loaded_tenants)
-                system_log.info(
-                    f"Cache loaded from disk | tenants={len(loaded_tenants)} | "
-                    f"entries={total_entries} | time={load_time}ms"
-                )
-            else:
-                system_log.info(f"Cache load | no local cache found | time={load_time}ms")
+            from shared_index import MULTIWORKER_ENABLED, SharedIndexSync
+            if MULTIWORKER_ENABLED:
+                self._shared = SharedIndexSync(self)
         except Exception as e:
-            error_log.exception(f"Cache load failed | error={str(e)}")
+            error_log.exception(f"Shared index init failed, running single-process | error={str(e)}")
+            self._shared = None
+
+        if self._shared is None or self._shared.is_writer:
+            self._migrate_legacy_cache()
+        if self._shared is not None:
+            self._shared.start()
+            system_log.info(f"Shared index | role={'writer' if self._shared.is_writer else 'reader'}")
+        threading.Thread(target=self._offload_loop, name="tenant-offload", daemon=True).start()
+        if compaction.COMPACTION_INTERVAL_SECONDS:
+            threading.Thread(target=self._compaction_loop, name="cache-compaction", daemon=True).start()
+
+        try:
+            from l3_cache import L3_ENABLED
+            self._l3_enabled = L3_ENABLED
+            if L3_ENABLED:
+                system_log.info("L3 vector cache enabled (pgvector)")
+        except Exception as e:
+            error_log.warning(f"L3 vector cache unavailable | error={e}")
         
         # Check Redis availability
         try:
@@ -313,17 +427,51 @@ class SemanticCacheService:
                 system_log.info("Redis not available, using in-memory only")
         except Exception:
             pass
+
+    def _migrate_legacy_cache(self):
+        """Split a monolithic cache.pkl into per-tenant snapshots (runs once)."""
+        try:
+            from cache_persistence import CACHE_FILE, load_cache, snapshot_tenant, write_tenant_snapshot
+            if not os.path.exists(CACHE_FILE):
+                return
+            start_time = time.time()
+            loaded_tenants = load_cache() or {}
+            for tenant_id, T in loaded_tenants.items():
+                write_tenant_snapshot(tenant_id, snapshot_tenant(T))
+            os.replace(CACHE_FILE, CACHE_FILE + ".migrated")
+            system_log.info(
+                f"Cache migrated to per-tenant snapshots | tenants={len(loaded_tenants)} | "
+                f"time={round((time.time() - start_time) * 1000, 2)}ms"
+            )
+        except Exception as e:
+            error_log.exception(f"Cache migration failed | error={str(e)}")
     
-    def _save_cache(self):
-        """Save cache to disk periodically."""
+    def _save_cache(self, tenant_ids: Optional[List[str]] = None):
+        """Write snapshots for the given resident tenants (default: those with new entries)."""
+        if self._shared is not None and not self._shared.is_writer:
+            return  # only the writer owns the snapshots
         try:
-            from cache_persistence import save_cache
+            from cache_persistence import snapshot_tenant, write_tenant_snapshot
+            with self._cache_lock:
+                if tenant_ids is None:
+                    tenant_ids, self._dirty_tenants = list(self._dirty_tenants), set()
+                else:
+                    self._dirty_tenants.difference_update(tenant_ids)
+            if not tenant_ids:
+                return
             start_time = time.time()
-            total_entries = sum(len(t.rows) for t in self.tenants.values())
-            save_cache(self.tenants)
+            total_entries = 0
+            for tenant_id in tenant_ids:
+                T = self.tenants.get(tenant_id)
+                if T is None:
+                    continue
+                with self._cache_lock:
+                    snapshot = snapshot_tenant(T)
+                total_entries += snapshot["store"]["size"]
+                write_tenant_snapshot(tenant_id, snapshot)
             save_time = round((time.time() - start_time) * 1000, 2)
             system_log.info(
-                f"Cache saved | tenants={len(self.tenants)} | "
+                f"Cache saved | tenants={len(tenant_ids)} | "
                 f"entries={total_entries} | time={save_time}ms"
             )
         except Exception as e:
@@ -331,9 +479,173 @@ class SemanticCacheService:
             system_log.error(f"Could not save cache to disk: {e}")
 
     def tenant(self, tenant_id: str) -> TenantState:
-        if tenant_id not in self.tenants:
-            self.tenants[tenant_id] = TenantState()
-        return self.tenants[tenant_id]
+        T = self.tenants.get(tenant_id)
+        if T is None:
+            with self._tenants_lock:
+                T = self.tenants.get(tenant_id)
+                if T is None:
+                    T = self._load_tenant(tenant_id)
+                    self.tenants[tenant_id] = T
+        T.last_access_at = time.time()
+        return T
+
+    def _load_tenant(self, tenant_id: str) -> TenantState:
+        """Materialize a tenant from its snapshot (mmap'd on shared-index readers)."""
+        start_time = time.time()
+        try:
+            if self._shared is not None:
+                T = self._shared.load(tenant_id)
+            else:
+                from cache_persistence import load_tenant_snapshot
+                _, T = load_tenant_snapshot(tenant_id)
+        except Exception as e:
+            error_log.exception(f"Tenant load failed | tenant={tenant_id} | error={str(e)}")
+            T = None
+        if T is None:
+            if self._l3_enabled:
+                T = TenantState(cold=True)
+                threading.Thread(target=self._rebuild_from_l3, args=(tenant_id, T), daemon=True).start()
+                return T
+            return TenantState()
+        system_log.info(
+            f"Tenant loaded | tenant={tenant_id} | entries={len(T.rows)} | "
+            f"time={round((time.time() - start_time) * 1000, 2)}ms"
+        )
+        return T
+
+    def _rebuild_from_l3(self, tenant_id: str, T: TenantState):
+        """Load a cold tenant's entries from L3 and swap them in as its in-memory store."""
+        start_time = time.time()
+        try:
+            from l3_cache import load_tenant
+            store = load_tenant(tenant_id)
+            if store is not None:
+                with self._cache_lock:
+                    # Keep entries inserted while the rebuild was running
+                    for entry in T.rows:
+                        if entry.prompt_norm not in store.exact:
+                            store.add(**entry.fields())
+                    T.store = store
+                    self._dirty_tenants.add(tenant_id)
+                system_log.info(
+                    f"Tenant rebuilt from L3 | tenant={tenant_id} | entries={store.size} | "
+                    f"time={round((time.time() - start_time) * 1000, 2)}ms"
+                )
+        except Exception as e:
+            error_log.warning(f"L3 rebuild failed | tenant={tenant_id} | error={e}")
+        finally:
+            T.cold = False
+
+    @staticmethod
+    def _tenant_nbytes(T: TenantState) -> int:
+        """Approximate resident size: columns, vectors and text arena."""
+        return T.store.nbytes()
+
+    def offload_tenant(self, tenant_id: str) -> bool:
+        """Persist a resident tenant and drop it from memory."""
+        T = self.tenants.get(tenant_id)
+        if T is None:
+            return False
+        self._save_cache([tenant_id])
+        with self._tenants_lock:
+            if self.tenants.get(tenant_id) is not T:
+                return False
+            del self.tenants[tenant_id]
+        if self._shared is not None:
+            self._shared.forget(tenant_id, T)
+        system_log.info(f"Tenant offloaded | tenant={tenant_id} | entries={len(T.rows)}")
+        return True
+
+    def _offload_idle(self):
+        now = time.time()
+        resident = sorted(list(self.tenants.items()), key=lambda kv: kv[1].last_access_at)
+        for tenant_id, T in resident:
+            if TENANT_IDLE_OFFLOAD_SECONDS and now - T.last_access_at > TENANT_IDLE_OFFLOAD_SECONDS:
+                self.offload_tenant(tenant_id)
+        if TENANT_MEMORY_BUDGET_MB:
+            budget = TENANT_MEMORY_BUDGET_MB * 1024 * 1024
+            resident = sorted(list(self.tenants.items()), key=lambda kv: kv[1].last_access_at)
+            sizes = {tid: self._tenant_nbytes(T) for tid, T in resident}
+            used = sum(sizes.values())
+            # Least recently used first; never evict a tenant touched in the last check interval
+            for tenant_id, T in resident:
+                if used <= budget or now - T.last_access_at < TENANT_OFFLOAD_CHECK_SECONDS:
+                    break
+                if self.offload_tenant(tenant_id):
+                    used -= sizes.get(tenant_id, 0)
+
+    def _offload_loop(self):
+        while True:
+            time.sleep(TENANT_OFFLOAD_CHECK_SECONDS)
+            try:
+                self._offload_idle()
+            except Exception as e:
+                error_log.warning(f"Tenant offload failed | error={e}")
+
+    def compact_tenant(self, tenant_id: str) -> Optional[dict]:
+        """
+        Merge a resident tenant's near-duplicate entries and swap in the
+        compacted store (compaction.py). Entries inserted while it runs are
+        carried over. Returns the report, or None if the tenant was skipped.
+        """
+        T = self.tenants.get(tenant_id)
+        if T is None or T.cold:
+            return None
+        start_time = time.time()
+        pace = compaction.Pacer()
+        with self._cache_lock:
+            old = T.store
+            size = old.size
+            vectors = np.array(old.embeddings)
+            exact = dict(old.exact)
+        redirect = compaction.plan(old, size, vectors, time.time(), pace=pace)
+        merged = int((redirect != np.arange(size)).sum())
+        report = {
+            "entries_before": size,
+            "entries_after": size - merged,
+            "merged": merged,
+            "bytes_reclaimed": 0,
+            "duration_ms": 0.0,
+        }
+        if merged:
+            new, new_of = old.compacted(size, redirect, vectors, exact, lock=self._cache_lock, pace=pace)
+            with self._cache_lock:
+                if T.store is not old:  # replaced meanwhile (L3 rebuild)
+                    return None
+                new.merge_usage(old, new_of)
+                for row in range(size, old.size):
+                    new.add(**CacheEntry(old, row).fields())
+                report["entries_after"] = new.size - (old.size - size)
+                report["bytes_reclaimed"] = max(0, old.nbytes() - new.nbytes())
+                T.store = new
+                self._dirty_tenants.add(tenant_id)
+        T.compacted_nvec = T.store.nvec
+        report["duration_ms"] = round((time.time() - start_time) * 1000, 2)
+        T.compaction_runs += 1
+        T.compaction_merged += merged
+        T.compaction_bytes_reclaimed += report["bytes_reclaimed"]
+        T.last_compaction = dict(report, at=round(time.time(), 3))
+        system_log.info(
+            f"Tenant compacted | tenant={tenant_id} | entries={report['entries_before']}->{report['entries_after']} | "
+            f"reclaimed={report['bytes_reclaimed']}B | time={report['duration_ms']}ms"
+        )
+        return report
+
+    def _compaction_loop(self):
+        while True:
+            time.sleep(compaction.COMPACTION_INTERVAL_SECONDS)
+            # Readers serve the writer's snapshots and never rewrite their own
+            if self._shared is not None and not self._shared.is_writer:
+                continue
+            due = [(tid, T) for tid, T in list(self.tenants.items())
+                   if not T.cold and compaction.due(T.store.nvec, T.compacted_nvec)]
+            # Most growth since the last run first
+            due.sort(key=lambda kv: kv[1].compacted_nvec - kv[1].store.nvec)
+            for tenant_id, _ in due:
+                try:
+                    self.compact_tenant(tenant_id)
+                except Exception as e:
+                    error_log.warning(f"Tenant compaction failed | tenant={tenant_id} | error={e}")
 
     @staticmethod
     def norm_text(s: str) -> str:
@@ -372,42 +684,69 @@ class SemanticCacheService:
         if len(T.events) > 1000:
             T.events = T.events[-1000:]
 
-    def _faiss_add(self, T: TenantState, emb: np.ndarray):
-        v = emb.astype("float32").reshape(1, -1)
-        faiss.normalize_L2(v)
-        if T.index is None:
-            T.dim = v.shape[1]
-            T.index = faiss.IndexFlatIP(T.dim)
-        T.index.add(v)
+    def update_settings(self, tenant_id: str, settings: dict) -> None:
+        """
+        Apply PUT /settings values (TENANT_SETTINGS fields) to a tenant and
+        mark it for the next snapshot. A reader worker applies them locally
+        and spools them to the writer, whose next snapshot carries them to
+        every other worker.
+        """
+        T = self.tenant(tenant_id)
+        with self._cache_lock:
+            for name, value in settings.items():
+                setattr(T, name, value)
+            self._dirty_tenants.add(tenant_id)
+        if self._shared is not None and not self._shared.is_writer:
+            self._shared.spool_settings(tenant_id, settings)
+
+    def _insert_local(self, tenant_id: str, T: TenantState, fields: dict):
+        """Append an entry to this process's store (columns, exact map and FAISS index)."""
+        with self._cache_lock:
+            T.store.add(**fields)
+            self._dirty_tenants.add(tenant_id)
+
+    def _insert_entry(self, tenant_id: str, T: TenantState, fields: dict) -> bool:
+        """
+        Insert a new entry given as ColumnarStore.add keyword fields. In
+        multi-worker mode a reader must not touch its mmap'd index, so it
+        serves the entry from its exact map and spools it to the writer,
+        which publishes it to every worker on its next tick.
+        Returns True if the entry went into this process's index.
+        """
+        T = self.tenant(tenant_id)  # the caller's T may have been offloaded meanwhile
+        fields.setdefault("created_at", time.time())
+        if self._shared is not None and not self._shared.is_writer:
+            with self._cache_lock:
+                T.store.add(**dict(fields, index_vector=False))
+            self._shared.spool(tenant_id, dict(fields, embedding=np.asarray(fields["embedding"], dtype="float32")))
+            return False
+        self._insert_local(tenant_id, T, fields)
+        return True
 
     def _faiss_search(self, T: TenantState, emb: np.ndarray, k: int = 1) -> Tuple[int, float]:
-        """Search FAISS index. Returns (index, similarity)."""
-        q = emb.astype("float32").reshape(1, -1)
-        faiss.normalize_L2(q)
-        k = min(k, len(T.rows))  # Don't search more than available
-        sims, idxs = T.index.search(q, k)
-        if k == 1:
-            return int(idxs[0][0]), float(sims[0][0])
-        # Return best match
-        best_idx = int(idxs[0][0])
-        best_sim = float(sims[0][0])
-        return best_idx, best_sim
+        """Search FAISS index. Returns (row, similarity) of the best match."""
+        sims, rows = T.store.search(emb, k)
+        if len(rows) == 0:
+            return -1, 0.0
+        return int(rows[0]), float(sims[0])
     
     def _faiss_search_top_k(self, T: TenantState, emb: np.ndarray, k: int = 3) -> List[Tuple[int, float]]:
-        """Search FAISS index and return top k matches. Returns list of (index, similarity)."""
-        q = emb.astype("float32").reshape(1, -1)
-        faiss.normalize_L2(q)
-        search_k = min(k, len(T.rows))
-        if search_k == 0:
-            return []
-        sims, idxs = T.index.search(q, search_k)
-        results = []
-        for i in range(search_k):
-            idx_val = int(idxs[0][i])
-            sim_val = float(sims[0][i])
-            if idx_val >= 0 and idx_val < len(T.rows):  # Valid index
-                results.append((idx_val, sim_val))
-        return results
+        """Search FAISS index and return top k matches. Returns list of (row, similarity)."""
+        sims, rows = T.store.search(emb, k)
+        return [(int(r), float(sim)) for r, sim in zip(rows, sims) if r >= 0]
+
+    @staticmethod
+    def entry_id(prompt_norm: str, model: str) -> str:
+        """Identity of a cache entry as reported to clients: its prompt under its model."""
+        return hashlib.md5(f"{model}\x1f{prompt_norm}".encode()).hexdigest()
+
+    @classmethod
+    def _entry_meta(cls, store, row: int) -> dict:
+        """Identity and expiry of the served entry, so SDK-side caches can share and expire it."""
+        return {
+            "entry_id": cls.entry_id(store.prompt(row), store.models[int(store.model_id[row])]),
+            "expires_at": round(float(store.expires_at[row]), 3),
+        }
 
     def query(
         self,
@@ -418,7 +757,8 @@ class SemanticCacheService:
         ttl_seconds: int = 7 * 24 * 3600,
         temperature: float = 0.2,
         user_id: Optional[str] = None,
-    ) -> Tuple[str, dict]:
+        lookup_only: bool = False,
+    ) -> Tuple[Optional[str], dict]:
         """
         Two-tier cache lookup:
           1. Exact match on lowercased text (sub-ms).
@@ -426,57 +766,123 @@ class SemanticCacheService:
              inherently handles spelling errors, synonyms, rephrasing, and
              question-vs-statement variations. A single threshold (0.80) is all
              that is needed; no Jaccard/word-overlap heuristics.
-        On miss: LLM + embedding run in parallel to minimize latency.
+        On miss the LLM is called after the semantic tier has missed, and the
+        entry is embedded/stored in the background. Tenants with speculative_llm
+        start the LLM call right after the exact miss instead, in parallel with
+        embedding + search, and abandon it on a semantic hit.
+        With lookup_only a miss returns (None, meta) without calling the LLM;
+        meta["lookup_token"] lets put_entry() store the caller's own answer
+        under this prompt without embedding it again.
         """
         T = self.tenant(tenant_id)
         t0 = time.time()
         prompt_hash = hashlib.md5(prompt_norm.encode()).hexdigest()
 
+        store = T.store
+
         # ── 1) Exact match (sub-millisecond) ──
-        if prompt_norm in T.exact:
-            entry = T.exact[prompt_norm]
-            if entry.fresh() and entry.model == model:
-                entry.use_count += 1
-                entry.last_used_at = time.time()
+        # Lookup-only callers write back themselves, so they never get stale entries
+        grace = 0 if lookup_only else T.stale_grace_seconds
+        row = store.exact.get(prompt_norm)
+        if row is not None:
+            now = time.time()
+            if store.eligible_mask([row], model, now, grace)[0]:
+                store.touch(row, now)
                 T.hits += 1
                 latency = round((time.time() - t0) * 1000, 2)
                 T.latencies_ms.append(latency)
-                meta = {"hit": "exact", "similarity": 1.0, "latency_ms": latency, "strategy": "exact"}
+                meta = {"hit": "exact", "similarity": 1.0, "latency_ms": latency, "strategy": "exact",
+                        **self._entry_meta(store, row)}
+                if not lookup_only:
+                    meta.update(self._revalidate_if_due(tenant_id, T, row, model, now, temperature, user_id, messages))
+                if store.vec_pos[row] < 0:
+                    self._promote_if_reused(tenant_id, T, row, model, messages, user_id)
                 semantic_log.info(f"{tenant_id} | exact | sim=1.000 | key={prompt_norm[:80]}")
                 self._append_event(T, tenant_id, prompt_hash, "exact", 1.0, latency)
-                return entry.response_text, meta
+                return store.response(row), meta
+
+        # Speculative mode: the LLM call overlaps embedding + search
+        spec = None
+        if not lookup_only and speculative_llm.should_speculate(
+                T.speculative_llm, T.hit_prob, T.speculative_max_hit_prob):
+            # A speculative call holds a miss slot like any miss, but never waits for one
+            if admission.try_acquire(tenant_id):
+                spec_started = time.time()
+                spec = speculative_llm.start(
+                    call_llm, messages, temperature, user_id, T.speculation,
+                    on_done=lambda: admission.release(tenant_id, time.time() - spec_started),
+                )
+            else:
+                T.speculation.skipped_busy += 1
 
         # ── 2) Semantic search via FAISS cosine similarity ──
         query_emb = None
         query_text = prompt_norm
         SIM_THRESHOLD = T.sim_threshold  # default 0.65, but embedding quality makes 0.80+ reliable
 
-        if T.index is not None and len(T.rows) > 0:
-            query_emb, query_text = self._get_embedding_for_query(messages, user_id=user_id)
-
-            k = min(5, len(T.rows))
-            q = query_emb.astype("float32").reshape(1, -1)
-            faiss.normalize_L2(q)
-            sims, idxs = T.index.search(q, k)
+        # Cold tenant (index still loading from L3): ask pgvector instead
+        if T.cold:
+            try:
+                query_emb, query_text = self._get_embedding_for_query(messages, user_id=user_id)
+            except Exception as e:
+                if spec is not None:
+                    spec.abandon(T.speculation, tenant_id)
+                return self._degraded_or_raise(tenant_id, T, prompt_norm, model, None, t0, prompt_hash, e)
+            try:
+                from l3_cache import search as l3_search
+                candidates = l3_search(tenant_id, query_emb, model, k=1)
+            except Exception as e:
+                error_log.warning(f"L3 lookup failed | tenant={tenant_id} | error={e}")
+                candidates = []
+            if candidates and candidates[0][0] >= SIM_THRESHOLD:
+                l3_sim, l3_entry = candidates[0]
+                T.hits += 1
+                T.semantic_hits += 1
+                latency = round((time.time() - t0) * 1000, 2)
+                T.latencies_ms.append(latency)
+                meta = {
+                    "hit": "semantic",
+                    "similarity": round(l3_sim, 4),
+                    "latency_ms": latency,
+                    "strategy": "semantic",
+                    "threshold_used": round(SIM_THRESHOLD, 3),
+                    "tier": "l3",
+                    "entry_id": self.entry_id(l3_entry["prompt_norm"], model),
+                }
+                semantic_log.info(
+                    f"{tenant_id} | semantic-l3 | sim={l3_sim:.3f} | "
+                    f"threshold={SIM_THRESHOLD:.3f} | key={prompt_norm[:80]}"
+                )
+                self._append_event(T, tenant_id, prompt_hash, "semantic", round(l3_sim, 4), latency)
+                self._semantic_outcome(T, tenant_id, True, spec)
+                return l3_entry["response_text"], meta
 
-            best_entry = None
-            best_sim = 0.0
+        if store.nvec > 0:
+            if query_emb is None:
+                try:
+                    query_emb, query_text = self._get_embedding_for_query(messages, user_id=user_id)
+                except Exception as e:
+                    if spec is not None:
+                        spec.abandon(T.speculation, tenant_id)
+                    return self._degraded_or_raise(tenant_id, T, prompt_norm, model, None, t0, prompt_hash, e)
 
-            for i in range(k):
-                idx = int(idxs[0][i])
-                sim = float(sims[0][i])
-                if idx < 0 or idx >= len(T.rows):
-                    continue
-                entry = T.rows[idx]
-                if not entry.fresh() or entry.model != model:
-                    continue
-                if sim > best_sim:
-                    best_sim = sim
-                    best_entry = entry
+            # Candidates come back already filtered to fresh (or in-grace) entries of this model
+            now = time.time()
+            sims, rows = store.search_eligible(query_emb, SEMANTIC_SEARCH_K, model, now, grace)
 
-            if best_entry is not None and best_sim >= SIM_THRESHOLD:
-                best_entry.use_count += 1
-                best_entry.last_used_at = time.time()
+            best_row = None
+            best_sim = 0.0
+            if len(rows) and sims[0] > 0:
+                best_row, best_sim = int(rows[0]), float(sims[0])
+                if grace and not store.fresh_mask(best_row, now):
+                    # Prefer a fresh row that also clears the threshold, e.g. the revalidated copy
+                    fresh = store.fresh_mask(rows, now) & (sims >= SIM_THRESHOLD)
+                    if fresh.any():
+                        i = int(np.argmax(fresh))
+                        best_row, best_sim = int(rows[i]), float(sims[i])
+
+            if best_row is not None and best_sim >= SIM_THRESHOLD:
+                store.touch(best_row, time.time())
                 T.hits += 1
                 T.semantic_hits += 1
                 latency = round((time.time() - t0) * 1000, 2)
@@ -487,15 +893,18 @@ class SemanticCacheService:
                     "latency_ms": latency,
                     "strategy": "semantic",
                     "threshold_used": round(SIM_THRESHOLD, 3),
+                    **self._entry_meta(store, best_row),
+                    **self._revalidate_if_due(tenant_id, T, best_row, model, now, temperature, user_id),
                 }
                 semantic_log.info(
                     f"{tenant_id} | semantic | sim={best_sim:.3f} | "
                     f"threshold={SIM_THRESHOLD:.3f} | key={prompt_norm[:80]}"
                 )
                 self._append_event(T, tenant_id, prompt_hash, "semantic", round(best_sim, 4), latency)
-                return best_entry.response_text, meta
+                self._semantic_outcome(T, tenant_id, True, spec)
+                return store.response(best_row), meta
 
-            if best_entry is not None:
+            if best_row is not None:
                 semantic_log.info(
                     f"{tenant_id} | near-miss | best_sim={best_sim:.3f} | "
                     f"threshold={SIM_THRESHOLD:.3f} | key={prompt_norm[:80]}"
@@ -503,14 +912,40 @@ class SemanticCacheService:
 
         # ── 3) Cache miss — LLM call (embedding runs async for storage) ──
         T.misses += 1
-
-        response_text = call_llm(messages, temperature, user_id)
+        self._semantic_outcome(T, tenant_id, False, spec)
+
+        if lookup_only:
+            latency = round((time.time() - t0) * 1000, 2)
+            # Same text _get_embedding_for_query embeds (the last user message)
+            user_text = ([m["content"] for m in messages if m.get("role") == "user"] or [prompt_norm])[-1]
+            token = self._issue_lookup_token(tenant_id, prompt_norm, model, query_emb, user_text)
+            meta = {"hit": "miss", "similarity": 0.0, "latency_ms": latency, "strategy": "lookup",
+                    "lookup_token": token}
+            semantic_log.debug(f"{tenant_id} | lookup-miss | {latency}ms | key={prompt_norm[:80]}")
+            self._append_event(T, tenant_id, prompt_hash, "miss", 0.0, latency)
+            return None, meta
+
+        saved_ms = None
+        try:
+            if spec is not None:
+                # Already holds a miss slot, released when the call finishes
+                response_text, saved_ms = spec.result(T.speculation)
+            else:
+                with admission.slot(tenant_id, self._miss_cost(messages)):
+                    response_text = call_llm(messages, temperature, user_id)
+        except Exception as e:
+            return self._degraded_or_raise(tenant_id, T, prompt_norm, model, query_emb, t0, prompt_hash, e,
+                                           count_miss=False)
 
         latency = round((time.time() - t0) * 1000, 2)
         T.latencies_ms.append(latency)
         semantic_log.debug(f"{tenant_id} | miss | total={latency}ms | key={prompt_norm[:80]}")
         
-        meta = {"hit": "miss", "similarity": 0.0, "latency_ms": latency, "strategy": "miss"}
+        meta = {"hit": "miss", "similarity": 0.0, "latency_ms": latency, "strategy": "miss",
+                "entry_id": self.entry_id(prompt_norm, model), "expires_at": round(time.time() + ttl_seconds, 3)}
+        if saved_ms is not None:
+            meta["speculative"] = True
+            meta["speculative_saved_ms"] = saved_ms
         self._append_event(T, tenant_id, prompt_hash, "miss", 0.0, latency)
 
         # Store in cache asynchronously — embedding + storage in background
@@ -521,7 +956,7 @@ class SemanticCacheService:
                 if emb is None:
                     emb, _ = self._get_embedding_for_query(messages, user_id=user_id)
                 user_text = " ".join(m["content"] for m in messages if m.get("role") == "user") or prompt_norm
-                entry = CacheEntry(
+                entry = dict(
                     prompt_norm=prompt_norm,
                     response_text=response_text,
                     embedding=emb,
@@ -530,25 +965,434 @@ class SemanticCacheService:
                     domain=domain_hint(user_text),
                     strategy="miss",
                 )
-                with self._cache_lock:
-                    T.exact[prompt_norm] = entry
-                    T.rows.append(entry)
-                    self._faiss_add(T, emb)
-                    if len(T.rows) % 10 == 0:
-                        threading.Thread(target=self._save_cache, daemon=True).start()
-                # Write-through to Redis L2 and PostgreSQL L3
-                try:
-                    from redis_cache import store_exact_match, store_embedding
-                    store_exact_match(tenant_id, prompt_hash, response_text, model, ttl_seconds)
-                    store_embedding(tenant_id, prompt_hash, emb, ttl_seconds)
-                except Exception:
-                    pass
+                self._store_entry(tenant_id, T, prompt_hash, entry)
             except Exception as e:
                 error_log.warning(f"Cache store failed | tenant={tenant_id} | {e}")
         threading.Thread(target=_store, daemon=True).start()
 
         return response_text, meta
 
+    def _revalidate_if_due(self, tenant_id: str, T: TenantState, row: int, model: str, now: float,
+                           temperature: float, user_id: Optional[str],
+                           messages: Optional[List[dict]] = None) -> dict:
+        """
+        Stale-while-revalidate / refresh-ahead for a row that is being served.
+        An expired row (within the tenant's grace window) is served flagged
+        stale; it and hot rows close to expiry get one background refresh.
+        The refresh replays messages, the request's own on an exact hit;
+        semantic hits pass none (the request asked something else, and the
+        stored key is normalised and lacks the system prompt), so their rows
+        are only flagged and get refreshed by their next exact hit. Returns
+        meta to merge into the hit.
+        """
+        store = T.store
+        remaining = float(store.expires_at[row]) - now
+        stale = remaining <= 0
+        if stale:
+            T.stale_hits += 1
+        else:
+            # At most half the TTL ahead, so a just-refreshed row is never due again
+            window = min(T.refresh_ahead_seconds, int(store.ttl_seconds[row]) / 2)
+            if not (window > 0 and remaining <= window and int(store.use_count[row]) >= T.refresh_min_uses):
+                return {}
+        if not messages:
+            return {"stale": True} if stale else {}
+
+        prompt_norm = store.prompt(row)
+        key = (tenant_id, model, prompt_norm)
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return {"stale": True} if stale else {}
+            self._revalidating.add(key)
+        # Refreshes are optional work: skipped while every miss slot is taken
+        if not admission.try_acquire(tenant_id):
+            with self._revalidate_lock:
+                self._revalidating.discard(key)
+            return {"stale": True} if stale else {}
+        started = time.time()
+
+        vector = store.vector(row)
+        entry = dict(
+            prompt_norm=prompt_norm,
+            embedding=None if vector is None else np.array(vector, dtype="float32"),
+            model=model,
+            ttl_seconds=int(store.ttl_seconds[row]),
+            use_count=int(store.use_count[row]),
+            domain=store.domains[int(store.domain_id[row])],
+            strategy="refresh",
+        )
+
+        def _refresh():
+            try:
+                try:
+                    entry["response_text"] = call_llm(messages, temperature, user_id)
+                finally:
+                    admission.release(tenant_id, time.time() - started)
+                if entry["embedding"] is None:
+                    entry["embedding"], _ = self._get_embedding_for_query(messages, user_id=user_id)
+                prompt_hash = hashlib.md5(prompt_norm.encode()).hexdigest()
+                self._store_entry(tenant_id, T, prompt_hash, entry)
+                T.revalidations += 1
+                semantic_log.info(
+                    f"{tenant_id} | {'revalidated' if stale else 'refreshed-ahead'} | key={prompt_norm[:80]}"
+                )
+            except Exception as e:
+                error_log.warning(f"Cache revalidation failed | tenant={tenant_id} | {e}")
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+        threading.Thread(target=_refresh, daemon=True).start()
+
+        return {"stale": True} if stale else {"refreshing": True}
+
+    @staticmethod
+    def _miss_cost(messages: List[dict]) -> float:
+        """Estimated prompt tokens, the cost of a miss in the admission scheduler."""
+        return float(sum(len(m.get("content", "").split()) * 4 // 3 for m in messages))
+
+    def _degraded_or_raise(self, tenant_id: str, T: TenantState, prompt_norm: str, model: str,
+                           query_emb: Optional[np.ndarray], t0: float, prompt_hash: str,
+                           error: Exception, count_miss: bool = True,
+                           accept: Optional[Callable[[int], bool]] = None) -> Tuple[str, dict]:
+        """
+        Degraded mode: the upstream call failed (circuit open, saturated or
+        erroring), so answer from the best cached candidate under a relaxed
+        policy instead of failing the request. Re-raises error if there is none.
+        accept, if given, further restricts semantic candidates (by row).
+        """
+        row, sim = (self._degraded_candidate(T, prompt_norm, model, query_emb, accept) if DEGRADED_MODE
+                    else (None, 0.0))
+        if row is None:
+            raise error
+        store = T.store
+        now = time.time()
+        store.touch(row, now)
+        if count_miss:
+            T.misses += 1
+        T.degraded_hits += 1
+        if isinstance(error, UpstreamUnavailable):
+            reason = "circuit_open"
+        elif isinstance(error, Overloaded):
+            reason = "overloaded"
+        elif isinstance(error, UpstreamBusy):
+            reason = "upstream_busy"
+        else:
+            reason = "upstream_error"
+        latency = round((time.time() - t0) * 1000, 2)
+        T.latencies_ms.append(latency)
+        meta = {
+            "hit": "degraded",
+            "similarity": round(sim, 4),
+            "latency_ms": latency,
+            "strategy": "degraded",
+            "degraded": True,
+            "degraded_reason": reason,
+            "threshold_used": round(max(0.0, T.sim_threshold - DEGRADED_SIM_MARGIN), 3),
+            "stale": bool(store.expires_at[row] <= now),
+            **self._entry_meta(store, row),
+        }
+        semantic_log.warning(
+            f"{tenant_id} | degraded | reason={reason} | sim={sim:.3f} | "
+            f"stale={meta['stale']} | key={prompt_norm[:80]}"
+        )
+        self._append_event(T, tenant_id, prompt_hash, "degraded", round(sim, 4), latency)
+        return store.response(row), meta
+
+    @staticmethod
+    def _degraded_candidate(T: TenantState, prompt_norm: str, model: str, query_emb: Optional[np.ndarray],
+                            accept: Optional[Callable[[int], bool]] = None) -> Tuple[Optional[int], float]:
+        """Best (row, similarity) within DEGRADED_SIM_MARGIN of the threshold and DEGRADED_MAX_STALE_SECONDS of expiry."""
+        store = T.store
+        now = time.time()
+        row = store.exact.get(prompt_norm)
+        if row is not None and store.eligible_mask([row], model, now, DEGRADED_MAX_STALE_SECONDS)[0]:
+            return row, 1.0
+        if query_emb is None or store.nvec == 0:
+            return None, 0.0
+        k = 1 if accept is None else SEMANTIC_SEARCH_K
+        sims, rows = store.search_eligible(query_emb, k, model, now, DEGRADED_MAX_STALE_SECONDS)
+        for sim, r in zip(sims, rows):
+            if r < 0 or sim < T.sim_threshold - DEGRADED_SIM_MARGIN:
+                break
+            if accept is None or accept(int(r)):
+                return int(r), float(sim)
+        return None, 0.0
+
+    @staticmethod
+    def _semantic_outcome(T: TenantState, tenant_id: str, hit: bool, spec) -> None:
+        """Update the hit predictor; on a hit, drop the speculative LLM call."""
+        T.hit_prob = speculative_llm.update_hit_prob(T.hit_prob, hit)
+        if hit and spec is not None:
+            spec.abandon(T.speculation, tenant_id)
+
+    def _admit_entry(self, T: TenantState, entry: dict) -> bool:
+        """
+        Admission filter for a new entry (tinylfu.py). Returns False if it is
+        not to be stored; an entry kept exact-only gets index_vector=False.
+        Refreshes of existing entries are always admitted.
+        """
+        if T.admission_policy == "all" or entry.get("strategy") == "refresh":
+            T.entries_admitted += 1
+            return True
+        if T.sketch is None:
+            T.sketch = FrequencySketch()
+        if tinylfu.record(T.sketch, entry["model"], entry["prompt_norm"], entry.get("embedding")):
+            T.entries_admitted += 1
+            return True
+        if T.admission_policy == "drop_one_offs":
+            T.entries_rejected += 1
+            return False
+        T.entries_exact_only += 1
+        entry["index_vector"] = False
+        return True
+
+    def _promote_if_reused(self, tenant_id: str, T: TenantState, row: int, model: str,
+                           messages: Optional[List[dict]], user_id: Optional[str]):
+        """
+        An exact-only entry was hit: once it is frequent, embed the request's
+        messages (never the normalised key) in the background and index the row.
+        """
+        if T.sketch is None or not messages or (self._shared is not None and not self._shared.is_writer):
+            return
+        store = T.store
+        prompt_norm = store.prompt(row)
+        if not tinylfu.record(T.sketch, model, prompt_norm, None):
+            return
+        key = (tenant_id, prompt_norm)
+        with self._revalidate_lock:
+            if key in self._promoting:
+                return
+            self._promoting.add(key)
+
+        def _promote():
+            try:
+                emb, _ = self._get_embedding_for_query(messages, user_id=user_id)
+                with self._cache_lock:
+                    if store.vec_pos[row] < 0 and store.exact.get(prompt_norm) == row:
+                        store.index_row(row, emb)
+                        self._dirty_tenants.add(tenant_id)
+                        T.entries_promoted += 1
+            except Exception as e:
+                error_log.warning(f"Cache entry promotion failed | tenant={tenant_id} | {e}")
+            finally:
+                with self._revalidate_lock:
+                    self._promoting.discard(key)
+        threading.Thread(target=_promote, daemon=True).start()
+
+    def _store_entry(self, tenant_id: str, T: TenantState, prompt_hash: str, entry: dict) -> bool:
+        """
+        Insert a freshly answered entry and write it through to Redis L2 and
+        PostgreSQL L3. Returns False if the admission filter rejected it.
+        """
+        if not self._admit_entry(T, entry):
+            return False
+        if self._insert_entry(tenant_id, T, entry) and len(T.rows) % 10 == 0:
+            threading.Thread(target=self._save_cache, daemon=True).start()
+        try:
+            from redis_cache import store_entry
+            store_entry(tenant_id, prompt_hash, entry["response_text"], entry["model"],
+                        entry["embedding"], entry["ttl_seconds"])
+        except Exception:
+            pass
+        # L3 answers semantic lookups, which exact-only entries must not serve
+        if self._l3_enabled and entry.get("index_vector", True):
+            from l3_cache import enqueue
+            enqueue(tenant_id, prompt_hash, entry)
+        return True
+
+    def _issue_lookup_token(self, tenant_id: str, prompt_norm: str, model: str,
+                            emb: Optional[np.ndarray], user_text: str) -> str:
+        token = secrets.token_urlsafe(16)
+        with self._lookup_lock:
+            self._lookup_tokens[token] = (time.time() + LOOKUP_TOKEN_TTL_SECONDS, tenant_id, prompt_norm, model, emb, user_text)
+            while len(self._lookup_tokens) > _LOOKUP_TOKEN_MAX:
+                self._lookup_tokens.popitem(last=False)
+        return token
+
+    def _take_lookup_token(self, tenant_id: str, token: str) -> Optional[tuple]:
+        """Consume a lookup token; None if unknown, expired or issued to another tenant."""
+        with self._lookup_lock:
+            pending = self._lookup_tokens.pop(token, None)
+        if pending is None or pending[0] < time.time() or pending[1] != tenant_id:
+            return None
+        return pending
+
+    def put_entry(
+        self,
+        tenant_id: str,
+        response_text: str,
+        model: str,
+        lookup_token: Optional[str] = None,
+        prompt: Optional[str] = None,
+        ttl_seconds: int = 7 * 24 * 3600,
+        user_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Store an answer the caller obtained itself (write-back after a
+        lookup-only miss). With a valid lookup_token the prompt and embedding
+        of that lookup are reused; otherwise `prompt` is embedded here.
+        An existing fresh entry for the same prompt is left in place.
+        """
+        T = self.tenant(tenant_id)
+        pending = self._take_lookup_token(tenant_id, lookup_token) if lookup_token else None
+        if pending is not None:
+            _, _, prompt_norm, model, emb, user_text = pending
+        elif prompt and prompt.strip():
+            prompt_norm, emb, user_text = self.norm_text(prompt), None, prompt
+        else:
+            raise ValueError("prompt is required without a valid lookup_token")
+        prompt_hash = hashlib.md5(prompt_norm.encode()).hexdigest()
+
+        row = T.store.exact.get(prompt_norm)
+        if row is not None and T.store.eligible_mask([row], model, time.time())[0]:
+            return {"stored": False, "entry_id": self.entry_id(prompt_norm, model), "reason": "exists"}
+
+        embedding_reused = emb is not None
+        if emb is None:
+            emb, _ = self._get_embedding_for_query([{"role": "user", "content": user_text}], user_id=user_id)
+        entry = dict(
+            prompt_norm=prompt_norm,
+            response_text=response_text,
+            embedding=emb,
+            model=model,
+            ttl_seconds=ttl_seconds,
+            domain=domain_hint(user_text),
+            strategy="put",
+        )
+        if not self._store_entry(tenant_id, T, prompt_hash, entry):
+            return {"stored": False, "entry_id": self.entry_id(prompt_norm, model), "reason": "not_admitted"}
+        semantic_log.info(f"{tenant_id} | put | reused_embedding={embedding_reused} | key={prompt_norm[:80]}")
+        return {"stored": True, "entry_id": self.entry_id(prompt_norm, model), "embedding_reused": embedding_reused,
+                "indexed": entry.get("index_vector", True)}
+
+    @staticmethod
+    def rag_prompt_key(fingerprints: List[str], question_norm: str) -> str:
+        """Exact-match key of a RAG entry: its sorted context fingerprints plus the question."""
+        return f"rag|{','.join(fingerprints)}|{question_norm}"
+
+    @staticmethod
+    def _rag_fingerprints(prompt_norm: str) -> set:
+        parts = prompt_norm.split("|", 2)
+        return set(parts[1].split(",")) - {""} if len(parts) == 3 else set()
+
+    def rag_query(
+        self,
+        tenant_id: str,
+        question: str,
+        fingerprints: List[str],
+        model: str,
+        context: Optional[List[str]] = None,
+        min_overlap: float = 1.0,
+        ttl_seconds: int = 7 * 24 * 3600,
+        temperature: float = 0.2,
+        user_id: Optional[str] = None,
+    ) -> Tuple[Optional[str], dict]:
+        """
+        RAG lookup keyed on the question plus the set of retrieved documents,
+        identified by fingerprints (content hashes) instead of their text.
+
+        Only the question is embedded. A cached answer is reused when its
+        question is similar enough and its document set overlaps this one by
+        at least min_overlap (Jaccard; 1.0 = the same documents). A miss
+        needs the documents themselves: without `context` it returns
+        (None, meta) with meta["context_required"] set and the caller retries
+        with them.
+        """
+        T = self.tenant(tenant_id)
+        t0 = time.time()
+        fps = sorted(set(fingerprints))
+        prompt_norm = self.rag_prompt_key(fps, self.norm_text(question))
+        prompt_hash = hashlib.md5(prompt_norm.encode()).hexdigest()
+        rag_model = model + RAG_MODEL_SUFFIX
+        store = T.store
+
+        def _hit(row: int, decision: str, sim: float, overlap: float) -> Tuple[str, dict]:
+            store.touch(row, time.time())
+            T.hits += 1
+            if decision == "semantic":
+                T.semantic_hits += 1
+            latency = round((time.time() - t0) * 1000, 2)
+            T.latencies_ms.append(latency)
+            meta = {"hit": decision, "similarity": round(sim, 4), "latency_ms": latency, "strategy": "rag",
+                    "context_overlap": round(overlap, 3), **self._entry_meta(store, row)}
+            semantic_log.info(
+                f"{tenant_id} | rag-{decision} | sim={sim:.3f} | overlap={overlap:.2f} | docs={len(fps)}"
+            )
+            self._append_event(T, tenant_id, prompt_hash, decision, round(sim, 4), latency)
+            return store.response(row), meta
+
+        row = store.exact.get(prompt_norm)
+        if row is not None and store.eligible_mask([row], rag_model, time.time())[0]:
+            return _hit(row, "exact", 1.0, 1.0)
+
+        messages = [{"role": "user", "content": question}]
+        wanted = set(fps)
+
+        def same_docs(r: int) -> bool:
+            # Degraded answers are only taken from this same document set
+            return self._rag_fingerprints(store.prompt(r)) == wanted
+
+        query_emb = None
+        if store.nvec > 0:
+            try:
+                query_emb, _ = self._get_embedding_for_query(messages, user_id=user_id)
+            except Exception as e:
+                return self._degraded_or_raise(tenant_id, T, prompt_norm, rag_model, None, t0, prompt_hash, e,
+                                               accept=same_docs)
+            sims, rows = store.search_eligible(query_emb, SEMANTIC_SEARCH_K, rag_model, time.time())
+            for sim, r in zip(sims, rows):
+                if r < 0 or sim < T.sim_threshold:
+                    break
+                cached = self._rag_fingerprints(store.prompt(int(r)))
+                union = wanted | cached
+                overlap = len(wanted & cached) / len(union) if union else 1.0
+                if overlap >= min_overlap:
+                    return _hit(int(r), "semantic", float(sim), overlap)
+
+        if not context:
+            latency = round((time.time() - t0) * 1000, 2)
+            return None, {"hit": "miss", "similarity": 0.0, "latency_ms": latency,
+                          "strategy": "rag", "context_required": True}
+
+        T.misses += 1
+        llm_messages = [
+            {"role": "system", "content": "Answer the question using the context below.\n\nContext:\n" + "\n\n".join(context)},
+            {"role": "user", "content": question},
+        ]
+        try:
+            with admission.slot(tenant_id, self._miss_cost(llm_messages)):
+                response_text = call_llm(llm_messages, temperature, user_id)
+        except Exception as e:
+            return self._degraded_or_raise(tenant_id, T, prompt_norm, rag_model, query_emb, t0, prompt_hash, e,
+                                           count_miss=False, accept=same_docs)
+        latency = round((time.time() - t0) * 1000, 2)
+        T.latencies_ms.append(latency)
+        meta = {"hit": "miss", "similarity": 0.0, "latency_ms": latency, "strategy": "rag",
+                "entry_id": self.entry_id(prompt_norm, rag_model), "expires_at": round(time.time() + ttl_seconds, 3)}
+        self._append_event(T, tenant_id, prompt_hash, "miss", 0.0, latency)
+
+        _cached_emb = query_emb
+        def _store():
+            try:
+                emb = _cached_emb
+                if emb is None:
+                    emb, _ = self._get_embedding_for_query(messages, user_id=user_id)
+                entry = dict(
+                    prompt_norm=prompt_norm,
+                    response_text=response_text,
+                    embedding=emb,
+                    model=rag_model,
+                    ttl_seconds=ttl_seconds,
+                    domain=domain_hint(question),
+                    strategy="rag",
+                )
+                self._store_entry(tenant_id, T, prompt_hash, entry)
+            except Exception as e:
+                error_log.warning(f"RAG cache store failed | tenant={tenant_id} | {e}")
+        threading.Thread(target=_store, daemon=True).start()
+
+        return response_text, meta
+
     def metrics(self, tenant_id: str) -> dict:
         T = self.tenant(tenant_id)
         total = T.hits + T.misses
@@ -561,6 +1405,7 @@ class SemanticCacheService:
         avg_confidence = np.mean([e.similarity for e in semantic_events]) if semantic_events else 0.0
         avg_hybrid_score = avg_confidence
         high_confidence_hits = len([e for e in semantic_events if e.similarity >= 0.8])
+        new_entries = T.entries_admitted + T.entries_exact_only + T.entries_rejected
         
         # Estimate tokens saved (rough estimate: 100 tokens per miss saved)
         tokens_saved_est = T.hits * 100  # Rough estimate
@@ -577,6 +1422,7 @@ class SemanticCacheService:
             "tokens_saved_est": tokens_saved_est,
             "sim_threshold": round(T.sim_threshold, 3),
             "entries": len(T.rows),
+            "responses": T.store.responses.stats(),
             "p50_latency_ms": round(float(p50), 2),
             "p95_latency_ms": round(float(p95), 2),
             # Enhanced quality metrics
@@ -584,6 +1430,31 @@ class SemanticCacheService:
             "avg_hybrid_score": round(avg_hybrid_score, 3),
             "high_confidence_hits": high_confidence_hits,
             "high_confidence_ratio": round((high_confidence_hits / len(semantic_events)) if semantic_events else 0.0, 3),
+            "speculative": {
+                "enabled": T.speculative_llm,
+                "max_hit_prob": round(T.speculative_max_hit_prob, 3),
+                "predicted_hit_prob": round(T.hit_prob, 3),
+                **T.speculation.as_dict(),
+            },
+            "stale_hits": T.stale_hits,
+            "revalidations": T.revalidations,
+            "degraded_hits": T.degraded_hits,
+            "admission": admission.tenant_stats(tenant_id),
+            "entry_admission": {
+                "policy": T.admission_policy,
+                "admitted": T.entries_admitted,
+                "exact_only": T.entries_exact_only,
+                "rejected": T.entries_rejected,
+                "promoted": T.entries_promoted,
+                "admission_rate": round(T.entries_admitted / new_entries, 4) if new_entries else 1.0,
+                "sketch_bytes": T.sketch.nbytes if T.sketch is not None else 0,
+            },
+            "compaction": {
+                "runs": T.compaction_runs,
+                "merged": T.compaction_merged,
+                "bytes_reclaimed": T.compaction_bytes_reclaimed,
+                "last": T.last_compaction,
+            },
         }
 
     def adapt_threshold(self, tenant_id: str):
@@ -627,7 +1498,7 @@ class SemanticCacheService:
                     continue
                 emb = get_embedding(prompt, user_id=user_id)
                 user_text = prompt
-                entry = CacheEntry(
+                entry = dict(
                     prompt_norm=prompt_norm,
                     response_text=response_text,
                     embedding=emb,
@@ -636,16 +1507,15 @@ class SemanticCacheService:
                     domain=domain_hint(user_text),
                     strategy="warmup",
                 )
-                with self._cache_lock:
-                    T.exact[prompt_norm] = entry
-                    T.rows.append(entry)
-                    self._faiss_add(T, emb)
+                self._insert_entry(tenant_id, T, entry)
                 added += 1
                 try:
-                    from redis_cache import store_exact_match, store_embedding
+                    from redis_cache import store_entry
                     prompt_hash = hashlib.md5(prompt_norm.encode()).hexdigest()
-                    store_exact_match(tenant_id, prompt_hash, response_text, model, ttl_seconds)
-                    store_embedding(tenant_id, prompt_hash, emb, ttl_seconds)
+                    store_entry(tenant_id, prompt_hash, response_text, model, emb, ttl_seconds)
+                    if self._l3_enabled:
+                        from l3_cache import enqueue
+                        enqueue(tenant_id, prompt_hash, entry)
                 except Exception:
                     pass
                 if (i + 1) % 5 == 0:
@@ -665,13 +1535,27 @@ import atexit
 def _save_cache_on_exit():
     """Save cache on normal exit."""
     try:
-        svc._save_cache()
+        svc._save_cache(list(svc.tenants.keys()))
         system_log.info("Shutdown | cache saved")
     except Exception as e:
         print(f"Failed to save cache on exit: {e}")
 
 atexit.register(_save_cache_on_exit)
 
+# Hourly/daily usage rollups for billing and admin analytics
+try:
+    from usage_rollups import start as start_usage_rollups
+    start_usage_rollups()
+except Exception as e:
+    error_log.warning(f"Usage rollups unavailable | error={e}")
+
+# Monthly usage/audit log partitions: create ahead, archive past retention
+try:
+    from log_partitions import start as start_log_partitions
+    start_log_partitions()
+except Exception as e:
+    error_log.warning(f"Log partition maintenance unavailable | error={e}")
+
 # -----------------------------
 # FastAPI app + middleware + rate limiting
 # -----------------------------
@@ -827,6 +1711,7 @@ def get_tenant_from_key(request: Request) -> str:
         ctx["org_id"] = cached.get("org_id")
         ctx["scope"] = cached.get("scope", "read-write")
         _current_api_key_var.set(ctx)
+        admission.set_plan(tenant, cached.get("plan"))
         # Check expiration
         if cached.get("expires_at") and time.time() > cached["expires_at"]:
             raise HTTPException(status_code=401, detail="API key expired")
@@ -863,10 +1748,12 @@ def get_tenant_from_key(request: Request) -> str:
             ctx["org_id"] = str(key_info.get('org_id', '')) or None
             ctx["scope"] = key_info.get('scope', 'read-write')
             _current_api_key_var.set(ctx)
+            admission.set_plan(tenant, key_info.get('plan'))
             _api_key_cache[token] = {
                 "user_id": ctx["user_id"],
                 "org_id": ctx["org_id"],
                 "scope": ctx["scope"],
+                "plan": key_info.get('plan'),
                 "allowed_ips": allowed,
                 "expires_at": None,
                 "ts": time.time(),
@@ -913,6 +1800,7 @@ class ChatRequest(BaseModel):
     temperature: float = 0.2
     ttl_seconds: int = 7 * 24 * 3600
     stream: bool = False
+    lookup_only: bool = False  # never call the LLM; a miss returns a lookup_token
 
 # -----------------------------
 # Endpoints
@@ -931,8 +1819,12 @@ def health():
         except ImportError:
             has_system_metrics = False
         
-        total_tenants = len(svc.tenants)
-        total_entries = sum(len(t.rows) for t in svc.tenants.values())
+        try:
+            from cache_persistence import list_snapshot_tenants
+            total_tenants = len(set(list_snapshot_tenants()) | set(svc.tenants.keys()))
+        except Exception:
+            total_tenants = len(svc.tenants)
+        total_entries = sum(len(t.rows) for t in list(svc.tenants.values()))
         
         # Redis health
         try:
@@ -947,10 +1839,27 @@ def health():
             "version": "2.0.0",
             "cache": {
                 "tenants": total_tenants,
+                "resident_tenants": len(svc.tenants),
                 "total_entries": total_entries,
             },
             "redis": redis_status,
         }
+        if svc._shared is not None:
+            health_status["workers"] = {
+                "mode": "multi",
+                "role": "writer" if svc._shared.is_writer else "reader",
+                "pid": os.getpid(),
+            }
+        if svc._l3_enabled:
+            from l3_cache import stats as l3_stats
+            health_status["l3"] = l3_stats()
+        try:
+            from database import get_pool_stats
+            health_status["database"] = get_pool_stats()
+        except Exception:
+            health_status["database"] = {"status": "unavailable"}
+        health_status["upstream"] = upstream.stats()
+        health_status["admission"] = admission.stats()
         
         if has_system_metrics:
             health_status["system"] = {
@@ -992,9 +1901,34 @@ def prometheus_metrics():
         error_log.exception(f"Prometheus metrics endpoint failed | error={str(e)}")
         raise HTTPException(status_code=500, detail="Metrics endpoint failed")
 
+def _upstream_busy(tenant: str, endpoint: str, e: UpstreamBusy) -> HTTPException:
+    """
+    503 + Retry-After when the upstream bulkhead for this tenant's OpenAI key is
+    saturated or its circuit is open, or the miss was shed by admission control
+    (429 when the tenant's own share of the miss queue is full).
+    """
+    if isinstance(e, Overloaded):
+        error_log.warning(f"{tenant} | {endpoint} | miss shed | status={e.status_code} | {e}")
+        status_code = e.status_code
+        detail = ("Too many uncached requests queued for this tenant, retry shortly" if status_code == 429
+                  else "Server is at capacity for uncached requests, retry shortly")
+    elif isinstance(e, UpstreamUnavailable):
+        error_log.warning(f"{tenant} | {endpoint} | circuit open | {e}")
+        status_code = 503
+        detail = "Upstream LLM provider is failing, retry shortly"
+    else:
+        error_log.warning(f"{tenant} | {endpoint} | upstream busy | {e}")
+        status_code = 503
+        detail = "Upstream LLM provider is saturated, retry shortly"
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(int(max(1, round(e.retry_after))))},
+    )
+
 @app.get("/query")
 @limiter.limit("60/minute")
-def simple_query(request: Request, prompt: str = Query(...), model: str = CHAT_MODEL, tenant: str = Depends(get_tenant_from_key)):
+def simple_query(request: Request, prompt: str = Query(...), model: str = CHAT_MODEL, lookup_only: bool = False, tenant: str = Depends(get_tenant_from_key)):
     messages = [{"role": "user", "content": prompt}]
     prompt_norm = SemanticCacheService.norm_text(prompt)
     prompt_hash = hashlib.md5(prompt_norm.encode()).hexdigest()[:8]
@@ -1004,7 +1938,7 @@ def simple_query(request: Request, prompt: str = Query(...), model: str = CHAT_M
         # Get user_id from current API key context
         _ctx = _current_api_key_var.get()
         user_id = _ctx.get("user_id")
-        ans, meta = svc.query(tenant, prompt_norm, messages, model, user_id=user_id)
+        ans, meta = svc.query(tenant, prompt_norm, messages, model, user_id=user_id, lookup_only=lookup_only)
         query_time = round((time.time() - endpoint_start) * 1000, 2)
         
         # Get metrics (fast - just reading from memory)
@@ -1053,11 +1987,13 @@ def simple_query(request: Request, prompt: str = Query(...), model: str = CHAT_M
         endpoint_total = round((before_return - endpoint_start) * 1000, 2)
         access_log.debug(
             f"{tenant} | /query-timing | query={query_time}ms | metrics={metrics_time}ms | "
-            f"log={log_time}ms | total={endpoint_total}ms | response_len={len(ans)}"
+            f"log={log_time}ms | total={endpoint_total}ms | response_len={len(ans or '')}"
         )
         
         # Return immediately with metrics (database logging happens async)
         return {"answer": ans, "meta": meta, "metrics": metrics}
+    except UpstreamBusy as e:
+        raise _upstream_busy(tenant, "/query", e)
     except Exception as e:
         error_log.exception(
             f"{tenant} | /query | error: {e} | prompt_hash={prompt_hash} | "
@@ -1065,6 +2001,125 @@ def simple_query(request: Request, prompt: str = Query(...), model: str = CHAT_M
         )
         raise HTTPException(status_code=500, detail="Internal error")
 
+class RagFingerprint(BaseModel):
+    id: Optional[str] = None
+    hash: Optional[str] = None
+
+
+class RagQueryRequest(BaseModel):
+    question: str
+    context_fingerprints: List[RagFingerprint]
+    context: Optional[List[str]] = None
+    model: str = CHAT_MODEL
+    min_overlap: float = 1.0
+    temperature: float = 0.2
+    ttl_seconds: int = 7 * 24 * 3600
+
+
+_FINGERPRINT_RE = re.compile(r"^[A-Za-z0-9_.:/-]{1,128}$")
+
+
+@app.post("/v1/rag/query")
+@limiter.limit("60/minute")
+def rag_query(request: Request, body: RagQueryRequest, tenant: str = Depends(get_tenant_from_key)):
+    """
+    RAG query keyed on the question plus context fingerprints (content hash,
+    or document id when no hash is given) rather than the documents' text.
+    Only the question is embedded. Send `context` only when a previous call
+    answered with meta.context_required (nothing cached for these documents).
+    """
+    _require_scope(request, "read-write")
+    fingerprints = [f.hash or f.id or "" for f in body.context_fingerprints]
+    if not body.question.strip() or not fingerprints or not all(_FINGERPRINT_RE.match(f) for f in fingerprints):
+        raise HTTPException(status_code=400, detail="question and valid context_fingerprints are required")
+    if not 0.0 < body.min_overlap <= 1.0:
+        raise HTTPException(status_code=400, detail="min_overlap must be in (0, 1]")
+    _ctx = _current_api_key_var.get()
+    try:
+        ans, meta = svc.rag_query(
+            tenant,
+            body.question,
+            fingerprints,
+            body.model,
+            context=body.context,
+            min_overlap=body.min_overlap,
+            ttl_seconds=body.ttl_seconds,
+            temperature=body.temperature,
+            user_id=_ctx.get("user_id"),
+        )
+        access_log.info(
+            f"{tenant} | /v1/rag/query | {meta['hit']} | sim={meta['similarity']:.3f} | "
+            f"latency={meta['latency_ms']}ms | docs={len(fingerprints)} | "
+            f"context_sent={bool(body.context)}"
+        )
+        if ans is not None:
+            _log_key, _log_uid, _log_org, _log_hit = _ctx.get("key", "unknown"), _ctx.get("user_id"), _ctx.get("org_id"), meta["hit"]
+            def _bg_log():
+                try:
+                    from database import log_usage
+                    log_usage(
+                        api_key=_log_key, tenant_id=tenant,
+                        endpoint="/v1/rag/query", request_count=1,
+                        cache_hits=1 if _log_hit != "miss" else 0,
+                        cache_misses=1 if _log_hit == "miss" else 0,
+                        tokens_used=0, cost_estimate=0,
+                        user_id=_log_uid, org_id=_log_org,
+                    )
+                except Exception as e:
+                    error_log.warning(f"Could not log usage to database | tenant={tenant} | error={str(e)}")
+            threading.Thread(target=_bg_log, daemon=True).start()
+        return {"answer": ans, "meta": meta}
+    except HTTPException:
+        raise
+    except UpstreamBusy as e:
+        raise _upstream_busy(tenant, "/v1/rag/query", e)
+    except Exception as e:
+        error_log.exception(f"{tenant} | /v1/rag/query | error: {e} | docs={len(fingerprints)}")
+        raise HTTPException(status_code=500, detail="Internal error")
+
+class CacheEntryPut(BaseModel):
+    response: str
+    model: str = CHAT_MODEL
+    lookup_token: Optional[str] = None
+    prompt: Optional[str] = None
+    ttl_seconds: int = 7 * 24 * 3600
+
+
+@app.put("/v1/cache/entries")
+@limiter.limit("120/minute")
+def put_cache_entry(request: Request, body: CacheEntryPut, tenant: str = Depends(get_tenant_from_key)):
+    """
+    Write back an answer the caller produced itself after a lookup-only miss
+    (GET /query?lookup_only=true or "lookup_only": true on chat completions).
+    Pass the miss's meta.lookup_token to reuse its embedding, and the prompt
+    as well so the write still works if the token has expired or was issued
+    by another worker.
+    """
+    _require_scope(request, "read-write")
+    if not body.response.strip():
+        raise HTTPException(status_code=400, detail="response is required")
+    _ctx = _current_api_key_var.get()
+    try:
+        result = svc.put_entry(
+            tenant,
+            body.response,
+            body.model,
+            lookup_token=body.lookup_token,
+            prompt=body.prompt,
+            ttl_seconds=body.ttl_seconds,
+            user_id=_ctx.get("user_id"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_log.exception(f"{tenant} | /v1/cache/entries | error: {e}")
+        raise HTTPException(status_code=500, detail="Internal error")
+    access_log.info(
+        f"{tenant} | /v1/cache/entries | stored={result['stored']} | "
+        f"embedding_reused={result.get('embedding_reused', False)}"
+    )
+    return result
+
 @app.get("/events")
 def get_events(limit: int = Query(100, ge=1, le=1000), tenant: str = Depends(get_tenant_from_key)):
     """Get recent cache events for the tenant."""
@@ -1085,6 +2140,12 @@ def get_events(limit: int = Query(100, ge=1, le=1000), tenant: str = Depends(get
 class SettingsUpdate(BaseModel):
     sim_threshold: Optional[float] = None
     ttl_days: Optional[int] = None
+    speculative_llm: Optional[bool] = None
+    speculative_max_hit_prob: Optional[float] = None
+    stale_grace_seconds: Optional[int] = None
+    refresh_ahead_seconds: Optional[int] = None
+    refresh_min_uses: Optional[int] = None
+    admission_policy: Optional[str] = None
 
 @app.get("/settings")
 def get_settings(tenant: str = Depends(get_tenant_from_key)):
@@ -1094,6 +2155,12 @@ def get_settings(tenant: str = Depends(get_tenant_from_key)):
         "sim_threshold": round(T.sim_threshold, 3),
         "ttl_days": 7,
         "entries": len(T.rows),
+        "speculative_llm": T.speculative_llm,
+        "speculative_max_hit_prob": round(T.speculative_max_hit_prob, 3),
+        "stale_grace_seconds": T.stale_grace_seconds,
+        "refresh_ahead_seconds": T.refresh_ahead_seconds,
+        "refresh_min_uses": T.refresh_min_uses,
+        "admission_policy": T.admission_policy,
     }
 
 class WarmupEntry(BaseModel):
@@ -1118,7 +2185,8 @@ def cache_warmup(body: WarmupRequest, request: Request):
     """
     try:
         user = _get_user_from_supabase_token(request)
-        from database import get_user_orgs, get_api_key_info, list_api_keys
+        from database import get_api_key_info, list_api_keys
+        from user_cache import get_user_orgs
         orgs = get_user_orgs(user["id"])
         tenant = body.tenant
         if not tenant and orgs:
@@ -1183,12 +2251,27 @@ def cache_warmup_api_key(body: WarmupRequest, request: Request, tenant: str = De
 @app.put("/settings")
 def update_settings(body: SettingsUpdate, tenant: str = Depends(get_tenant_from_key)):
     """Update cache settings for the tenant."""
-    T = svc.tenant(tenant)
-    changed = {}
+    if body.admission_policy is not None and body.admission_policy not in _ADMISSION_POLICIES:
+        raise HTTPException(status_code=400, detail=f"admission_policy must be one of {', '.join(_ADMISSION_POLICIES)}")
+    settings = {}
     if body.sim_threshold is not None:
-        clamped = max(0.50, min(0.99, body.sim_threshold))
-        T.sim_threshold = clamped
-        changed["sim_threshold"] = round(clamped, 3)
+        settings["sim_threshold"] = max(0.50, min(0.99, body.sim_threshold))
+    if body.speculative_llm is not None:
+        settings["speculative_llm"] = body.speculative_llm
+    if body.speculative_max_hit_prob is not None:
+        settings["speculative_max_hit_prob"] = max(0.0, min(1.0, body.speculative_max_hit_prob))
+    if body.stale_grace_seconds is not None:
+        settings["stale_grace_seconds"] = max(0, min(7 * 24 * 3600, body.stale_grace_seconds))
+    if body.refresh_ahead_seconds is not None:
+        settings["refresh_ahead_seconds"] = max(0, min(7 * 24 * 3600, body.refresh_ahead_seconds))
+    if body.refresh_min_uses is not None:
+        settings["refresh_min_uses"] = max(1, body.refresh_min_uses)
+    if body.admission_policy is not None:
+        settings["admission_policy"] = body.admission_policy
+    if settings:
+        svc.update_settings(tenant, settings)
+    T = svc.tenant(tenant)
+    changed = {k: round(v, 3) if isinstance(v, float) else v for k, v in settings.items()}
     if body.ttl_days is not None:
         changed["ttl_days"] = max(1, min(90, body.ttl_days))
     access_log.info(f"{tenant} | /settings | updated={changed}")
@@ -1197,7 +2280,7 @@ def update_settings(body: SettingsUpdate, tenant: str = Depends(get_tenant_from_
 def _get_user_from_supabase_token(request: Request) -> dict:
     """Extract and verify Supabase JWT from Authorization header. Returns user profile dict."""
     from auth import verify_token
-    from database import get_user_by_id
+    from user_cache import get_user
 
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -1212,7 +2295,7 @@ def _get_user_from_supabase_token(request: Request) -> dict:
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token payload")
 
-    user = get_user_by_id(user_id)
+    user = get_user(user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
@@ -1262,7 +2345,8 @@ def generate_api_key_endpoint(
         user = _get_user_from_supabase_token(request)
         user_id = user["id"]
         from api_key_generator import generate_api_key
-        from database import create_api_key, list_api_keys, get_api_key_info, get_user_orgs
+        from database import create_api_key, list_api_keys, get_api_key_info
+        from user_cache import get_user_orgs
 
         existing_keys = list_api_keys(user_id=user_id)
         if existing_keys and tenant is None:
@@ -1346,7 +2430,7 @@ def get_current_user(request: Request):
         user = _get_user_from_supabase_token(request)
         orgs = []
         try:
-            from database import get_user_orgs
+            from user_cache import get_user_orgs
             orgs = get_user_orgs(user["id"])
         except Exception:
             pass
@@ -1379,6 +2463,7 @@ def set_user_openai_key_endpoint(request: OpenAIKeyRequest, auth_request: Reques
     try:
         user = _get_user_from_supabase_token(auth_request)
         from database import set_user_openai_key
+        from user_cache import invalidate_user
         from encryption import encrypt_api_key
 
         try:
@@ -1387,6 +2472,7 @@ def set_user_openai_key_endpoint(request: OpenAIKeyRequest, auth_request: Reques
             raise HTTPException(status_code=400, detail=str(e))
 
         success = set_user_openai_key(user["id"], encrypted_key)
+        invalidate_user(user["id"])
         if not success:
             raise HTTPException(status_code=500, detail="Failed to save OpenAI API key")
 
@@ -1421,8 +2507,10 @@ def remove_user_openai_key(auth_request: Request):
     try:
         user = _get_user_from_supabase_token(auth_request)
         from database import clear_user_openai_key
+        from user_cache import invalidate_user
 
         success = clear_user_openai_key(user["id"])
+        invalidate_user(user["id"])
         if not success:
             raise HTTPException(status_code=500, detail="Failed to remove OpenAI API key")
 
@@ -1435,8 +2523,12 @@ def remove_user_openai_key(auth_request: Request):
         raise HTTPException(status_code=500, detail="Failed to remove OpenAI API key")
 
 @app.post("/api/auth/logout")
-def logout():
-    """Logout (client clears Supabase session)."""
+def logout(request: Request):
+    """Logout (client clears Supabase session; the token is dropped from the verification cache)."""
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        from auth import forget_token
+        forget_token(auth_header.split(" ")[1])
     return {"message": "Logged out successfully"}
 
 # ── Organization endpoints ──
@@ -1451,9 +2543,11 @@ def create_org(body: CreateOrgRequest, request: Request):
     try:
         user = _get_user_from_supabase_token(request)
         from database import create_organization, log_audit
+        from user_cache import invalidate_user
         org = create_organization(body.name, body.slug, user["id"])
         if not org:
             raise HTTPException(status_code=400, detail="Could not create organization")
+        invalidate_user(user["id"])
         log_audit(
             org_id=str(org["id"]), user_id=user["id"], action="org.created",
             resource_type="organization", resource_id=str(org["id"]),
@@ -1471,7 +2565,7 @@ def list_user_orgs(request: Request):
     """List organizations for the current user."""
     try:
         user = _get_user_from_supabase_token(request)
-        from database import get_user_orgs
+        from user_cache import get_user_orgs
         orgs = get_user_orgs(user["id"])
         return {"orgs": [{k: str(v) for k, v in o.items()} for o in orgs]}
     except HTTPException:
@@ -1490,12 +2584,14 @@ def invite_member(org_id: str, body: InviteMemberRequest, request: Request):
     try:
         user = _get_user_from_supabase_token(request)
         from database import add_org_member, get_user_by_email, log_audit
+        from user_cache import invalidate_user
         target = get_user_by_email(body.email)
         if not target:
             raise HTTPException(status_code=404, detail="User not found")
         ok = add_org_member(org_id, str(target["id"]), body.role)
         if not ok:
             raise HTTPException(status_code=400, detail="Already a member")
+        invalidate_user(str(target["id"]))
         log_audit(
             org_id=org_id, user_id=user["id"], action="member.added",
             resource_type="org_member", resource_id=str(target["id"]),
@@ -1517,7 +2613,8 @@ def update_org_settings_endpoint(org_id: str, body: OrgSettingsUpdate, request:
     """Update organization settings (e.g. webhook URL for cache events)."""
     try:
         user = _get_user_from_supabase_token(request)
-        from database import update_org_settings, get_user_orgs
+        from database import update_org_settings
+        from user_cache import get_user_orgs, invalidate_org
         orgs = get_user_orgs(user["id"])
         if not any(str(o["id"]) == org_id for o in orgs):
             raise HTTPException(status_code=403, detail="Not a member of this organization")
@@ -1526,6 +2623,7 @@ def update_org_settings_endpoint(org_id: str, body: OrgSettingsUpdate, request:
             updates["webhook_url"] = body.webhook_url.strip() or None
         if updates:
             update_org_settings(org_id, updates)
+            invalidate_org(org_id)
         return {"message": "Settings updated"}
     except HTTPException:
         raise
@@ -1534,20 +2632,28 @@ def update_org_settings_endpoint(org_id: str, body: OrgSettingsUpdate, request:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/orgs/{org_id}/audit")
-def get_audit_logs(org_id: str, request: Request, limit: int = Query(50, ge=1, le=500)):
-    """Get audit logs for an organization."""
+def get_audit_logs(
+    org_id: str,
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    days: int = Query(90, ge=1, le=800),
+):
+    """Get audit logs for an organization from the last `days` days."""
     try:
         _get_user_from_supabase_token(request)
+        from datetime import datetime, timedelta, timezone
         from database import get_db_connection
-        from psycopg2.extras import RealDictCursor
-        with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        from psycopg.rows import dict_row
+        # A literal lower bound lets Postgres prune the monthly partitions
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        with get_db_connection(readonly=True) as conn:
+            cur = conn.cursor(row_factory=dict_row)
             cur.execute(
                 """SELECT id, org_id, user_id, action, resource_type, resource_id,
                           details, ip_address, created_at
-                   FROM audit_logs WHERE org_id = %s
+                   FROM audit_logs WHERE org_id = %s AND created_at >= %s
                    ORDER BY created_at DESC LIMIT %s""",
-                (org_id, limit)
+                (org_id, since, limit)
             )
             logs = [dict(r) for r in cur.fetchall()]
         return {"audit_logs": [{k: str(v) for k, v in l.items()} for l in logs]}
@@ -1589,7 +2695,7 @@ def openai_compatible(request: Request, body: ChatRequest, tenant: str = Depends
         messages = [m.dict() for m in body.messages]
         chunk_id = f"chatcmpl-{hashlib.md5(str(time.time()).encode()).hexdigest()[:24]}"
 
-        if body.stream:
+        if body.stream and not body.lookup_only:
             def stream_generator():
                 ans, meta = svc.query(
                     tenant,
@@ -1649,6 +2755,7 @@ def openai_compatible(request: Request, body: ChatRequest, tenant: str = Depends
             ttl_seconds=body.ttl_seconds,
             temperature=body.temperature,
             user_id=user_id,
+            lookup_only=body.lookup_only,
         )
         _log_key = _ctx.get("key", "unknown")
         _log_uid = _ctx.get("user_id")
@@ -1670,7 +2777,7 @@ def openai_compatible(request: Request, body: ChatRequest, tenant: str = Depends
         threading.Thread(target=_bg_log, daemon=True).start()
         
         prompt_tokens = sum(len(m.content.split()) * 4 // 3 for m in body.messages)
-        completion_tokens = len(ans.split()) * 4 // 3
+        completion_tokens = len(ans.split()) * 4 // 3 if ans is not None else 0
         
         access_log.info(f"{tenant} | /v1/chat/completions | {meta['hit']} | sim={meta['similarity']:.3f} | {meta['latency_ms']}ms")
         try:
@@ -1688,7 +2795,8 @@ def openai_compatible(request: Request, body: ChatRequest, tenant: str = Depends
             "object": "chat.completion",
             "created": int(time.time()),
             "model": body.model,
-            "choices": [{
+            # A lookup-only miss has no answer
+            "choices": [] if ans is None else [{
                 "index": 0,
                 "message": {"role": "assistant", "content": ans},
                 "finish_reason": "stop",
@@ -1702,6 +2810,8 @@ def openai_compatible(request: Request, body: ChatRequest, tenant: str = Depends
             "system_fingerprint": f"semantis-{meta.get('hit', 'miss')}",
             "meta": meta,
         }
+    except UpstreamBusy as e:
+        raise _upstream_busy(tenant, "/v1/chat/completions", e)
     except Exception as e:
         error_log.exception(f"{tenant} | /v1/chat/completions | error: {e}")
         raise HTTPException(status_code=500, detail="Internal error")
@@ -1735,7 +2845,8 @@ def get_billing_status(request: Request):
     """Get billing status for the current user's org."""
     try:
         user = _get_user_from_supabase_token(request)
-        from database import get_user_orgs, get_usage_stats_by_org
+        from database import get_usage_stats_by_org
+        from user_cache import get_user_orgs
         from billing import get_plan_limits
         orgs = get_user_orgs(user["id"])
         if not orgs:
@@ -1795,7 +2906,8 @@ def upgrade_plan(body: UpgradePlanRequest, request: Request):
         
         if not is_enabled():
             # If Stripe is not configured, just update the plan directly
-            from database import get_user_orgs, update_org_settings
+            from database import update_org_settings
+            from user_cache import get_user_orgs
             orgs = get_user_orgs(user["id"])
             if orgs:
                 from database import get_db_connection
@@ -1805,6 +2917,8 @@ def upgrade_plan(body: UpgradePlanRequest, request: Request):
                         "UPDATE organizations SET plan = %s WHERE id = %s",
                         (body.plan, orgs[0]["id"])
                     )
+                from user_cache import invalidate_org
+                invalidate_org(orgs[0]["id"])
                 return {"message": f"Plan updated to {body.plan}", "redirect_url": None}
             raise HTTPException(status_code=400, detail="No organization found")
         
@@ -1816,7 +2930,8 @@ def upgrade_plan(body: UpgradePlanRequest, request: Request):
         if not price_id:
             raise HTTPException(status_code=400, detail=f"Invalid plan: {body.plan}")
         
-        from database import get_user_orgs, get_organization, update_org_settings
+        from database import get_organization, update_org_settings
+        from user_cache import get_user_orgs
         orgs = get_user_orgs(user["id"])
         if not orgs:
             raise HTTPException(status_code=400, detail="No organization found")
@@ -1833,6 +2948,8 @@ def upgrade_plan(body: UpgradePlanRequest, request: Request):
             customer_id = create_customer(org_id, org_name, user_email)
             if customer_id:
                 update_org_settings(org_id, {"stripe_customer_id": customer_id})
+                from user_cache import invalidate_org
+                invalidate_org(org_id)
         
         if not customer_id:
             raise HTTPException(status_code=500, detail="Failed to create Stripe customer")
@@ -1880,6 +2997,8 @@ async def stripe_webhook(request: Request):
                             "UPDATE organizations SET plan = %s WHERE id = %s",
                             (plan, org_id)
                         )
+                    from user_cache import invalidate_org
+                    invalidate_org(org_id)
                 except Exception as e:
                     error_log.error(f"Webhook plan update failed | org={org_id} | error={e}")
         
@@ -0,0 +1,233 @@
+"""
+Shared Index Module
+Multi-worker serving with a single writer and N mmap readers.
+
+When SEMANTIS_MULTIWORKER=true, the uvicorn/gunicorn worker that holds
+cache_data/shared/writer.lock becomes the writer: it owns the mutable
+FAISS indexes, ingests new entries spooled by the other workers, and
+writes the per-tenant snapshots in cache_data/tenants (see
+cache_persistence.write_tenant_snapshot). Reader workers open those snapshots with IO_FLAG_MMAP_IFC, so vector data is
+held once in the OS page cache no matter how many workers run. Readers pick
+up new generations every SHARED_INDEX_REFRESH_SECONDS, which bounds how
+stale a worker's view can be. Tenant settings (PUT /settings) travel the
+same way: a reader spools them to the writer, and every reader takes them
+from the next generation. If the writer dies, its flock is released
+and the next reader to tick takes over.
+"""
+import os
+import time
+import pickle
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from cache_persistence import TENANTS_DIR as SNAPSHOT_DIR
+
+logger = logging.getLogger("semantis.shared_index")
+
+MULTIWORKER_ENABLED = os.getenv("SEMANTIS_MULTIWORKER", "false").lower() == "true"
+SHARED_DIR = os.getenv("SHARED_INDEX_DIR", os.path.join("cache_data", "shared"))
+REFRESH_SECONDS = float(os.getenv("SHARED_INDEX_REFRESH_SECONDS", "2"))
+
+SPOOL_DIR = os.path.join(SHARED_DIR, "spool")
+LOCK_FILE = os.path.join(SHARED_DIR, "writer.lock")
+
+# Superseded mmap'd stores (FAISS index + text arena) are kept alive this long
+# so embeddings a request thread is still holding never point into an
+# unmapped region.
+RETIRED_INDEX_GRACE_SECONDS = 60
+
+
+class WriterLock:
+    """Non-blocking exclusive flock; released by the OS when the process exits."""
+
+    def __init__(self, path: str = LOCK_FILE):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        import fcntl
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+
+def spool_entry(tenant_id: str, record: Dict) -> None:
+    """Hand a new cache entry to the writer (atomic file-per-entry spool)."""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.pkl"
+    tmp_path = os.path.join(SPOOL_DIR, "." + name)
+    with open(tmp_path, "wb") as f:
+        pickle.dump((tenant_id, record), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, os.path.join(SPOOL_DIR, name))
+
+
+def drain_spool(limit: int = 10000) -> List[Tuple[str, Dict]]:
+    """Read and delete spooled entries in arrival order (writer only)."""
+    if not os.path.isdir(SPOOL_DIR):
+        return []
+    names = sorted(n for n in os.listdir(SPOOL_DIR) if not n.startswith("."))[:limit]
+    records = []
+    for name in names:
+        path = os.path.join(SPOOL_DIR, name)
+        try:
+            with open(path, "rb") as f:
+                records.append(pickle.load(f))
+        except Exception as e:
+            logger.warning("Dropping unreadable spool file %s: %s", name, e)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return records
+
+
+class SharedIndexSync:
+    """
+    Background synchronisation between one SemanticCacheService and the
+    shared snapshot directory. Construct once per process.
+    """
+
+    def __init__(self, svc):
+        self.svc = svc
+        self.lock = WriterLock()
+        self.is_writer = self.lock.try_acquire()
+        self._loaded_gen: Dict[str, int] = {}
+        self._pending: Dict[str, set] = {}  # tenant -> prompt_norms spooled but not yet published
+        self._retired: List[Tuple[float, object]] = []
+        self._thread: Optional[threading.Thread] = None
+        logger.info("Shared index | pid=%s | role=%s", os.getpid(), "writer" if self.is_writer else "reader")
+
+    # ── Writer side ──
+
+    def _ingest_spool(self) -> int:
+        ingested = 0
+        for tenant_id, record in drain_spool():
+            if "settings" in record:
+                self.svc.update_settings(tenant_id, record["settings"])
+                continue
+            T = self.svc.tenant(tenant_id)
+            key = record["prompt_norm"]
+            existing = T.exact.get(key)
+            own_pending = key in self._pending.get(tenant_id, ())
+            if existing is not None and not own_pending and existing.fresh() and existing.model == record["model"]:
+                continue  # two workers missed on the same prompt
+            self._pending.get(tenant_id, set()).discard(key)
+            self.svc._insert_local(tenant_id, T, record)
+            ingested += 1
+        return ingested
+
+    def _writer_tick(self) -> None:
+        ingested = self._ingest_spool()
+        # The writer's per-tenant snapshots are the published generations
+        self.svc._save_cache()
+        if ingested:
+            logger.debug("Shared index | ingested=%d", ingested)
+
+    # ── Reader side ──
+
+    def spool(self, tenant_id: str, record: Dict) -> None:
+        self._pending.setdefault(tenant_id, set()).add(record["prompt_norm"])
+        spool_entry(tenant_id, record)
+
+    def spool_settings(self, tenant_id: str, settings: Dict) -> None:
+        """Hand a PUT /settings change to the writer, which publishes it with the next generation."""
+        spool_entry(tenant_id, {"settings": dict(settings)})
+
+    def load(self, tenant_id: str):
+        """Map the current generation of a tenant that is not resident yet."""
+        from cache_persistence import load_tenant_snapshot
+        gen, T = load_tenant_snapshot(tenant_id, base_dir=SNAPSHOT_DIR, mmap=not self.is_writer)
+        if T is not None:
+            self._loaded_gen[tenant_id] = gen
+        return T
+
+    def forget(self, tenant_id: str, T) -> None:
+        """Called when a resident tenant is offloaded."""
+        self._loaded_gen.pop(tenant_id, None)
+        if T.index is not None and not self.is_writer:
+            self._retired.append((time.time(), T.store))
+
+    def refresh(self, tenant_id: str, mmap: bool = True) -> bool:
+        """Swap in the latest published generation, and its tenant settings, if it is newer than ours."""
+        from cache_persistence import current_generation, load_tenant_snapshot
+        from semantic_cache_server import TENANT_SETTINGS
+        T = self.svc.tenants.get(tenant_id)
+        if T is None:
+            return False
+        if current_generation(tenant_id, base_dir=SNAPSHOT_DIR) <= self._loaded_gen.get(tenant_id, 0):
+            return False
+        gen, fresh = load_tenant_snapshot(tenant_id, base_dir=SNAPSHOT_DIR, mmap=mmap)
+        if fresh is None:
+            return False
+        with self.svc._cache_lock:
+            # Keep entries this worker spooled that the writer hasn't published yet
+            pending = self._pending.get(tenant_id, set())
+            pending.difference_update(fresh.exact.keys())
+            for key in pending:
+                entry = T.exact.get(key)
+                if entry is not None:
+                    fresh.store.add(**entry.fields(), index_vector=False)
+            if T.index is not None:
+                self._retired.append((time.time(), T.store))
+            T.store = fresh.store
+            # A settings change made on this worker comes back in a later generation
+            for name in TENANT_SETTINGS:
+                setattr(T, name, getattr(fresh, name))
+        self._loaded_gen[tenant_id] = gen
+        return True
+
+    def refresh_resident(self, mmap: bool = True) -> int:
+        refreshed = 0
+        for tenant_id in list(self.svc.tenants.keys()):
+            try:
+                refreshed += int(self.refresh(tenant_id, mmap=mmap))
+            except Exception as e:
+                logger.warning("Snapshot refresh failed | tenant=%s | %s", tenant_id, e)
+        now = time.time()
+        self._retired = [(t, store) for t, store in self._retired if now - t < RETIRED_INDEX_GRACE_SECONDS]
+        return refreshed
+
+    def _promote(self) -> None:
+        """Become the writer: reload resident tenants as owned (non-mmap) indexes."""
+        logger.warning("Shared index | pid=%s | promoted to writer", os.getpid())
+        self._loaded_gen.clear()
+        self.refresh_resident(mmap=False)
+        self.is_writer = True
+
+    # ── Loop ──
+
+    def tick(self) -> None:
+        if not self.is_writer and self.lock.try_acquire():
+            self._promote()
+        if self.is_writer:
+            self._writer_tick()
+        else:
+            self.refresh_resident(mmap=True)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(REFRESH_SECONDS)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning("Shared index tick failed: %s", e)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="shared-index-sync", daemon=True)
+            self._thread.start()
@@ -0,0 +1,162 @@
+"""
+Speculative LLM calls for cache misses.
+
+Without speculation a miss costs embedding RTT + search + LLM RTT, because
+the LLM is only called once the semantic tier has said no. A tenant that
+opts in starts the LLM request on a worker thread right after the exact-match
+miss, in parallel with the embedding call and the FAISS search:
+
+  - semantic miss: the already running completion is used, saving up to the
+    embedding + search time;
+  - semantic hit: the completion is cancelled if it has not started yet and
+    otherwise abandoned (its tokens are still billed upstream).
+
+Whether to speculate is decided per request from the tenant's predicted
+semantic hit probability (an EWMA of past outcomes): speculating on a request
+that is likely to hit mostly buys wasted tokens. SpeculationStats records
+both sides so the cut-off can be tuned per tenant.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger("semantis.speculative_llm")
+
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "false").lower() == "true"  # default for new tenants
+SPECULATIVE_MAX_HIT_PROB = float(os.getenv("SPECULATIVE_MAX_HIT_PROB", "0.5"))
+SPECULATIVE_LLM_WORKERS = int(os.getenv("SPECULATIVE_LLM_WORKERS", "32"))
+
+# Weight of the newest outcome in the hit probability estimate
+_HIT_PROB_ALPHA = 0.05
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_in_flight = 0
+
+
+@dataclass
+class SpeculationStats:
+    started: int = 0
+    used: int = 0          # semantic miss: the speculative answer was returned
+    abandoned: int = 0     # semantic hit: the answer was not needed
+    skipped_busy: int = 0  # all speculation workers, or all miss slots, were busy
+    saved_ms: float = 0.0
+    wasted_tokens_est: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "used": self.used,
+            "abandoned": self.abandoned,
+            "skipped_busy": self.skipped_busy,
+            "saved_ms_total": round(self.saved_ms, 2),
+            "avg_saved_ms": round(self.saved_ms / self.used, 2) if self.used else 0.0,
+            "wasted_tokens_est": self.wasted_tokens_est,
+        }
+
+
+def update_hit_prob(hit_prob: float, hit: bool) -> float:
+    """Fold one semantic-tier outcome into the tenant's hit probability estimate."""
+    return hit_prob + _HIT_PROB_ALPHA * ((1.0 if hit else 0.0) - hit_prob)
+
+
+def should_speculate(enabled: bool, hit_prob: float, max_hit_prob: float) -> bool:
+    return enabled and hit_prob <= max_hit_prob
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=SPECULATIVE_LLM_WORKERS, thread_name_prefix="speculative-llm")
+    return _pool
+
+
+class SpeculativeCall:
+    """One LLM request started before the cache has decided whether it is needed."""
+
+    def __init__(self, future: Future, started_at: float, prompt_tokens: int,
+                 on_done: Optional[Callable[[], None]] = None):
+        self._future = future
+        self.started_at = started_at
+        self.prompt_tokens = prompt_tokens
+        self._on_done = on_done
+
+    def result(self, stats: SpeculationStats) -> Tuple[str, float]:
+        """Wait for the answer; returns it with the latency saved by starting early (ms)."""
+        decided_at = time.time()
+        text, finished_at = self._future.result()
+        saved_ms = max(0.0, (min(decided_at, finished_at) - self.started_at) * 1000)
+        stats.used += 1
+        stats.saved_ms += saved_ms
+        return text, round(saved_ms, 2)
+
+    def abandon(self, stats: SpeculationStats, tenant_id: str) -> None:
+        """The cache answered: cancel the request, or account for it once it finishes."""
+        stats.abandoned += 1
+        if self._future.cancel():
+            _release(self._on_done)
+            return
+
+        def _account(f: Future):
+            if f.cancelled() or f.exception() is not None:
+                return
+            text, _ = f.result()
+            tokens = self.prompt_tokens + len(text.split())
+            stats.wasted_tokens_est += tokens
+            logger.info(f"Speculative LLM call abandoned | tenant={tenant_id} | tokens~={tokens}")
+
+        self._future.add_done_callback(_account)
+
+
+def _release(on_done: Optional[Callable[[], None]] = None) -> None:
+    global _in_flight
+    with _pool_lock:
+        _in_flight -= 1
+    if on_done is not None:
+        on_done()
+
+
+def start(call_llm: Callable[..., str], messages: List[dict], temperature: float,
+          user_id: Optional[str], stats: SpeculationStats,
+          on_done: Optional[Callable[[], None]] = None) -> Optional[SpeculativeCall]:
+    """
+    Submit call_llm to the speculation pool; None (caller calls the LLM itself)
+    when it is saturated. on_done is called exactly once, when the call
+    finishes or is cancelled, or right away if it is not started.
+    """
+    global _in_flight
+    with _pool_lock:
+        if _in_flight >= SPECULATIVE_LLM_WORKERS:
+            stats.skipped_busy += 1
+            busy = True
+        else:
+            _in_flight += 1
+            busy = False
+    if busy:
+        if on_done is not None:
+            on_done()
+        return None
+
+    def _run():
+        try:
+            text = call_llm(messages, temperature, user_id)
+            return text, time.time()
+        finally:
+            _release(on_done)
+
+    prompt_tokens = sum(len(m.get("content", "").split()) for m in messages)
+    started_at = time.time()
+    try:
+        future = _executor().submit(_run)
+    except RuntimeError:  # interpreter shutting down
+        _release(on_done)
+        return None
+    stats.started += 1
+    return SpeculativeCall(future, started_at, prompt_tokens, on_done)
@@ -96,11 +96,11 @@ CREATE TRIGGER api_keys_updated_at
   FOR EACH ROW EXECUTE FUNCTION public.update_updated_at();
 
 -- =============================================================================
--- 6. Usage Logs table (updated with org_id)
+-- 6. Usage Logs table (updated with org_id; monthly partitions, see 7a)
 -- =============================================================================
 
 CREATE TABLE IF NOT EXISTS public.usage_logs (
-  id SERIAL PRIMARY KEY,
+  id SERIAL,
   api_key TEXT NOT NULL,
   tenant_id TEXT NOT NULL,
   user_id UUID,
@@ -111,15 +111,57 @@ CREATE TABLE IF NOT EXISTS public.usage_logs (
   cache_misses INTEGER DEFAULT 0,
   tokens_used INTEGER DEFAULT 0,
   cost_estimate REAL DEFAULT 0,
-  logged_at TIMESTAMPTZ DEFAULT NOW()
+  logged_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (id, logged_at)
+) PARTITION BY RANGE (logged_at);
+
+-- =============================================================================
+-- 6a. Usage Rollups (maintained by usage_rollups.py from usage_logs)
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.usage_rollup_hourly (
+  bucket_start TIMESTAMPTZ NOT NULL,
+  api_key TEXT NOT NULL,
+  tenant_id TEXT NOT NULL,
+  endpoint TEXT NOT NULL DEFAULT '',
+  org_id UUID,
+  user_id UUID,
+  request_count BIGINT NOT NULL DEFAULT 0,
+  cache_hits BIGINT NOT NULL DEFAULT 0,
+  cache_misses BIGINT NOT NULL DEFAULT 0,
+  tokens_used BIGINT NOT NULL DEFAULT 0,
+  cost_estimate DOUBLE PRECISION NOT NULL DEFAULT 0,
+  PRIMARY KEY (bucket_start, api_key, tenant_id, endpoint)
+);
+
+CREATE TABLE IF NOT EXISTS public.usage_rollup_daily (
+  bucket_start TIMESTAMPTZ NOT NULL,  -- UTC midnight
+  api_key TEXT NOT NULL,
+  tenant_id TEXT NOT NULL,
+  endpoint TEXT NOT NULL DEFAULT '',
+  org_id UUID,
+  user_id UUID,
+  request_count BIGINT NOT NULL DEFAULT 0,
+  cache_hits BIGINT NOT NULL DEFAULT 0,
+  cache_misses BIGINT NOT NULL DEFAULT 0,
+  tokens_used BIGINT NOT NULL DEFAULT 0,
+  cost_estimate DOUBLE PRECISION NOT NULL DEFAULT 0,
+  PRIMARY KEY (bucket_start, api_key, tenant_id, endpoint)
+);
+
+-- usage_logs rows before rolled_until are reflected in the rollups
+CREATE TABLE IF NOT EXISTS public.usage_rollup_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  rolled_until TIMESTAMPTZ NOT NULL,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 -- =============================================================================
--- 7. Audit Logs table
+-- 7. Audit Logs table (monthly partitions, see 7a)
 -- =============================================================================
 
 CREATE TABLE IF NOT EXISTS public.audit_logs (
-  id SERIAL PRIMARY KEY,
+  id SERIAL,
   org_id UUID REFERENCES public.organizations(id),
   user_id UUID,
   action TEXT NOT NULL,
@@ -127,8 +169,83 @@ CREATE TABLE IF NOT EXISTS public.audit_logs (
   resource_id TEXT,
   details JSONB DEFAULT '{}',
   ip_address TEXT,
-  created_at TIMESTAMPTZ DEFAULT NOW()
-);
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- =============================================================================
+-- 7a. Monthly log partitions
+-- usage_logs and audit_logs are range-partitioned by month (UTC), e.g.
+-- usage_logs_p2025_01. log_partitions.py keeps upcoming months created and
+-- detaches, archives and drops months past retention.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION public.create_monthly_partitions(parent TEXT, from_month DATE, months INT)
+RETURNS INT AS $$
+DECLARE
+  m DATE := date_trunc('month', from_month)::date;
+  part TEXT;
+  created INT := 0;
+BEGIN
+  FOR i IN 1..months LOOP
+    part := parent || '_p' || to_char(m, 'YYYY_MM');
+    IF to_regclass('public.' || part) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE public.%I PARTITION OF public.%I FOR VALUES FROM (%L) TO (%L)',
+        part, parent, m::timestamp AT TIME ZONE 'UTC', (m + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC'
+      );
+      created := created + 1;
+    END IF;
+    m := (m + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Convert pre-partitioning installs: move rows into a partitioned copy
+DO $$
+DECLARE
+  t TEXT;
+  ts_col TEXT;
+  lo DATE;
+  hi DATE;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['usage_logs', 'audit_logs'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+               WHERE n.nspname = 'public' AND c.relname = t AND c.relkind = 'r') THEN
+      ts_col := CASE t WHEN 'usage_logs' THEN 'logged_at' ELSE 'created_at' END;
+      EXECUTE format('ALTER TABLE public.%I RENAME TO %I', t, t || '_legacy');
+      EXECUTE format('ALTER SEQUENCE public.%I OWNED BY NONE', t || '_id_seq');
+      EXECUTE format('UPDATE public.%I SET %I = NOW() WHERE %I IS NULL', t || '_legacy', ts_col, ts_col);
+      EXECUTE format(
+        'CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS, PRIMARY KEY (id, %I)) PARTITION BY RANGE (%I)',
+        t, t || '_legacy', ts_col, ts_col
+      );
+      IF EXISTS (SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = 'public' AND table_name = t AND column_name = 'org_id') THEN
+        EXECUTE format('ALTER TABLE public.%I ADD FOREIGN KEY (org_id) REFERENCES public.organizations(id)', t);
+      END IF;
+      EXECUTE format(
+        'SELECT date_trunc(''month'', MIN(%1$I) AT TIME ZONE ''UTC'')::date,
+                date_trunc(''month'', MAX(%1$I) AT TIME ZONE ''UTC'')::date FROM public.%2$I',
+        ts_col, t || '_legacy'
+      ) INTO lo, hi;
+      IF lo IS NOT NULL THEN
+        PERFORM public.create_monthly_partitions(
+          t, lo, ((EXTRACT(YEAR FROM hi) - EXTRACT(YEAR FROM lo)) * 12
+                  + EXTRACT(MONTH FROM hi) - EXTRACT(MONTH FROM lo))::int + 1
+        );
+      END IF;
+      PERFORM public.create_monthly_partitions(t, (NOW() AT TIME ZONE 'UTC')::date, 4);
+      EXECUTE format('INSERT INTO public.%I SELECT * FROM public.%I', t, t || '_legacy');
+      EXECUTE format('DROP TABLE public.%I', t || '_legacy');
+      EXECUTE format('ALTER SEQUENCE public.%I OWNED BY public.%I.id', t || '_id_seq', t);
+    END IF;
+  END LOOP;
+END $$;
+
+SELECT public.create_monthly_partitions('usage_logs', (NOW() AT TIME ZONE 'UTC')::date, 4);
+SELECT public.create_monthly_partitions('audit_logs', (NOW() AT TIME ZONE 'UTC')::date, 4);
 
 -- =============================================================================
 -- 8. Cache Entries table
@@ -149,6 +266,32 @@ CREATE TABLE IF NOT EXISTS public.cache_entries (
   domain TEXT DEFAULT 'general'
 );
 
+-- =============================================================================
+-- 8a. L3 Vector Cache (pgvector) - cold tier behind the in-memory FAISS index
+-- =============================================================================
+-- Keyed by the API-key tenant (not org UUID) like the in-memory cache.
+-- halfvec because pgvector's HNSW index caps `vector` at 2000 dimensions and
+-- text-embedding-3-large produces 3072.
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS public.cache_vectors (
+  id BIGSERIAL PRIMARY KEY,
+  tenant_id TEXT NOT NULL,
+  prompt_hash TEXT NOT NULL,
+  prompt_norm TEXT NOT NULL,
+  response_text TEXT NOT NULL,
+  model TEXT NOT NULL,
+  domain TEXT DEFAULT 'general',
+  strategy TEXT DEFAULT 'miss',
+  embedding halfvec(3072) NOT NULL,
+  ttl_seconds INTEGER NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  expires_at TIMESTAMPTZ NOT NULL,
+  use_count INTEGER DEFAULT 0,
+  UNIQUE (tenant_id, prompt_hash, model)
+);
+
 -- =============================================================================
 -- 8b. Migration: Add new columns to existing tables (for upgrades from old schema)
 -- =============================================================================
@@ -210,8 +353,14 @@ CREATE INDEX IF NOT EXISTS idx_usage_tenant ON public.usage_logs(tenant_id);
 CREATE INDEX IF NOT EXISTS idx_usage_org_id ON public.usage_logs(org_id);
 CREATE INDEX IF NOT EXISTS idx_usage_logged_at ON public.usage_logs(logged_at);
 
+-- Usage Rollups
+CREATE INDEX IF NOT EXISTS idx_usage_hourly_tenant ON public.usage_rollup_hourly(tenant_id, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_usage_hourly_org ON public.usage_rollup_hourly(org_id, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_usage_daily_tenant ON public.usage_rollup_daily(tenant_id, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_usage_daily_org ON public.usage_rollup_daily(org_id, bucket_start);
+
 -- Audit Logs
-CREATE INDEX IF NOT EXISTS idx_audit_org_id ON public.audit_logs(org_id);
+CREATE INDEX IF NOT EXISTS idx_audit_org_id ON public.audit_logs(org_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_audit_user_id ON public.audit_logs(user_id);
 CREATE INDEX IF NOT EXISTS idx_audit_action ON public.audit_logs(action);
 CREATE INDEX IF NOT EXISTS idx_audit_created_at ON public.audit_logs(created_at);
@@ -225,6 +374,11 @@ CREATE INDEX IF NOT EXISTS idx_cache_ttl ON public.cache_entries(ttl_expires_at)
 CREATE INDEX IF NOT EXISTS idx_cache_domain ON public.cache_entries(domain);
 CREATE INDEX IF NOT EXISTS idx_cache_last_used ON public.cache_entries(last_used_at);
 
+-- L3 Vector Cache
+CREATE INDEX IF NOT EXISTS idx_cache_vectors_tenant ON public.cache_vectors(tenant_id, expires_at);
+CREATE INDEX IF NOT EXISTS idx_cache_vectors_hnsw ON public.cache_vectors
+  USING hnsw (embedding halfvec_ip_ops) WITH (m = 16, ef_construction = 64);
+
 -- =============================================================================
 -- 10. Row Level Security
 -- =============================================================================
@@ -235,7 +389,11 @@ ALTER TABLE public.org_members ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.api_keys ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.usage_logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.audit_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.usage_rollup_hourly ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.usage_rollup_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.usage_rollup_state ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.cache_entries ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.cache_vectors ENABLE ROW LEVEL SECURITY;
 
 -- Profiles: users can read/update their own profile
 DROP POLICY IF EXISTS "Users can view own profile" ON public.profiles;
@@ -0,0 +1,151 @@
+"""
+Unit tests for miss admission control (admission.py).
+Run with: python -m pytest -q test_admission.py
+"""
+import threading
+import time
+
+import pytest
+
+from admission import MissAdmission, Overloaded
+
+
+def test_free_slots_are_taken_without_queueing():
+    adm = MissAdmission(max_concurrency=2)
+    adm.acquire("a")
+    adm.acquire("b")
+    stats = adm.stats()
+    assert stats["in_flight"] == 2 and stats["admitted"] == 2 and stats["queued"] == 0
+
+
+def test_tenant_queue_full_sheds_with_429():
+    adm = MissAdmission(max_concurrency=1, tenant_max_queue=0)
+    adm.acquire("a")
+    with pytest.raises(Overloaded) as exc:
+        adm.acquire("a")
+    assert exc.value.status_code == 429 and exc.value.retry_after >= 1.0
+    assert adm.stats()["shed_tenant"] == 1
+
+
+def test_server_queue_full_sheds_with_503():
+    adm = MissAdmission(max_concurrency=1, max_queue=0, tenant_max_queue=4)
+    adm.acquire("a")
+    with pytest.raises(Overloaded) as exc:
+        adm.acquire("b")
+    assert exc.value.status_code == 503
+    assert adm.stats()["shed"] == 1
+
+
+def test_long_expected_wait_sheds_before_queueing():
+    adm = MissAdmission(max_concurrency=1, max_queue=8, max_wait=5)
+    adm.acquire("a")
+    adm.release("a", elapsed=10.0)  # misses take 10s: one queued miss would wait past max_wait
+    adm.acquire("a")
+    with pytest.raises(Overloaded):
+        adm.acquire("b")
+    assert adm.stats()["waiting"] == 0
+
+
+def test_queued_miss_times_out():
+    adm = MissAdmission(max_concurrency=1, max_wait=0.05)
+    adm.acquire("a")
+    with pytest.raises(Overloaded):
+        adm.acquire("b")
+    stats = adm.stats()
+    assert stats["queue_timeouts"] == 1 and stats["waiting"] == 0
+
+
+def test_release_hands_the_slot_to_a_queued_miss():
+    adm = MissAdmission(max_concurrency=1, max_wait=5)
+    adm.acquire("a")
+    admitted = threading.Event()
+
+    def waiter():
+        adm.acquire("b")
+        admitted.set()
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    while adm.stats()["waiting"] == 0:
+        time.sleep(0.001)
+    assert not admitted.is_set()
+    adm.release("a", elapsed=0.01)
+    t.join(timeout=2)
+    assert admitted.is_set()
+    assert adm.tenant_stats("b")["in_flight"] == 1
+
+
+def test_plan_cap_limits_a_tenant_in_flight():
+    adm = MissAdmission(max_concurrency=10, tenant_max_queue=0)
+    adm.set_plan("a", "free")  # max_misses_in_flight = 2
+    adm.acquire("a")
+    adm.acquire("a")
+    with pytest.raises(Overloaded):
+        adm.acquire("a")
+    adm.acquire("b")  # other tenants are not affected
+
+
+def test_try_acquire_never_queues():
+    adm = MissAdmission(max_concurrency=1)
+    assert adm.try_acquire("a")
+    assert not adm.try_acquire("b")
+    assert adm.stats()["waiting"] == 0 and adm.stats()["shed"] == 0
+    adm.release("a", elapsed=0.01)
+    assert adm.try_acquire("b")
+
+
+def _enqueue(adm, tenant_id, n, cost):
+    """Queue n misses directly, as acquire() does when no slot is free."""
+    from admission import _Waiter
+    ts = adm._tenant(tenant_id)
+    for _ in range(n):
+        ts.queue.append(_Waiter(cost))
+        adm._queued += 1
+    adm._active[tenant_id] = ts
+
+
+def _grants(adm, n):
+    order = []
+    for _ in range(n):
+        ts, _ = adm._next_waiter()
+        order.append(ts.plan)
+    return order
+
+
+def test_drr_grants_in_proportion_to_plan_weight():
+    adm = MissAdmission(quantum=100)
+    adm.set_plan("small", "free")  # miss_weight 1
+    adm.set_plan("big", "pro")     # miss_weight 4
+    _enqueue(adm, "small", 50, cost=100)
+    _enqueue(adm, "big", 50, cost=100)
+    order = _grants(adm, 25)
+    assert order.count("pro") == 20 and order.count("free") == 5
+    # Interleaved round by round, not one tenant's backlog first
+    assert order[:5].count("free") == 1
+
+
+def test_drr_charges_request_cost():
+    adm = MissAdmission(quantum=100)
+    adm.set_plan("cheap", "free")
+    adm.set_plan("costly", "free")
+    _enqueue(adm, "cheap", 50, cost=50)
+    _enqueue(adm, "costly", 50, cost=200)
+    _grants(adm, 20)
+    # Equal weights: the same token budget buys four cheap misses per costly one
+    granted = {tid: 50 - len(adm._tenants[tid].queue) for tid in ("cheap", "costly")}
+    assert granted == {"cheap": 16, "costly": 4}
+
+
+def test_drr_skips_tenants_at_their_cap():
+    adm = MissAdmission(quantum=100)
+    adm.set_plan("capped", "free")  # max_misses_in_flight 2
+    adm.set_plan("other", "free")
+    _enqueue(adm, "capped", 5, cost=100)
+    _enqueue(adm, "other", 5, cost=100)
+    adm._tenants["capped"].in_flight = 2
+    order = []
+    for _ in range(5):
+        ts, _ = adm._next_waiter()
+        order.append(ts is adm._tenants["other"])
+    assert all(order)
+    assert adm._next_waiter() is None  # only the capped tenant has misses left
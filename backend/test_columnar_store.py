@@ -0,0 +1,91 @@
+"""
+Unit tests for the columnar store: exact and vector lookup, exact-only rows
+and compaction. Run with: python -m pytest -q test_columnar_store.py
+"""
+import numpy as np
+
+from columnar_store import ColumnarStore
+
+DIM = 8
+
+
+def _vec(i: int) -> np.ndarray:
+    v = np.zeros(DIM, dtype="float32")
+    v[i % DIM] = 1.0
+    return v
+
+
+def _add(store, prompt, i, model="gpt-4o-mini", index_vector=True, created_at=1000.0, ttl=3600):
+    return store.add(prompt_norm=prompt, response_text=f"answer to {prompt}", embedding=_vec(i),
+                     model=model, ttl_seconds=ttl, created_at=created_at, index_vector=index_vector)
+
+
+def test_add_and_search_map_vectors_to_rows():
+    store = ColumnarStore()
+    rows = [_add(store, f"q{i}", i) for i in range(4)]
+    assert rows == [0, 1, 2, 3]
+    assert store.exact["q2"] == 2
+    sims, found = store.search(_vec(2), 1)
+    assert found[0] == 2 and sims[0] > 0.99
+    assert store.response(int(found[0])) == "answer to q2"
+
+
+def test_position_is_mapped_before_the_vector_becomes_searchable():
+    store = ColumnarStore()
+    _add(store, "q0", 0)
+    real = store.index
+    seen = []
+
+    class SpyIndex:
+        def __getattr__(self, name):
+            return getattr(real, name)
+
+        def add(self, v):
+            # A concurrent search may see the vector as soon as it is added
+            pos = real.ntotal
+            seen.append((int(store.row_of_vec[pos]), int(store.vec_pos[1])))
+            real.add(v)
+
+    store.index = SpyIndex()
+    _add(store, "q1", 1)
+    assert seen == [(1, 1)]
+
+
+def test_exact_only_rows_are_not_searched_until_indexed():
+    store = ColumnarStore()
+    _add(store, "q0", 0)
+    row = _add(store, "q1", 1, index_vector=False)
+    assert store.vec_pos[row] == -1 and store.nvec == 1
+    _, found = store.search(_vec(1), 2)
+    assert row not in found.tolist()
+    store.index_row(row, _vec(1))
+    _, found = store.search(_vec(1), 1)
+    assert found[0] == row
+
+
+def test_search_eligible_filters_expired_and_other_models():
+    store = ColumnarStore()
+    _add(store, "fresh", 0)
+    _add(store, "expired", 0, ttl=10)
+    _add(store, "other model", 0, model="gpt-4o")
+    _, rows = store.search_eligible(_vec(0), 3, "gpt-4o-mini", now=2000.0)
+    assert rows.tolist() == [0]
+    _, rows = store.search_eligible(_vec(0), 3, "gpt-4o-mini", now=2000.0, grace=5000.0)
+    assert sorted(rows.tolist()) == [0, 1]
+
+
+def test_compacted_redirects_merged_rows_to_survivor():
+    store = ColumnarStore()
+    for i in range(4):
+        _add(store, f"q{i}", i)
+    store.use_count[:4] = [1, 2, 3, 4]
+    redirect = np.array([0, 0, 2, 3])  # row 1 merged into row 0
+    new, new_of = store.compacted(4, redirect, np.array(store.embeddings), dict(store.exact))
+    assert new.size == 3 and new.nvec == 3
+    assert new_of.tolist() == [0, 0, 1, 2]
+    assert new.exact["q1"] == new.exact["q0"] == 0
+    assert new.response(new.exact["q1"]) == "answer to q0"
+    assert new.prompt(2) == "q3"
+
+    new.merge_usage(store, new_of)
+    assert new.use_count[:3].tolist() == [3, 3, 4]
@@ -0,0 +1,160 @@
+"""
+Unit tests for semantic deduplication: compaction.plan clustering and
+compacting a store that is being written to.
+Run with: python -m pytest -q test_compaction.py
+"""
+import threading
+
+import numpy as np
+
+import compaction
+from columnar_store import ColumnarStore
+
+DIM = 64
+NOW = 10_000.0
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    return (v / np.linalg.norm(v)).astype("float32")
+
+
+def _store(vectors, models=None, use_counts=None, ttl=3600):
+    store = ColumnarStore()
+    for i, v in enumerate(vectors):
+        store.add(prompt_norm=f"q{i}", response_text=f"answer {i}", embedding=v,
+                  model=models[i] if models else "gpt-4o-mini", ttl_seconds=ttl,
+                  created_at=NOW - 100 + i, use_count=use_counts[i] if use_counts else 0)
+    return store
+
+
+def _plan(store, threshold=0.97):
+    return compaction.plan(store, store.size, np.array(store.embeddings), NOW, threshold=threshold)
+
+
+def test_near_duplicates_merge_into_most_used_entry():
+    rng = np.random.default_rng(1)
+    a, b = rng.standard_normal(DIM), rng.standard_normal(DIM)
+    vectors = [_unit(a), _unit(a + 0.01), _unit(b), _unit(a - 0.01)]
+    store = _store(vectors, use_counts=[1, 5, 0, 2])
+    redirect = _plan(store)
+    assert redirect.tolist() == [1, 1, 2, 1]
+
+
+def test_distinct_entries_are_kept():
+    store = _store([_unit(v) for v in np.eye(DIM, dtype="float32")[:5]])
+    assert _plan(store).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_entries_of_other_models_are_not_merged():
+    v = _unit(np.ones(DIM))
+    store = _store([v, v, v], models=["gpt-4o-mini", "gpt-4o", "gpt-4o-mini"], use_counts=[0, 9, 1])
+    redirect = _plan(store)
+    assert redirect.tolist() == [2, 1, 2]
+
+
+def test_fresh_entry_survives_over_expired_one():
+    v = _unit(np.ones(DIM))
+    store = _store([v, v])
+    store.use_count[0] = 10
+    store.expires_at[0] = NOW - 1  # most used, but expired
+    assert _plan(store).tolist() == [1, 1]
+
+
+def test_plan_works_in_blocks(monkeypatch):
+    monkeypatch.setattr(compaction, "COMPACTION_BLOCK_MB", 0)  # one row per block
+    rng = np.random.default_rng(2)
+    base = rng.standard_normal((10, DIM))
+    vectors = [_unit(base[i % 10] + 0.001 * j) for j in range(3) for i in range(10)]
+    redirect = _plan(store := _store(vectors))
+    assert len(set(redirect.tolist())) == 10
+    assert store.size == 30
+
+
+def test_due_requires_size_and_growth(monkeypatch):
+    monkeypatch.setattr(compaction, "COMPACTION_MIN_ENTRIES", 100)
+    assert not compaction.due(50, 0)
+    assert compaction.due(100, 0)
+    assert not compaction.due(105, 100)
+    assert compaction.due(120, 100)
+
+
+def _compact(store, lock, pace=None):
+    with lock:
+        size = store.size
+        vectors = np.array(store.embeddings)
+        exact = dict(store.exact)
+    redirect = compaction.plan(store, size, vectors, NOW)
+    return size, store.compacted(size, redirect, vectors, exact, lock=lock, pace=pace)
+
+
+def test_inserts_between_chunks_do_not_disturb_compaction():
+    rng = np.random.default_rng(3)
+    base = rng.standard_normal((300, DIM))
+    store = _store([_unit(base[i % 300] + 0.001 * (i // 300)) for i in range(600)])
+    lock = threading.Lock()
+    extra = []
+
+    def insert_between_chunks():
+        with lock:
+            n = store.size
+            extra.append(store.add(prompt_norm=f"new{n}", response_text="new", embedding=_unit(rng.standard_normal(DIM)),
+                                   model="gpt-4o-mini", ttl_seconds=3600, created_at=NOW))
+            # A prompt asked again after the snapshot now maps to the new row
+            store.exact["q0"] = extra[-1]
+
+    size, (new, new_of) = _compact(store, lock, pace=insert_between_chunks)
+    assert size == 600 and len(extra) >= 2
+    assert new.size == 300
+    assert all(f"new{r}" not in new.exact for r in extra)
+    # q0 keeps its snapshot row's cluster; its survivor is the more recent q300
+    assert new.exact["q0"] == new.exact["q300"]
+    assert new.response(new.exact["q0"]) == "answer 300"
+
+
+def test_concurrent_inserts_while_compacting():
+    rng = np.random.default_rng(4)
+    base = rng.standard_normal((400, DIM))
+    store = _store([_unit(base[i % 400] + 0.001 * (i // 400)) for i in range(1200)])
+    lock = threading.Lock()
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        try:
+            while not stop.is_set():
+                with lock:
+                    store.add(prompt_norm=f"live{i}", response_text=f"live answer {i}",
+                              embedding=_unit(rng.standard_normal(DIM)), model="gpt-4o-mini",
+                              ttl_seconds=3600, created_at=NOW)
+                i += 1
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    try:
+        size, (new, new_of) = _compact(store, lock, pace=lambda: stop.wait(0.001))
+    finally:
+        stop.set()
+        t.join()
+    assert not errors
+    # Rows the writer added before the snapshot are kept: they have no duplicates
+    assert new.size == 400 + (size - 1200)
+    assert len(new.exact) == size
+    assert all(0 <= r < new.size for r in new.exact.values())
+    assert new_of.max() == new.size - 1
+
+
+def test_rag_answers_over_other_documents_are_not_merged():
+    store = ColumnarStore()
+    v = _unit(np.ones(DIM))
+    for i, (docs, answer) in enumerate([("docA", "answer from A"), ("docB", "answer from B"), ("docA", "A again")]):
+        store.add(prompt_norm=f"rag|{docs}|what is x{' ' * i}", response_text=answer, embedding=v,
+                  model="gpt-4o-mini#rag", ttl_seconds=3600, created_at=NOW - 100 + i, use_count=3 - i)
+    lock = threading.Lock()
+    _, (new, _) = _compact(store, lock)
+    assert new.size == 2
+    # Same question, same documents: merged; other documents: kept with its own answer
+    assert new.response(new.exact["rag|docA|what is x  "]) == "answer from A"
+    assert new.response(new.exact["rag|docB|what is x "]) == "answer from B"
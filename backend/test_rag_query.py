@@ -0,0 +1,54 @@
+"""
+Service-level tests for RAG queries (SemanticCacheService.rag_query) while
+the upstream LLM is failing. Run with: python -m pytest -q test_rag_query.py
+"""
+import numpy as np
+import pytest
+
+import semantic_cache_server as server
+from upstream import UpstreamUnavailable
+
+DIM = 16
+
+
+def _vec(seed: int) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(DIM).astype("float32")
+    return v / np.linalg.norm(v)
+
+
+@pytest.fixture
+def svc(monkeypatch):
+    svc = server.SemanticCacheService()
+    monkeypatch.setattr(svc, "_get_embedding_for_query", lambda messages, user_id=None: (_vec(0), ""))
+
+    def circuit_open(*args, **kwargs):
+        raise UpstreamUnavailable("Upstream circuit open for key test", retry_after=7.0)
+
+    monkeypatch.setattr(server, "call_llm", circuit_open)
+    return svc
+
+
+def _cache_answer(svc, tenant_id, docs, question, answer, expired=False):
+    store = svc.tenant(tenant_id).store
+    prompt_norm = svc.rag_prompt_key(sorted(docs), svc.norm_text(question))
+    created_at = server.time.time() - (7200 if expired else 0)
+    store.add(prompt_norm=prompt_norm, response_text=answer, embedding=_vec(0),
+              model="gpt-4o-mini" + server.RAG_MODEL_SUFFIX, ttl_seconds=3600, created_at=created_at)
+
+
+def test_open_circuit_serves_a_degraded_answer_for_the_same_documents(svc):
+    _cache_answer(svc, "t1", ["docA"], "what is x", "answer from A", expired=True)
+    ans, meta = svc.rag_query("t1", "What is X", ["docA"], "gpt-4o-mini", context=["x is y"])
+    assert ans == "answer from A"
+    assert meta["hit"] == "degraded" and meta["degraded_reason"] == "circuit_open" and meta["stale"]
+
+
+def test_open_circuit_never_answers_from_other_documents(svc):
+    _cache_answer(svc, "t2", ["docA"], "what is x", "answer from A", expired=True)
+    with pytest.raises(UpstreamUnavailable):
+        svc.rag_query("t2", "what is x", ["docB"], "gpt-4o-mini", context=["x is z"])
+
+
+def test_open_circuit_maps_to_503_with_retry_after():
+    exc = server._upstream_busy("t", "/v1/rag/query", UpstreamUnavailable("circuit open", retry_after=7.0))
+    assert exc.status_code == 503 and exc.headers["Retry-After"] == "7"
@@ -0,0 +1,75 @@
+"""
+Unit tests for the TinyLFU admission filter (tinylfu.py).
+Run with: python -m pytest -q test_tinylfu.py
+"""
+import numpy as np
+
+import tinylfu
+from tinylfu import FrequencySketch, embedding_bucket, record
+
+
+def test_sketch_counts_keys_independently():
+    sketch = FrequencySketch(width=1024)
+    for _ in range(5):
+        sketch.add("popular")
+    sketch.add("rare")
+    assert sketch.estimate("popular") == 5
+    assert sketch.estimate("rare") == 1
+    assert sketch.estimate("never seen") == 0
+
+
+def test_sketch_counters_saturate():
+    sketch = FrequencySketch(width=1 << 20)  # no halving within the test
+    for _ in range(300):
+        est = sketch.add("hot")
+    assert est == 255
+
+
+def test_sketch_halves_after_sample_size():
+    sketch = FrequencySketch(width=64)
+    sample = tinylfu.ADMISSION_SAMPLE_FACTOR * 64
+    for _ in range(40):
+        sketch.add("hot")
+    for i in range(sample - 40 - 1):
+        sketch.add(f"cold{i % 7}")
+    before = sketch.estimate("hot")
+    sketch.add("cold0")  # reaches the sample size: every counter is halved
+    assert sketch.estimate("hot") == before // 2
+
+
+def test_sketch_state_round_trip():
+    sketch = FrequencySketch(width=256)
+    for _ in range(3):
+        sketch.add("k")
+    restored = FrequencySketch.from_state(sketch.to_state())
+    assert restored.width == 256 and restored.estimate("k") == 3
+    assert restored.add("k") == 4
+
+
+def test_record_admits_repeated_prompts(monkeypatch):
+    monkeypatch.setattr(tinylfu, "ADMISSION_MIN_FREQUENCY", 2)
+    sketch = FrequencySketch(width=1024)
+    assert not record(sketch, "gpt-4o-mini", "what is faiss", None)
+    assert record(sketch, "gpt-4o-mini", "what is faiss", None)
+    # Counted per model
+    assert not record(sketch, "gpt-4o", "what is faiss", None)
+
+
+def test_record_admits_paraphrases_of_a_popular_neighbourhood(monkeypatch):
+    monkeypatch.setattr(tinylfu, "ADMISSION_MIN_FREQUENCY", 2)
+    monkeypatch.setattr(tinylfu, "ADMISSION_BUCKET_MIN_FREQUENCY", 3)
+    rng = np.random.default_rng(0)
+    topic = rng.standard_normal(64).astype("float32")
+    sketch = FrequencySketch(width=1024)
+    # Tiny perturbations keep the sign pattern, so all land in one bucket
+    paraphrases = [topic + 1e-4 * rng.standard_normal(64).astype("float32") for _ in range(3)]
+    assert len({embedding_bucket(v) for v in paraphrases}) == 1
+    assert not record(sketch, "m", "phrasing one", paraphrases[0])
+    assert not record(sketch, "m", "phrasing two", paraphrases[1])
+    assert record(sketch, "m", "phrasing three", paraphrases[2])
+
+
+def test_embedding_bucket_is_deterministic():
+    v = np.linspace(-1, 1, 32).astype("float32")
+    assert embedding_bucket(v) == embedding_bucket(v.copy())
+    assert 0 <= embedding_bucket(v) < 1 << tinylfu.ADMISSION_LSH_BITS
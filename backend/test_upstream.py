@@ -0,0 +1,197 @@
+"""
+Unit tests for the upstream call manager (upstream.py): bulkhead, 429-aware
+token bucket, retry budget and circuit breaker.
+Run with: python -m pytest -q test_upstream.py
+"""
+import pytest
+
+import upstream
+from upstream import UpstreamBusy, UpstreamManager, UpstreamUnavailable, _KeyState
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upstream.time, "sleep", lambda seconds: None)
+
+
+def test_token_bucket_limits_the_request_rate(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_RPS", 2.0)
+    st = _KeyState("k")
+    for _ in range(2):
+        assert st.admit(block=False)
+        st.release()
+    assert not st.admit(block=False)
+
+
+def test_rate_limit_halves_the_rate_and_pauses_the_key():
+    st = _KeyState("k")
+    st.on_rate_limited(retry_after=60.0)
+    assert st.rate == upstream.UPSTREAM_RPS / 2
+    assert not st.admit(block=False)
+    assert st.snapshot()["rate_limited"] == 1
+
+
+def test_successes_recover_the_rate_additively():
+    st = _KeyState("k")
+    st.on_rate_limited(retry_after=0.0)
+    st.on_rate_limited(retry_after=0.0)
+    assert st.rate == upstream.UPSTREAM_RPS / 4
+    st.on_success()
+    assert st.rate == pytest.approx(upstream.UPSTREAM_RPS * 0.3)
+    for _ in range(100):
+        st.on_success()
+    assert st.rate == upstream.UPSTREAM_RPS
+
+
+def test_rate_never_drops_below_the_floor():
+    st = _KeyState("k")
+    for _ in range(50):
+        st.on_rate_limited(retry_after=0.0)
+    assert st.rate == upstream._MIN_RPS
+
+
+def test_bulkhead_queue_times_out(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(upstream, "UPSTREAM_QUEUE_TIMEOUT_SECONDS", 0.05)
+    st = _KeyState("k")
+    st.admit()
+    with pytest.raises(UpstreamBusy):
+        st.admit()
+    assert st.snapshot()["queue_timeouts"] == 1
+    st.release()
+    assert st.admit(block=False)
+
+
+def test_retry_budget_is_bounded():
+    st = _KeyState("k")
+    granted = sum(st.take_retry() for _ in range(20))
+    assert granted == int(upstream._RETRY_BURST)
+    st.admit()  # each call earns a tenth of a retry
+    st.release()
+    assert not st.take_retry()
+
+
+def test_transient_errors_are_retried():
+    mgr = UpstreamManager()
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            raise FakeAPIError(503)
+        return "ok"
+
+    assert mgr.call("key", "chat", fn) == "ok"
+    assert len(calls) == 2
+    key = next(iter(mgr.stats()["keys"].values()))
+    assert key["retries"] == 1 and key["errors"] == 1
+
+
+def test_client_errors_are_not_retried():
+    mgr = UpstreamManager()
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        raise FakeAPIError(400)
+
+    with pytest.raises(FakeAPIError):
+        mgr.call("key", "chat", fn)
+    assert len(calls) == 1
+
+
+def test_retries_stop_after_max_retries():
+    mgr = UpstreamManager()
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        raise FakeAPIError(502)
+
+    with pytest.raises(FakeAPIError):
+        mgr.call("key", "chat", fn)
+    assert len(calls) == 1 + upstream.UPSTREAM_MAX_RETRIES
+
+
+def test_timeout_adapts_to_observed_latency():
+    mgr = UpstreamManager()
+    assert mgr.timeout("chat") == upstream.UPSTREAM_TIMEOUT_MAX_SECONDS  # no samples yet
+    for _ in range(upstream._MIN_SAMPLES):
+        mgr._latency["embedding"].add(1.0)
+    assert mgr.timeout("embedding") == pytest.approx(upstream.UPSTREAM_TIMEOUT_MULTIPLIER * 1.0)
+    # Each attempt gets the current adaptive timeout
+    assert mgr.call("key", "embedding", lambda timeout: timeout) == pytest.approx(3.0)
+
+
+def _failing_calls(mgr, n, status_code=500):
+    def fn(timeout):
+        raise FakeAPIError(status_code)
+
+    for _ in range(n):
+        with pytest.raises(FakeAPIError):
+            mgr.call("key", "chat", fn)
+
+
+def test_breaker_opens_on_failure_rate(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_MAX_RETRIES", 0)
+    mgr = UpstreamManager()
+    _failing_calls(mgr, upstream._BREAKER_MIN_CALLS)
+    calls = []
+    with pytest.raises(UpstreamUnavailable) as exc:
+        mgr.call("key", "chat", lambda timeout: calls.append(timeout))
+    assert not calls  # failed fast, without reaching upstream
+    assert exc.value.retry_after >= 1.0
+    key = next(iter(mgr.stats()["keys"].values()))
+    assert key["circuit"] == "open" and key["circuit_opens"] == 1 and key["circuit_rejected"] == 1
+
+
+def test_breaker_ignores_client_errors_and_rate_limits(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_MAX_RETRIES", 0)
+    mgr = UpstreamManager()
+    _failing_calls(mgr, 2 * upstream._BREAKER_MIN_CALLS, status_code=400)
+    _failing_calls(mgr, 1, status_code=429)  # throttled by the token bucket instead
+    breaker = next(iter(mgr._keys.values())).breaker
+    assert breaker.state == "closed" and not breaker.outcomes
+
+
+def test_breaker_stays_closed_below_the_failure_rate(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_MAX_RETRIES", 0)
+    mgr = UpstreamManager()
+    for _ in range(upstream._BREAKER_MIN_CALLS):
+        mgr.call("key", "chat", lambda timeout: "ok")
+        mgr.call("key", "chat", lambda timeout: "ok")
+        _failing_calls(mgr, 1)
+    key = next(iter(mgr.stats()["keys"].values()))
+    assert key["circuit"] == "closed"
+
+
+def test_half_open_probe_closes_or_reopens(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_MAX_RETRIES", 0)
+    monkeypatch.setattr(upstream, "UPSTREAM_BREAKER_OPEN_SECONDS", 0.0)
+    mgr = UpstreamManager()
+    _failing_calls(mgr, upstream._BREAKER_MIN_CALLS)
+    breaker = next(iter(mgr._keys.values())).breaker
+    assert breaker.state == "open"
+
+    _failing_calls(mgr, 1)  # the probe fails: open again
+    assert breaker.state == "open" and breaker.opens == 2
+
+    assert mgr.call("key", "chat", lambda timeout: "ok") == "ok"  # the probe succeeds
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_a_single_probe_through(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_BREAKER_OPEN_SECONDS", 0.0)
+    breaker = upstream._CircuitBreaker("k")
+    breaker._open()
+    breaker.check()  # the probe
+    with pytest.raises(UpstreamUnavailable):
+        breaker.check()
+    breaker.record(None)  # the probe never reached upstream: the next call may probe
+    breaker.check()
@@ -0,0 +1,128 @@
+"""
+TinyLFU-style admission filter for new cache entries.
+
+Every miss used to go into the tenant's FAISS index, including one-off
+prompts that are never asked again; on high-cardinality tenants those make
+up most of the index and slow every search. FrequencySketch estimates how
+often a prompt, or a semantic neighbourhood of it, has been seen, and an
+entry is indexed only once that estimate reaches ADMISSION_MIN_FREQUENCY
+(ADMISSION_BUCKET_MIN_FREQUENCY for the neighbourhood):
+
+  - counts live in a count-min sketch (ADMISSION_SKETCH_DEPTH rows of
+    ADMISSION_SKETCH_WIDTH saturating 8-bit counters), a few hundred KB at
+    most per tenant however many distinct prompts it sees;
+  - after ADMISSION_SAMPLE_FACTOR x width increments every counter is halved
+    (TinyLFU's reset), so old popularity decays;
+  - two keys are counted per miss: the normalised prompt and an embedding
+    bucket (the sign pattern of ADMISSION_LSH_BITS random projections), so
+    paraphrases of a popular question are admitted on their first miss.
+
+Entries that are not admitted are kept exact-only (answerable by identical
+prompts, not searched) or dropped, per tenant policy; an exact-only entry
+that turns out to be reused is indexed later.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("semantis.tinylfu")
+
+ADMISSION_MIN_FREQUENCY = int(os.getenv("ADMISSION_MIN_FREQUENCY", "2"))
+ADMISSION_SKETCH_WIDTH = int(os.getenv("ADMISSION_SKETCH_WIDTH", "16384"))
+ADMISSION_SKETCH_DEPTH = 4
+ADMISSION_SAMPLE_FACTOR = 10
+ADMISSION_LSH_BITS = int(os.getenv("ADMISSION_LSH_BITS", "16"))
+# Buckets are shared by unrelated prompts too, so they need more evidence
+ADMISSION_BUCKET_MIN_FREQUENCY = int(os.getenv("ADMISSION_BUCKET_MIN_FREQUENCY", "4"))
+
+_planes: Dict[int, np.ndarray] = {}  # embedding dim -> (bits, dim) random hyperplanes
+_planes_lock = threading.Lock()
+
+
+def _hyperplanes(dim: int) -> np.ndarray:
+    planes = _planes.get(dim)
+    if planes is None:
+        with _planes_lock:
+            planes = _planes.get(dim)
+            if planes is None:
+                # Fixed seed: buckets must agree across workers and restarts
+                planes = np.random.default_rng(20240917).standard_normal((ADMISSION_LSH_BITS, dim)).astype("float32")
+                _planes[dim] = planes
+    return planes
+
+
+def embedding_bucket(embedding: np.ndarray) -> int:
+    """Sign pattern of the embedding against fixed random hyperplanes."""
+    v = np.asarray(embedding, dtype="float32").reshape(-1)
+    bits = (_hyperplanes(v.shape[0]) @ v) > 0
+    return int(bits.astype(np.int64) @ (1 << np.arange(len(bits), dtype=np.int64)))
+
+
+class FrequencySketch:
+    """Count-min sketch with periodic halving."""
+
+    def __init__(self, width: int = ADMISSION_SKETCH_WIDTH, depth: int = ADMISSION_SKETCH_DEPTH):
+        self.width = max(64, width)
+        self.depth = depth
+        self._table = np.zeros((depth, self.width), dtype=np.uint8)
+        self._rows = np.arange(depth)
+        self._additions = 0
+        self._sample_size = ADMISSION_SAMPLE_FACTOR * self.width
+        self._lock = threading.Lock()
+
+    def _cells(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype="<u4") % self.width
+
+    def add(self, key: str) -> int:
+        """Count one occurrence of key and return its new estimate."""
+        cells = self._cells(key)
+        with self._lock:
+            counts = self._table[self._rows, cells]
+            # Conservative update: only the minimal counters grow
+            est = int(counts.min())
+            if est < 255:
+                grow = counts == est
+                self._table[self._rows[grow], cells[grow]] += 1
+                est += 1
+            self._additions += 1
+            if self._additions >= self._sample_size:
+                self._table >>= 1
+                self._additions //= 2
+        return est
+
+    def estimate(self, key: str) -> int:
+        cells = self._cells(key)
+        with self._lock:
+            return int(self._table[self._rows, cells].min())
+
+    @property
+    def nbytes(self) -> int:
+        return self._table.nbytes
+
+    def to_state(self) -> Dict:
+        """Picklable counters, saved with the tenant's snapshot so popularity survives restarts."""
+        with self._lock:
+            return {"table": self._table.copy(), "additions": self._additions}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "FrequencySketch":
+        table = state["table"]
+        sketch = cls(width=table.shape[1], depth=table.shape[0])
+        sketch._table[:] = table
+        sketch._additions = state["additions"]
+        return sketch
+
+
+def record(sketch: FrequencySketch, model: str, prompt_norm: str, embedding: Optional[np.ndarray]) -> bool:
+    """Count one miss of prompt_norm; True if it is now frequent enough to be indexed."""
+    frequent = sketch.add(f"p:{model}:{prompt_norm}") >= ADMISSION_MIN_FREQUENCY
+    if embedding is not None:
+        bucket_freq = sketch.add(f"b:{model}:{embedding_bucket(embedding)}")
+        frequent = frequent or bucket_freq >= ADMISSION_BUCKET_MIN_FREQUENCY
+    return frequent
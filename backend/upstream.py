@@ -0,0 +1,458 @@
+"""
+Upstream call manager for OpenAI embedding and chat requests.
+
+Every get_embedding / call_llm request goes through one UpstreamManager,
+which keeps per API key (the server key or a tenant's BYOK key):
+
+  - a bulkhead: at most UPSTREAM_MAX_CONCURRENCY requests in flight. Further
+    callers queue for up to UPSTREAM_QUEUE_TIMEOUT_SECONDS and then fail fast
+    with UpstreamBusy instead of piling onto a saturated key;
+  - a 429-aware token bucket of UPSTREAM_RPS requests/second. Each 429 halves
+    the rate and pauses the key for its Retry-After; successes recover the rate
+    additively;
+  - a retry budget: retries are capped at about one per ten calls, so an
+    upstream incident does not turn into a retry storm;
+  - a circuit breaker: when at least UPSTREAM_BREAKER_FAILURE_RATE of the
+    recent calls failed (timeouts, 5xx, connection errors) or were slow, it
+    opens and calls fail immediately with UpstreamUnavailable for
+    UPSTREAM_BREAKER_OPEN_SECONDS. Then a single probe call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+
+Per operation ("embedding" / "chat") a window of recent latencies drives:
+
+  - adaptive timeouts: UPSTREAM_TIMEOUT_MULTIPLIER x p99, clamped between the
+    operation's floor and UPSTREAM_TIMEOUT_MAX_SECONDS;
+  - hedging (embeddings only: idempotent and cheap): if the first attempt has
+    not answered after the UPSTREAM_HEDGE_PERCENTILE latency, a duplicate is
+    sent and whichever answers first wins.
+
+The OpenAI clients are created with max_retries=0; retries happen here.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+logger = logging.getLogger("semantis.upstream")
+
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+UPSTREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "10"))
+UPSTREAM_RPS = float(os.getenv("UPSTREAM_RPS", "50"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+UPSTREAM_TIMEOUT_MAX_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_MAX_SECONDS", "30"))
+UPSTREAM_TIMEOUT_MULTIPLIER = float(os.getenv("UPSTREAM_TIMEOUT_MULTIPLIER", "3"))
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "0.95"))
+UPSTREAM_HEDGE_WORKERS = int(os.getenv("UPSTREAM_HEDGE_WORKERS", "64"))
+UPSTREAM_BREAKER_FAILURE_RATE = float(os.getenv("UPSTREAM_BREAKER_FAILURE_RATE", "0.5"))
+UPSTREAM_BREAKER_OPEN_SECONDS = float(os.getenv("UPSTREAM_BREAKER_OPEN_SECONDS", "30"))
+
+# Adaptive timeouts never go below these (seconds)
+_TIMEOUT_FLOOR = {"embedding": 2.0, "chat": 10.0}
+# Latency samples kept per operation, and needed before percentiles are trusted
+_WINDOW_SIZE = 512
+_MIN_SAMPLES = 20
+_MIN_HEDGE_DELAY = 0.05
+# Retry budget: each call earns 0.1 retries, up to a burst of 10
+_RETRY_EARN = 0.1
+_RETRY_BURST = 10.0
+# The token bucket never slows below this after repeated 429s
+_MIN_RPS = 0.5
+# Circuit breaker: outcomes considered, and calls needed before it can open
+_BREAKER_WINDOW = 100
+_BREAKER_WINDOW_SECONDS = 60.0
+_BREAKER_MIN_CALLS = 10
+# Calls slower than this count as failures for the breaker (seconds)
+_SLOW_CALL_SECONDS = {"embedding": 5.0, "chat": 20.0}
+
+T = TypeVar("T")
+
+
+class UpstreamBusy(RuntimeError):
+    """The API key's bulkhead stayed full for the whole queue timeout."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamUnavailable(UpstreamBusy):
+    """The API key's circuit breaker is open: the provider is failing or too slow."""
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    return getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def _retry_after(exc: Exception) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", 1.0)))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _is_timeout(exc: Exception) -> bool:
+    import openai
+    return isinstance(exc, (openai.APITimeoutError, TimeoutError))
+
+
+def _is_transient(exc: Exception) -> bool:
+    import openai
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(exc, (openai.APIConnectionError, TimeoutError))
+
+
+class _LatencyWindow:
+    """Recent latencies (seconds) of one operation."""
+
+    def __init__(self):
+        self._samples: deque = deque(maxlen=_WINDOW_SIZE)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < _MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _CircuitBreaker:
+    """closed -> open (on failure/slow rate) -> half-open (one probe) -> closed or open again."""
+
+    def __init__(self, key_id: str):
+        self.key_id = key_id
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.outcomes: deque = deque(maxlen=_BREAKER_WINDOW)  # (monotonic time, failed)
+        self.opens = 0
+        self.rejected = 0
+
+    def check(self) -> None:
+        """Raise UpstreamUnavailable unless a call may go upstream now."""
+        with self.lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= UPSTREAM_BREAKER_OPEN_SECONDS:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return
+            self.rejected += 1
+            retry_after = max(1.0, self.opened_at + UPSTREAM_BREAKER_OPEN_SECONDS - now)
+        raise UpstreamUnavailable(f"Upstream circuit open for key {self.key_id}", retry_after=retry_after)
+
+    def record(self, failed: Optional[bool]) -> None:
+        """Outcome of a call; None when it says nothing about upstream health (e.g. a 400 or a 429)."""
+        with self.lock:
+            if self.state == "half_open" and self.probing:
+                self.probing = False
+                if failed:
+                    self._open()
+                elif failed is False:
+                    self._close()
+                return
+            if failed is None or self.state != "closed":
+                return
+            now = time.monotonic()
+            self.outcomes.append((now, failed))
+            while now - self.outcomes[0][0] > _BREAKER_WINDOW_SECONDS:
+                self.outcomes.popleft()
+            n = len(self.outcomes)
+            if n >= _BREAKER_MIN_CALLS and sum(f for _, f in self.outcomes) / n >= UPSTREAM_BREAKER_FAILURE_RATE:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self.opens += 1
+        logger.warning(f"Upstream circuit opened | key={self.key_id} | for={UPSTREAM_BREAKER_OPEN_SECONDS}s")
+
+    def _close(self) -> None:
+        self.state = "closed"
+        self.outcomes.clear()
+        logger.info(f"Upstream circuit closed | key={self.key_id}")
+
+
+class _KeyState:
+    """Bulkhead, token bucket, retry budget and counters of one API key."""
+
+    def __init__(self, key_id: str):
+        self.key_id = key_id
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rate = UPSTREAM_RPS
+        self.tokens = UPSTREAM_RPS
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.retry_tokens = _RETRY_BURST
+        self.breaker = _CircuitBreaker(key_id)
+        self.stats = {
+            "calls": 0, "queued": 0, "queue_timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+            "rate_limited": 0, "timeouts": 0, "errors": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+        }
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.rate, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def _ready(self, now: float) -> bool:
+        self._refill(now)
+        return self.in_flight < UPSTREAM_MAX_CONCURRENCY and self.tokens >= 1 and now >= self.paused_until
+
+    def admit(self, block: bool = True) -> bool:
+        """Take a bulkhead slot and a rate token, queueing up to the queue timeout."""
+        start = time.monotonic()
+        deadline = start + UPSTREAM_QUEUE_TIMEOUT_SECONDS
+        with self.cond:
+            if not self._ready(start):
+                if not block:
+                    return False
+                self.stats["queued"] += 1
+                self.waiting += 1
+                try:
+                    while True:
+                        now = time.monotonic()
+                        if self._ready(now):
+                            break
+                        if now >= deadline:
+                            self.stats["queue_timeouts"] += 1
+                            raise UpstreamBusy(
+                                f"Upstream busy for key {self.key_id}: {self.in_flight} in flight, "
+                                f"{self.waiting} waiting",
+                                retry_after=max(1.0, self.paused_until - now),
+                            )
+                        timeout = deadline - now
+                        if self.in_flight < UPSTREAM_MAX_CONCURRENCY:
+                            # Waiting for a rate token or the end of a 429 pause, not a slot
+                            timeout = min(timeout, max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.001))
+                        self.cond.wait(timeout)
+                finally:
+                    self.waiting -= 1
+                waited_ms = (time.monotonic() - start) * 1000
+                self.stats["wait_ms_total"] += waited_ms
+                self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], waited_ms)
+            self.in_flight += 1
+            self.tokens -= 1
+            self.stats["calls"] += 1
+            self.retry_tokens = min(_RETRY_BURST, self.retry_tokens + _RETRY_EARN)
+            return True
+
+    def release(self) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+
+    def on_success(self) -> None:
+        with self.cond:
+            if self.rate < UPSTREAM_RPS:
+                self.rate = min(UPSTREAM_RPS, self.rate + UPSTREAM_RPS * 0.05)
+
+    def on_rate_limited(self, retry_after: float) -> None:
+        with self.cond:
+            self.stats["rate_limited"] += 1
+            self.rate = max(_MIN_RPS, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        logger.warning(f"Upstream 429 | key={self.key_id} | rate={self.rate:.1f}/s | pause={retry_after:.1f}s")
+
+    def take_retry(self) -> bool:
+        with self.cond:
+            if self.retry_tokens < 1:
+                return False
+            self.retry_tokens -= 1
+            self.stats["retries"] += 1
+            return True
+
+    def snapshot(self) -> dict:
+        with self.cond:
+            s = dict(self.stats)
+            wait_ms_total = s.pop("wait_ms_total")
+            s["wait_ms_avg"] = round(wait_ms_total / s["queued"], 3) if s["queued"] else 0.0
+            s["wait_ms_max"] = round(s["wait_ms_max"], 3)
+            s.update(in_flight=self.in_flight, waiting=self.waiting, rate_per_s=round(self.rate, 2))
+        with self.breaker.lock:
+            s.update(circuit=self.breaker.state, circuit_opens=self.breaker.opens,
+                     circuit_rejected=self.breaker.rejected)
+        return s
+
+
+class UpstreamManager:
+    def __init__(self):
+        self._keys: Dict[str, _KeyState] = {}
+        self._keys_lock = threading.Lock()
+        self._latency = {op: _LatencyWindow() for op in _TIMEOUT_FLOOR}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_slots = threading.BoundedSemaphore(UPSTREAM_HEDGE_WORKERS)
+
+    def _state(self, api_key: str) -> _KeyState:
+        key_id = hashlib.sha256(api_key.encode()).hexdigest()[:12]
+        st = self._keys.get(key_id)
+        if st is None:
+            with self._keys_lock:
+                st = self._keys.setdefault(key_id, _KeyState(key_id))
+        return st
+
+    def timeout(self, op: str) -> float:
+        """Per-attempt timeout: a multiple of the observed p99, within [floor, max]."""
+        p99 = self._latency[op].percentile(0.99)
+        if p99 is None:
+            return UPSTREAM_TIMEOUT_MAX_SECONDS
+        return min(UPSTREAM_TIMEOUT_MAX_SECONDS, max(_TIMEOUT_FLOOR[op], UPSTREAM_TIMEOUT_MULTIPLIER * p99))
+
+    def call(self, api_key: str, op: str, fn: Callable[[float], T], hedge: bool = False) -> T:
+        """Run fn(timeout_seconds) against the key's limits, retrying transient failures."""
+        st = self._state(api_key)
+        attempt = 0
+        while True:
+            st.breaker.check()
+            try:
+                if hedge:
+                    return self._hedged(st, op, fn)
+                return self._attempt(st, op, fn)
+            except UpstreamBusy:
+                st.breaker.record(None)  # never reached upstream; frees a half-open probe
+                raise
+            except Exception as e:
+                if not _is_transient(e) or attempt >= UPSTREAM_MAX_RETRIES or not st.take_retry():
+                    raise
+                attempt += 1
+                if _status_code(e) != 429:  # 429s already wait in the token bucket
+                    time.sleep(min(0.25 * 2 ** attempt, 2.0))
+
+    def stream(self, api_key: str, op: str, fn: Callable[[float], Iterator[T]]) -> Iterator[T]:
+        """Like call() for streamed responses: the slot is held until the stream ends; no retries."""
+        st = self._state(api_key)
+        st.breaker.check()
+        try:
+            st.admit()
+        except UpstreamBusy:
+            st.breaker.record(None)
+            raise
+        try:
+            yield from fn(self.timeout(op))
+            st.on_success()
+            st.breaker.record(False)
+        except GeneratorExit:
+            st.breaker.record(None)  # the client went away; says nothing about upstream
+            raise
+        except Exception as e:
+            self._on_error(st, op, e)
+            raise
+        finally:
+            st.release()
+
+    def _attempt(self, st: _KeyState, op: str, fn: Callable[[float], T], admitted: bool = False) -> T:
+        if not admitted:
+            st.admit()
+        timeout = self.timeout(op)
+        t0 = time.monotonic()
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            self._on_error(st, op, e, timeout)
+            raise
+        finally:
+            st.release()
+        elapsed = time.monotonic() - t0
+        self._latency[op].add(elapsed)
+        st.on_success()
+        st.breaker.record(elapsed > _SLOW_CALL_SECONDS[op])
+        return result
+
+    def _on_error(self, st: _KeyState, op: str, exc: Exception, timeout: Optional[float] = None) -> None:
+        if _status_code(exc) == 429:
+            st.on_rate_limited(_retry_after(exc))
+            st.breaker.record(None)
+            return
+        st.breaker.record(True if _is_transient(exc) else None)
+        with st.cond:
+            st.stats["errors"] += 1
+            if _is_timeout(exc):
+                st.stats["timeouts"] += 1
+        if timeout is not None and _is_timeout(exc):
+            # Count the timeout as a sample so a slower upstream raises the next timeout
+            self._latency[op].add(timeout)
+
+    def _hedged(self, st: _KeyState, op: str, fn: Callable[[float], T]) -> T:
+        delay = self._latency[op].percentile(UPSTREAM_HEDGE_PERCENTILE)
+        if delay is None or not self._pool_slots.acquire(blocking=False):
+            return self._attempt(st, op, fn)
+
+        first = self._submit(st, op, fn, admitted=False)
+        try:
+            return first.result(timeout=max(delay, _MIN_HEDGE_DELAY))
+        except FutureTimeout:
+            pass
+
+        pending = {first}
+        if self._pool_slots.acquire(blocking=False):
+            if st.admit(block=False):
+                with st.cond:
+                    st.stats["hedges"] += 1
+                pending.add(self._submit(st, op, fn, admitted=True))
+            else:
+                self._pool_slots.release()
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is not first:
+                        with st.cond:
+                            st.stats["hedge_wins"] += 1
+                    return f.result()
+                if error is None or f is first:
+                    error = f.exception()
+        raise error
+
+    def _submit(self, st: _KeyState, op: str, fn: Callable[[float], T], admitted: bool):
+        """Run one attempt on the hedging pool; the caller holds a pool slot for it."""
+        if self._pool is None:
+            with self._keys_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=UPSTREAM_HEDGE_WORKERS, thread_name_prefix="upstream")
+
+        def _run():
+            try:
+                return self._attempt(st, op, fn, admitted=admitted)
+            finally:
+                self._pool_slots.release()
+
+        return self._pool.submit(_run)
+
+    def stats(self) -> dict:
+        """Per-key queueing/limit counters and per-operation latency (for /health and Prometheus)."""
+        latency = {}
+        for op, window in self._latency.items():
+            latency[op] = {
+                f"p{int(q * 100)}_ms": round(v * 1000, 2) if v is not None else None
+                for q, v in ((q, window.percentile(q)) for q in (0.5, 0.95, 0.99))
+            }
+            latency[op]["timeout_s"] = round(self.timeout(op), 2)
+        return {
+            "max_concurrency": UPSTREAM_MAX_CONCURRENCY,
+            "keys": {key_id: st.snapshot() for key_id, st in list(self._keys.items())},
+            "latency": latency,
+        }
+
+
+upstream = UpstreamManager()
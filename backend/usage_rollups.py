@@ -0,0 +1,232 @@
+"""
+Usage Rollups Module
+Hourly and daily aggregates of usage_logs for billing and admin analytics.
+
+A background job folds closed hours of usage_logs into usage_rollup_hourly
+and re-derives the touched days of usage_rollup_daily, then advances the
+watermark in usage_rollup_state. Analytics queries read usage through
+usage_source_sql(), which covers a window with whole days from the daily
+table, the edge hours from the hourly table and only the not-yet-rolled-up
+tail (plus the partial hour at the window start) from raw usage_logs.
+
+Rollup writes replace whole buckets, so re-running the job (or several
+workers racing on it) is harmless; an advisory lock keeps runs serial.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger("semantis.usage_rollups")
+
+USAGE_ROLLUPS_ENABLED = os.getenv("USAGE_ROLLUPS", "true").lower() == "true"
+USAGE_ROLLUP_INTERVAL_SECONDS = float(os.getenv("USAGE_ROLLUP_INTERVAL_SECONDS", "300"))
+# Rows are rolled up once their hour ended this long ago (late commits)
+USAGE_ROLLUP_GRACE_SECONDS = int(os.getenv("USAGE_ROLLUP_GRACE_SECONDS", "300"))
+
+# Hours folded per transaction when catching up on a long backlog
+_MAX_HOURS_PER_RUN = 24 * 7
+_ADVISORY_LOCK_KEY = 0x5E3A_0035
+_WATERMARK_TTL_SECONDS = 60
+
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+_watermark: Optional[datetime] = None
+_watermark_read_at = 0.0
+_stats = {"runs": 0, "hours_rolled": 0, "failed_runs": 0}
+
+_ROLLUP_HOURS_SQL = """
+INSERT INTO usage_rollup_hourly
+  (bucket_start, api_key, tenant_id, endpoint, org_id, user_id,
+   request_count, cache_hits, cache_misses, tokens_used, cost_estimate)
+SELECT date_trunc('hour', logged_at, 'UTC'), api_key, tenant_id, COALESCE(endpoint, ''),
+       (array_agg(org_id) FILTER (WHERE org_id IS NOT NULL))[1],
+       (array_agg(user_id) FILTER (WHERE user_id IS NOT NULL))[1],
+       SUM(request_count), SUM(cache_hits), SUM(cache_misses),
+       SUM(tokens_used), SUM(cost_estimate)
+FROM usage_logs
+WHERE logged_at >= %(lo)s AND logged_at < %(hi)s
+GROUP BY 1, api_key, tenant_id, COALESCE(endpoint, '')
+ON CONFLICT (bucket_start, api_key, tenant_id, endpoint) DO UPDATE SET
+  org_id = EXCLUDED.org_id,
+  user_id = EXCLUDED.user_id,
+  request_count = EXCLUDED.request_count,
+  cache_hits = EXCLUDED.cache_hits,
+  cache_misses = EXCLUDED.cache_misses,
+  tokens_used = EXCLUDED.tokens_used,
+  cost_estimate = EXCLUDED.cost_estimate
+"""
+
+_ROLLUP_DAYS_SQL = """
+INSERT INTO usage_rollup_daily
+  (bucket_start, api_key, tenant_id, endpoint, org_id, user_id,
+   request_count, cache_hits, cache_misses, tokens_used, cost_estimate)
+SELECT date_trunc('day', bucket_start, 'UTC'), api_key, tenant_id, endpoint,
+       (array_agg(org_id) FILTER (WHERE org_id IS NOT NULL))[1],
+       (array_agg(user_id) FILTER (WHERE user_id IS NOT NULL))[1],
+       SUM(request_count), SUM(cache_hits), SUM(cache_misses),
+       SUM(tokens_used), SUM(cost_estimate)
+FROM usage_rollup_hourly
+WHERE bucket_start >= %(lo)s AND bucket_start < %(hi)s
+GROUP BY 1, api_key, tenant_id, endpoint
+ON CONFLICT (bucket_start, api_key, tenant_id, endpoint) DO UPDATE SET
+  org_id = EXCLUDED.org_id,
+  user_id = EXCLUDED.user_id,
+  request_count = EXCLUDED.request_count,
+  cache_hits = EXCLUDED.cache_hits,
+  cache_misses = EXCLUDED.cache_misses,
+  tokens_used = EXCLUDED.tokens_used,
+  cost_estimate = EXCLUDED.cost_estimate
+"""
+
+
+def _floor_hour(t: datetime) -> datetime:
+    return t.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(t: datetime) -> datetime:
+    return t.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(t: datetime, floor, step: timedelta) -> datetime:
+    f = floor(t)
+    return f if f == t else f + step
+
+
+# ── Rollup job ──
+
+def refresh() -> int:
+    """Fold closed hours into the rollup tables. Returns the number of hours rolled up."""
+    global _watermark, _watermark_read_at
+    from database import get_db_connection
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (_ADVISORY_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return 0
+        cur.execute("SELECT rolled_until FROM usage_rollup_state WHERE id = 1 FOR UPDATE")
+        row = cur.fetchone()
+        lo = row[0] if row else None
+        if lo is None:
+            cur.execute("SELECT date_trunc('hour', MIN(logged_at), 'UTC') FROM usage_logs")
+            lo = cur.fetchone()[0]
+            if lo is None:
+                return 0
+        lo = lo.astimezone(timezone.utc)
+        target = _floor_hour(datetime.now(timezone.utc) - timedelta(seconds=USAGE_ROLLUP_GRACE_SECONDS))
+        hi = min(target, lo + timedelta(hours=_MAX_HOURS_PER_RUN))
+        if hi <= lo:
+            return 0
+        cur.execute(_ROLLUP_HOURS_SQL, {"lo": lo, "hi": hi})
+        cur.execute(_ROLLUP_DAYS_SQL, {"lo": _floor_day(lo), "hi": _ceil(hi, _floor_day, timedelta(days=1))})
+        cur.execute(
+            """INSERT INTO usage_rollup_state (id, rolled_until, updated_at) VALUES (1, %s, NOW())
+               ON CONFLICT (id) DO UPDATE SET rolled_until = EXCLUDED.rolled_until, updated_at = NOW()""",
+            (hi,),
+        )
+    _watermark, _watermark_read_at = hi, time.time()
+    return int((hi - lo) / timedelta(hours=1))
+
+
+def _loop() -> None:
+    while True:
+        try:
+            while True:
+                hours = refresh()
+                _stats["runs"] += 1
+                _stats["hours_rolled"] += hours
+                if hours:
+                    logger.info("Usage rollup | hours=%d | until=%s", hours, _watermark)
+                if hours < _MAX_HOURS_PER_RUN:
+                    break
+        except Exception as e:
+            _stats["failed_runs"] += 1
+            logger.warning("Usage rollup failed: %s", e)
+        time.sleep(USAGE_ROLLUP_INTERVAL_SECONDS)
+
+
+def start() -> None:
+    """Start the background rollup job (no-op without DATABASE_URL or with USAGE_ROLLUPS=false)."""
+    global _thread
+    if not USAGE_ROLLUPS_ENABLED or not os.getenv("DATABASE_URL"):
+        return
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_loop, name="usage-rollups", daemon=True)
+            _thread.start()
+
+
+# ── Reads ──
+
+def _get_watermark(cur) -> Optional[datetime]:
+    # Only moves forward, so a slightly stale copy just means a longer raw tail
+    global _watermark, _watermark_read_at
+    if _watermark is None or time.time() - _watermark_read_at > _WATERMARK_TTL_SECONDS:
+        try:
+            cur.execute("SELECT rolled_until FROM usage_rollup_state WHERE id = 1")
+            row = cur.fetchone()
+            value = (row["rolled_until"] if isinstance(row, dict) else row[0]) if row else None
+            _watermark = value.astimezone(timezone.utc) if value else None
+        except Exception as e:
+            logger.debug("Rollup watermark unavailable: %s", e)
+            cur.connection.rollback()
+            _watermark = None
+        _watermark_read_at = time.time()
+    return _watermark
+
+
+def window_params(cur, start: datetime) -> Dict[str, datetime]:
+    """
+    Bucket boundaries for usage_source_sql() covering [start, now):
+    raw [start, hour_lo), hourly [hour_lo, day_lo), daily [day_lo, day_hi),
+    hourly [day_hi, rolled), raw [rolled, now).
+    """
+    watermark = _get_watermark(cur)
+    hour_lo = _ceil(start, _floor_hour, timedelta(hours=1))
+    if watermark is None or hour_lo >= watermark:
+        # Nothing rolled up inside the window yet: read it all from usage_logs
+        hour_lo = rolled = start
+    else:
+        rolled = watermark
+    day_lo = _ceil(hour_lo, _floor_day, timedelta(days=1))
+    day_hi = _floor_day(rolled)
+    if day_lo >= day_hi:
+        day_lo = day_hi = hour_lo
+    return {"start": start, "hour_lo": hour_lo, "day_lo": day_lo, "day_hi": day_hi, "rolled": rolled}
+
+
+def days_ago(days: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def usage_source_sql(window: Dict[str, datetime], where: str = "TRUE") -> str:
+    """
+    A FROM-able subquery of usage rows (bucket_start, api_key, tenant_id,
+    org_id, endpoint, request_count, cache_hits, cache_misses, tokens_used,
+    cost_estimate) covering `window` (from window_params(), passed as the
+    query parameters). `where` is applied to every source and may use other
+    %(name)s parameters.
+    """
+    cols = "api_key, tenant_id, org_id, endpoint, request_count, cache_hits, cache_misses, tokens_used, cost_estimate"
+    if window["rolled"] == window["start"]:
+        return f"""(
+        SELECT logged_at AS bucket_start, {cols} FROM usage_logs
+        WHERE logged_at >= %(start)s AND ({where})
+    )"""
+    return f"""(
+        SELECT bucket_start, {cols} FROM usage_rollup_daily
+        WHERE bucket_start >= %(day_lo)s AND bucket_start < %(day_hi)s AND ({where})
+        UNION ALL
+        SELECT bucket_start, {cols} FROM usage_rollup_hourly
+        WHERE ((bucket_start >= %(hour_lo)s AND bucket_start < %(day_lo)s)
+            OR (bucket_start >= %(day_hi)s AND bucket_start < %(rolled)s)) AND ({where})
+        UNION ALL
+        SELECT logged_at, {cols} FROM usage_logs
+        WHERE ((logged_at >= %(start)s AND logged_at < %(hour_lo)s) OR logged_at >= %(rolled)s) AND ({where})
+    )"""
+
+
+def stats() -> Dict:
+    return {"rolled_until": str(_watermark) if _watermark else None, **_stats}
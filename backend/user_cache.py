@@ -0,0 +1,97 @@
+"""
+User Cache Module
+Short-TTL, process-local cache of user profiles and org memberships for the
+Supabase-authenticated dashboard endpoints.
+
+Dashboard pages poll endpoints that each resolve the caller's profile and
+usually their orgs; caching both for a few seconds turns those polls into
+dictionary lookups. Endpoints that change a profile, a membership or an
+org's plan/settings invalidate the affected entries. Other workers see such
+changes once USER_CACHE_TTL_SECONDS has elapsed.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("semantis.user_cache")
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+_lock = threading.Lock()
+_profiles: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+_orgs: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _get(cache: OrderedDict, key: str):
+    with _lock:
+        hit = cache.get(key)
+        if hit is not None:
+            expires_at, value = hit
+            if expires_at > time.time():
+                cache.move_to_end(key)
+                _stats["hits"] += 1
+                return value
+            del cache[key]
+        _stats["misses"] += 1
+        return None
+
+
+def _put(cache: OrderedDict, key: str, value) -> None:
+    if USER_CACHE_TTL_SECONDS <= 0:
+        return
+    with _lock:
+        cache[key] = (time.time() + USER_CACHE_TTL_SECONDS, value)
+        cache.move_to_end(key)
+        while len(cache) > USER_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def get_user(user_id: str) -> Optional[Dict]:
+    """database.get_user_by_id, cached. Returns a copy the caller may modify."""
+    user = _get(_profiles, user_id)
+    if user is None:
+        from database import get_user_by_id
+        user = get_user_by_id(user_id)
+        if user is None:
+            return None
+        _put(_profiles, user_id, user)
+    return dict(user)
+
+
+def get_user_orgs(user_id: str) -> List[Dict]:
+    """database.get_user_orgs, cached. Returns copies the caller may modify."""
+    orgs = _get(_orgs, user_id)
+    if orgs is None:
+        from database import get_user_orgs as db_get_user_orgs
+        orgs = db_get_user_orgs(user_id)
+        _put(_orgs, user_id, orgs)
+    return [dict(o) for o in orgs]
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a user's cached profile and org list (after changing either)."""
+    with _lock:
+        _profiles.pop(user_id, None)
+        _orgs.pop(user_id, None)
+        _stats["invalidations"] += 1
+
+
+def invalidate_org(org_id: str) -> None:
+    """Drop the cached org list of every member of an org (plan/settings changed)."""
+    org_id = str(org_id)
+    with _lock:
+        stale = [uid for uid, (_, orgs) in _orgs.items()
+                 if any(str(o["id"]) == org_id for o in orgs)]
+        for uid in stale:
+            del _orgs[uid]
+        _stats["invalidations"] += 1
+
+
+def stats() -> Dict:
+    with _lock:
+        return {"profiles": len(_profiles), "org_lists": len(_orgs), **_stats}
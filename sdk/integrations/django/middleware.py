@@ -80,12 +80,13 @@ class SemanticCacheMiddleware(MiddlewareMixin):
             if not prompt:
                 return None
             
-            # Check cache
+            # Check cache (lookup only: on a miss the view makes the one LLM call)
             try:
-                response = self.cache.query(prompt, model=body.get('model', 'gpt-4o-mini'))
+                model = body.get('model', 'gpt-4o-mini')
+                response = self.cache.lookup(prompt, model=model)
                 
                 # If cache hit, return cached response
-                if response.cache_hit in ['exact', 'semantic']:
+                if response.answer is not None and response.cache_hit in ['exact', 'semantic']:
                     # Format as OpenAI response
                     import time
                     cached_response = {
@@ -114,6 +115,9 @@ class SemanticCacheMiddleware(MiddlewareMixin):
                     }
                     
                     return JsonResponse(cached_response)
+                
+                # Miss: remember what to write back once the view has answered
+                request._semantis_lookup = (prompt, model, response.lookup_token)
             
             except Exception as e:
                 # If cache fails, continue to original view
@@ -125,4 +129,21 @@ class SemanticCacheMiddleware(MiddlewareMixin):
         
         # If no cache hit, continue to original view
         return None
-
+    
+    def process_response(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        """Write the view's answer back to the cache after a lookup miss."""
+        pending = getattr(request, '_semantis_lookup', None)
+        if pending is None or response.status_code != 200 or getattr(response, 'streaming', False):
+            return response
+        
+        try:
+            prompt, model, lookup_token = pending
+            data = json.loads(response.content)
+            answer = data['choices'][0]['message']['content']
+            if answer:
+                self.cache.store(prompt, answer, model=model, lookup_token=lookup_token)
+        except Exception:
+            # Never fail the response because the write-back did
+            pass
+        
+        return response
@@ -74,6 +74,7 @@ class SemanticCacheMiddleware(BaseHTTPMiddleware):
         if request.method != "POST":
             return await call_next(request)
         
+        pending = None
         try:
             # Get request body
             body = await request.json()
@@ -92,12 +93,13 @@ class SemanticCacheMiddleware(BaseHTTPMiddleware):
             if not prompt:
                 return await call_next(request)
             
-            # Check cache
+            # Check cache (lookup only: on a miss the endpoint makes the one LLM call)
             try:
-                response = self.cache.query(prompt, model=body.get("model", "gpt-4o-mini"))
+                model = body.get("model", "gpt-4o-mini")
+                response = await self.cache.alookup(prompt, model=model)
                 
                 # If cache hit, return cached response
-                if response.cache_hit in ["exact", "semantic"]:
+                if response.answer is not None and response.cache_hit in ["exact", "semantic"]:
                     # Format as OpenAI response
                     cached_response = {
                         "id": f"chatcmpl-cached-{hash(prompt)}",
@@ -125,6 +127,9 @@ class SemanticCacheMiddleware(BaseHTTPMiddleware):
                     }
                     
                     return JSONResponse(content=cached_response)
+                
+                # Miss: let the endpoint answer, then write its answer back
+                pending = (prompt, model, response.lookup_token)
             
             except Exception as e:
                 # If cache fails, continue to original endpoint
@@ -135,7 +140,38 @@ class SemanticCacheMiddleware(BaseHTTPMiddleware):
             pass
         
         # If no cache hit, continue to original endpoint
+        if pending is not None:
+            return await self._call_and_store(request, call_next, *pending)
         return await call_next(request)
+    
+    async def _call_and_store(
+        self,
+        request: Request,
+        call_next: Callable,
+        prompt: str,
+        model: str,
+        lookup_token: Optional[str],
+    ) -> Response:
+        """Run the endpoint and store its answer under the lookup's token."""
+        response = await call_next(request)
+        if response.status_code != 200 or "application/json" not in response.headers.get("content-type", ""):
+            return response
+        
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        try:
+            answer = json.loads(body)["choices"][0]["message"]["content"]
+            if answer:
+                await self.cache.astore(prompt, answer, model=model, lookup_token=lookup_token)
+        except Exception:
+            # Never fail the response because the write-back did
+            pass
+        
+        return Response(
+            content=body,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            media_type=response.media_type,
+        )
 
 
 def add_semantic_cache_middleware(
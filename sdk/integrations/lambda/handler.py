@@ -13,6 +13,8 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     AWS Lambda handler for semantic caching.
     
     This handler can be used as a proxy for OpenAI API calls in Lambda functions.
+    The Semantis client outlives the invocation, so warm invocations skip
+    the TCP/TLS handshake.
     
     Example:
         >>> # In Lambda function
@@ -23,7 +25,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         ...     return lambda_handler(event, context)
     """
     try:
-        from semantis_cache import SemanticCache
+        from semantis_cache import get_shared_client
         
         # Get API key from environment
         api_key = os.getenv('SEMANTIS_API_KEY')
@@ -33,8 +35,8 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'SEMANTIS_API_KEY not set'})
             }
         
-        # Initialize cache client
-        cache = SemanticCache(api_key=api_key)
+        # Module-level client: warm containers reuse its open connection
+        cache = get_shared_client(api_key=api_key)
         
         # Parse request
         body = json.loads(event.get('body', '{}'))
@@ -1,9 +1,12 @@
 """
 LangChain LLM wrapper for Semantis Cache
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Any, Dict
 from langchain.llms.base import LLM
-from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.schema import Generation, LLMResult
 from pydantic import Field
 
 
@@ -12,6 +15,8 @@ class SemantisCacheLLM(LLM):
     LangChain LLM wrapper for Semantis Cache.
     
     This provides a LangChain-compatible LLM interface with automatic semantic caching.
+    All instances with the same api_key/base_url share one client (and its
+    keep-alive connection pool); batches run up to max_concurrency prompts at once.
     
     Example:
         >>> from semantis_cache.integrations.langchain import SemantisCacheLLM
@@ -21,6 +26,10 @@ class SemantisCacheLLM(LLM):
         >>> # Use like any LangChain LLM
         >>> response = llm("What is AI?")
         >>> print(response)
+        >>> 
+        >>> # Batch and async calls are concurrent
+        >>> result = llm.generate(["What is AI?", "What is ML?"])
+        >>> result = await llm.agenerate(["What is AI?", "What is ML?"])
     """
     
     api_key: str = Field(..., description="Semantis AI API key")
@@ -28,11 +37,22 @@ class SemantisCacheLLM(LLM):
     model: str = Field("gpt-4o-mini", description="Model to use")
     temperature: float = Field(0.2, description="Sampling temperature")
     timeout: Optional[float] = Field(30.0, description="Request timeout")
+    max_concurrency: int = Field(8, description="Prompts of one batch sent concurrently")
     
     @property
     def _llm_type(self) -> str:
         """Return type of LLM."""
         return "semantis_cache"
+
+    def _get_client(self):
+        """Shared SemanticCache for this api_key/base_url, created on first use."""
+        try:
+            from semantis_cache import get_shared_client
+        except ImportError:
+            raise ImportError(
+                "semantis_cache package is required. Install it with: pip install semantis-cache"
+            )
+        return get_shared_client(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
     
     def _call(
         self,
@@ -42,28 +62,57 @@ class SemantisCacheLLM(LLM):
         **kwargs: Any,
     ) -> str:
         """Call the LLM with caching."""
+        cache = self._get_client()
         try:
-            from semantis_cache import SemanticCache
-            
-            # Initialize cache client
-            cache = SemanticCache(
-                api_key=self.api_key,
-                base_url=self.base_url,
-                timeout=self.timeout
-            )
-            
-            # Use simple query method
-            response = cache.query(prompt, model=self.model)
-            
-            # Return answer
-            return response.answer
-            
-        except ImportError:
-            raise ImportError(
-                "semantis_cache package is required. Install it with: pip install semantis-cache"
-            )
+            return cache.query(prompt, model=self.model).answer
+        except Exception as e:
+            raise Exception(f"Error calling Semantis Cache: {e}")
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Async call with caching, without blocking the event loop."""
+        cache = self._get_client()
+        try:
+            return (await cache.aquery(prompt, model=self.model)).answer
         except Exception as e:
             raise Exception(f"Error calling Semantis Cache: {e}")
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """Run a batch of prompts concurrently over the shared client."""
+        if len(prompts) <= 1:
+            answers = [self._call(p, stop=stop, **kwargs) for p in prompts]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(prompts))) as pool:
+                answers = list(pool.map(lambda p: self._call(p, stop=stop, **kwargs), prompts))
+        return LLMResult(generations=[[Generation(text=a)] for a in answers])
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """Async batch: at most max_concurrency requests in flight."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(prompt: str) -> str:
+            async with semaphore:
+                return await self._acall(prompt, stop=stop, **kwargs)
+
+        answers = await asyncio.gather(*(one(p) for p in prompts))
+        return LLMResult(generations=[[Generation(text=a)] for a in answers])
     
     @property
     def _identifying_params(self) -> Dict[str, Any]:
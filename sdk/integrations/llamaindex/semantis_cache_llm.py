@@ -11,6 +11,7 @@ class SemantisCacheLLM(CustomLLM):
     LlamaIndex LLM wrapper for Semantis Cache.
     
     This provides a LlamaIndex-compatible LLM interface with automatic semantic caching.
+    Instances with the same api_key/base_url share one client and connection pool.
     
     Example:
         >>> from semantis_cache.integrations.llamaindex import SemantisCacheLLM
@@ -47,28 +48,31 @@ class SemantisCacheLLM(CustomLLM):
             temperature=self.temperature,
         )
     
-    def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
-        """Complete a prompt with caching."""
+    def _get_client(self):
+        """Shared SemanticCache for this api_key/base_url, created on first use."""
         try:
-            from semantis_cache import SemanticCache
-            
-            # Initialize cache client
-            cache = SemanticCache(
-                api_key=self.api_key,
-                base_url=self.base_url,
-                timeout=self.timeout
-            )
-            
-            # Use simple query method
-            response = cache.query(prompt, model=self.model)
-            
-            # Return completion response
-            return CompletionResponse(text=response.answer)
-            
+            from semantis_cache import get_shared_client
         except ImportError:
             raise ImportError(
                 "semantis_cache package is required. Install it with: pip install semantis-cache"
             )
+        return get_shared_client(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+    
+    def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+        """Complete a prompt with caching."""
+        cache = self._get_client()
+        try:
+            response = cache.query(prompt, model=self.model)
+            return CompletionResponse(text=response.answer)
+        except Exception as e:
+            raise Exception(f"Error calling Semantis Cache: {e}")
+    
+    async def acomplete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+        """Async completion with caching, without blocking the event loop."""
+        cache = self._get_client()
+        try:
+            response = await cache.aquery(prompt, model=self.model)
+            return CompletionResponse(text=response.answer)
         except Exception as e:
             raise Exception(f"Error calling Semantis Cache: {e}")
     
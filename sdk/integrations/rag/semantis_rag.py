@@ -4,6 +4,7 @@ RAG-optimized caching for Semantis Cache
 Provides specialized caching for RAG applications that combine context and questions.
 """
 from typing import List, Optional, Dict, Any
+import httpx
 from semantis_cache import SemanticCache
 
 
@@ -14,6 +15,11 @@ class SemantisRAG:
     This class provides specialized caching for RAG applications where
     queries combine context (retrieved documents) with questions.
     
+    By default only the question and fingerprints (content hashes) of the
+    documents are sent: the server embeds just the question and reuses an
+    answer given for a similar question over the same documents, and the
+    documents are uploaded only when nothing matches.
+    
     Example:
         >>> from semantis_cache.integrations.rag import SemantisRAG
         >>> 
@@ -34,6 +40,8 @@ class SemantisRAG:
         base_url: Optional[str] = None,
         model: str = "gpt-4o-mini",
         cache_context: bool = True,
+        fingerprint_context: bool = True,
+        min_overlap: float = 1.0,
     ):
         """
         Initialize RAG cache.
@@ -43,26 +51,35 @@ class SemantisRAG:
             base_url: API base URL (optional)
             model: Model to use (default: "gpt-4o-mini")
             cache_context: Whether to include context in cache key (default: True)
+            fingerprint_context: Key on document fingerprints instead of sending the
+                full context in the prompt (default: True)
+            min_overlap: With fingerprints, minimum overlap (Jaccard) of two document
+                sets for an answer to be reused (default: 1.0, same documents)
         """
         self.cache = SemanticCache(api_key=api_key, base_url=base_url)
         self.model = model
         self.cache_context = cache_context
+        self.fingerprint_context = fingerprint_context
+        self.min_overlap = min_overlap
     
     def query(
         self,
         question: str,
         context: List[str],
+        doc_ids: Optional[List[str]] = None,
         **kwargs
     ) -> Any:
         """
         Query with context (RAG pattern).
         
-        This method combines context and question into a prompt and caches it.
-        The cache key includes both context and question for better matching.
+        The cache key includes both context and question for better matching:
+        document fingerprints plus the question (fingerprint_context=True), or
+        a prompt combining the full context and the question.
         
         Args:
             question: User question
             context: List of context documents
+            doc_ids: Optional ids of the context documents (same order)
             **kwargs: Additional parameters (temperature, max_tokens, etc.)
         
         Returns:
@@ -76,6 +93,21 @@ class SemantisRAG:
             >>> print(response.answer)
             >>> print(f"Cache hit: {response.cache_hit}")
         """
+        if self.cache_context and self.fingerprint_context and context:
+            try:
+                return self.cache.rag_query(
+                    question,
+                    context=list(context) if isinstance(context, list) else [str(context)],
+                    doc_ids=doc_ids,
+                    model=self.model,
+                    min_overlap=self.min_overlap,
+                )
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                # Server without /v1/rag/query: fall back to context-in-prompt keys
+                self.fingerprint_context = False
+        
         # Combine context and question
         context_str = "\n\n".join(context) if isinstance(context, list) else str(context)
         
@@ -74,49 +74,59 @@ class SemantisSQL:
             ... )
             >>> print(response.answer)  # SQL query or result
         """
-        # Build prompt
-        if schema and self.cache_schema:
-            prompt = f"Schema:\n{schema}\n\nQuestion: {question}"
-        else:
-            prompt = question
-        
         # Query cache
-        response = self.cache.query(prompt, model=self.model)
+        response = self.cache.query(self._prompt(question, schema), model=self.model)
         
         return response
     
+    def lookup(self, question: str, schema: Optional[str] = None) -> Any:
+        """
+        Check the cache for a question without calling the LLM.
+        
+        On a miss ``response.answer`` is None; generate and run the SQL
+        yourself, then pass ``response.lookup_token`` to query_with_result().
+        """
+        return self.cache.lookup(self._prompt(question, schema), model=self.model)
+    
     def query_with_result(
         self,
         question: str,
         sql_query: str,
         result: Any,
         schema: Optional[str] = None,
+        lookup_token: Optional[str] = None,
         **kwargs
-    ) -> Any:
+    ) -> Dict[str, Any]:
         """
         Cache SQL query and result.
         
         This method allows you to cache both the SQL query and its result.
-        Similar questions will return cached results.
+        The entry is keyed on the question, so similar questions asked via
+        query() or lookup() return the cached SQL and result. Nothing is sent
+        to the LLM.
         
         Args:
             question: Natural language question
             sql_query: Generated SQL query
             result: SQL query result
             schema: Optional database schema
-            **kwargs: Additional parameters
+            lookup_token: Token from a preceding lookup() miss (reuses its embedding)
+            **kwargs: Additional parameters (e.g. ttl_seconds)
         
         Returns:
-            QueryResponse with cached result
+            Dict with ``stored`` and ``entry_id``
         """
-        # Build prompt with SQL and result
-        if schema:
-            prompt = f"Schema:\n{schema}\n\nQuestion: {question}\n\nSQL: {sql_query}\n\nResult: {result}"
-        else:
-            prompt = f"Question: {question}\n\nSQL: {sql_query}\n\nResult: {result}"
-        
-        # Query cache (this will cache the result)
-        response = self.cache.query(prompt, model=self.model)
-        
-        return response
+        answer = f"SQL: {sql_query}\n\nResult: {result}"
+        return self.cache.store(
+            self._prompt(question, schema),
+            answer,
+            model=self.model,
+            lookup_token=lookup_token,
+            ttl_seconds=kwargs.get("ttl_seconds", 604800),
+        )
+    
+    def _prompt(self, question: str, schema: Optional[str]) -> str:
+        if schema and self.cache_schema:
+            return f"Schema:\n{schema}\n\nQuestion: {question}"
+        return question
 
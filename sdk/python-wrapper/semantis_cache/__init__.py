@@ -27,9 +27,9 @@ Example - OpenAI Proxy (Drop-in Replacement):
     ... )
 """
 
-from .client import SemanticCache
+from .client import SemanticCache, get_shared_client
 from .openai_proxy import ChatCompletion
 
 __version__ = "1.0.0"
 
-__all__ = ["SemanticCache", "ChatCompletion", "__version__"]
+__all__ = ["SemanticCache", "ChatCompletion", "get_shared_client", "__version__"]
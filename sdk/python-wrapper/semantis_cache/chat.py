@@ -1,9 +1,11 @@
 """
 Chat Completions API - OpenAI-compatible interface
 """
+import json
 import sys
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union
+from typing import AsyncIterator, Iterator, List, Dict, Any, Optional, Union
 
 # Try to import OpenAPI client from bundled package first
 try:
@@ -34,13 +36,16 @@ except ImportError:
             ChatRequest = None
             ChatMessage = None
 
+from .local_cache import LocalCache, local_hit
+
 
 class ChatCompletions:
     """Chat completions with automatic semantic caching"""
     
-    def __init__(self, openapi_client):
-        """Initialize with OpenAPI client"""
+    def __init__(self, openapi_client, local_cache: Optional[LocalCache] = None):
+        """Initialize with OpenAPI client and optional in-process cache"""
         self._openapi_client = openapi_client
+        self._local_cache = local_cache
     
     def create(
         self,
@@ -48,8 +53,9 @@ class ChatCompletions:
         messages: Union[List[Dict[str, str]], List[ChatMessage]],
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        stream: bool = False,
         **kwargs
-    ) -> "ChatCompletionResponse":
+    ) -> Union["ChatCompletionResponse", "ChatCompletionStream"]:
         """
         Create a chat completion with automatic semantic caching.
         
@@ -64,10 +70,12 @@ class ChatCompletions:
             messages: List of messages (e.g., [{"role": "user", "content": "Hello"}])
             temperature: Sampling temperature (optional)
             max_tokens: Maximum tokens to generate (optional)
+            stream: Return a ChatCompletionStream of chunks as the server sends them
             **kwargs: Additional parameters (e.g., ttl_seconds)
         
         Returns:
             ChatCompletionResponse with cached or fresh response
+            (ChatCompletionStream if stream=True)
         
         Example:
             >>> response = cache.chat.completions.create(
@@ -76,10 +84,122 @@ class ChatCompletions:
             ... )
             >>> print(response.choices[0].message.content)
             >>> print(f"Cache hit: {response.cache_hit}")  # 'exact', 'semantic', or 'miss'
+            >>> 
+            >>> for chunk in cache.chat.completions.create(model="gpt-4o-mini", messages=messages, stream=True):
+            ...     print(chunk.choices[0].delta.content or "", end="")
         """
         if openai_compatible_v1_chat_completions_post is None:
             raise ImportError("OpenAPI client not properly installed")
         
+        if stream:
+            request = self._build_request(model, messages, temperature, max_tokens, kwargs)
+            return ChatCompletionStream(self._iter_stream(request))
+        
+        # In-process cache (opt-in): same model and messages as a recent call
+        local = self._local_cache
+        if local is not None:
+            t0 = time.perf_counter()
+            key = local.key("chat", model, messages)
+            cached = local.get(key)
+            if cached is not None:
+                return ChatCompletionResponse(local_hit(cached, t0))
+        
+        request = self._build_request(model, messages, temperature, max_tokens, kwargs)
+        
+        # Make API request (caching happens automatically on server)
+        response_data = openai_compatible_v1_chat_completions_post.sync(
+            client=self._openapi_client,
+            body=request
+        )
+        
+        if local is not None and isinstance(response_data, dict):
+            local.put(key, response_data, response_data.get("meta"), kwargs.get("ttl_seconds", 604800))
+        
+        # Return response object
+        return ChatCompletionResponse(response_data)
+    
+    async def acreate(
+        self,
+        model: str,
+        messages: Union[List[Dict[str, str]], List[ChatMessage]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        **kwargs
+    ) -> Union["ChatCompletionResponse", "AsyncChatCompletionStream"]:
+        """
+        Async variant of create(), on the client's httpx.AsyncClient for the running event loop.
+        
+        Example:
+            >>> response = await cache.chat.completions.acreate(
+            ...     model="gpt-4o-mini",
+            ...     messages=[{"role": "user", "content": "What is AI?"}]
+            ... )
+            >>> 
+            >>> async for chunk in await cache.chat.completions.acreate(model="gpt-4o-mini", messages=messages, stream=True):
+            ...     print(chunk.choices[0].delta.content or "", end="")
+        """
+        if openai_compatible_v1_chat_completions_post is None:
+            raise ImportError("OpenAPI client not properly installed")
+        
+        if stream:
+            request = self._build_request(model, messages, temperature, max_tokens, kwargs)
+            return AsyncChatCompletionStream(self._aiter_stream(request))
+        
+        local = self._local_cache
+        if local is not None:
+            t0 = time.perf_counter()
+            key = local.key("chat", model, messages)
+            cached = local.get(key)
+            if cached is not None:
+                return ChatCompletionResponse(local_hit(cached, t0))
+        
+        request = self._build_request(model, messages, temperature, max_tokens, kwargs)
+        response_data = await openai_compatible_v1_chat_completions_post.asyncio(
+            client=self._openapi_client,
+            body=request
+        )
+        
+        if local is not None and isinstance(response_data, dict):
+            local.put(key, response_data, response_data.get("meta"), kwargs.get("ttl_seconds", 604800))
+        
+        return ChatCompletionResponse(response_data)
+    
+    def _iter_stream(self, request: "ChatRequest") -> Iterator["ChatCompletionChunk"]:
+        """POST with stream=True and parse SSE frames as they arrive"""
+        request["stream"] = True
+        http = self._openapi_client.get_httpx_client()
+        with http.stream("POST", "/v1/chat/completions", json=request.to_dict()) as resp:
+            if resp.is_error:
+                resp.read()
+                resp.raise_for_status()
+            for line in resp.iter_lines():
+                data = _sse_data(line)
+                if data is None:
+                    continue
+                if not data:
+                    return
+                yield ChatCompletionChunk(data)
+    
+    async def _aiter_stream(self, request: "ChatRequest") -> AsyncIterator["ChatCompletionChunk"]:
+        """Async variant of _iter_stream()"""
+        request["stream"] = True
+        http = self._openapi_client.get_async_httpx_client()
+        async with http.stream("POST", "/v1/chat/completions", json=request.to_dict()) as resp:
+            if resp.is_error:
+                await resp.aread()
+                resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                data = _sse_data(line)
+                if data is None:
+                    continue
+                if not data:
+                    return
+                yield ChatCompletionChunk(data)
+    
+    @staticmethod
+    def _build_request(model, messages, temperature, max_tokens, kwargs) -> "ChatRequest":
+        """Build the ChatRequest body for create()/acreate()"""
         # Convert messages to ChatMessage objects if needed
         if messages and isinstance(messages[0], dict):
             chat_messages = [
@@ -107,18 +227,20 @@ class ChatCompletions:
         # Note: The backend may not use these, but we store them for compatibility
         if max_tokens is not None:
             request["max_tokens"] = max_tokens
-        for key, value in kwargs.items():
-            if key not in ["model", "messages", "temperature", "ttl_seconds"]:
-                request[key] = value
-        
-        # Make API request (caching happens automatically on server)
-        response_data = openai_compatible_v1_chat_completions_post.sync(
-            client=self._openapi_client,
-            body=request
-        )
-        
-        # Return response object
-        return ChatCompletionResponse(response_data)
+        for name, value in kwargs.items():
+            if name not in ["model", "messages", "temperature", "ttl_seconds"]:
+                request[name] = value
+        return request
+
+
+def _sse_data(line: str) -> Optional[Dict[str, Any]]:
+    """Payload of one SSE line; None for blank/comment lines, {} for the [DONE] marker"""
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return {}
+    return json.loads(data)
 
 
 class ChatCompletionResponse:
@@ -149,7 +271,7 @@ class ChatCompletionResponse:
     
     @property
     def cache_hit(self) -> str:
-        """Get cache hit type: 'exact', 'semantic', or 'miss'"""
+        """Get cache hit type: 'exact', 'semantic', 'miss' or 'local'"""
         if isinstance(self.meta, dict):
             return self.meta.get("hit", "miss")
         return getattr(self.meta, "hit", "miss")
@@ -203,3 +325,96 @@ class Message:
             self.role = getattr(data, "role", None)
             self.content = getattr(data, "content", "") or ""
 
+
+class ChatCompletionChunk:
+    """One streamed chunk (OpenAI chat.completion.chunk format)"""
+    
+    def __init__(self, data: Dict[str, Any]):
+        """Initialize from a parsed SSE frame"""
+        self._data = data
+        self.id = data.get("id")
+        self.object = data.get("object", "chat.completion.chunk")
+        self.created = data.get("created")
+        self.model = data.get("model")
+        self.choices = [ChunkChoice(c) for c in data.get("choices", [])]
+    
+    def __repr__(self):
+        return f"ChatCompletionChunk(id={self.id})"
+
+
+class ChunkChoice:
+    """Streamed choice with an incremental delta"""
+    
+    def __init__(self, data: Dict[str, Any]):
+        """Initialize from dict"""
+        self._data = data
+        self.index = data.get("index")
+        self.delta = Delta(data.get("delta") or {})
+        self.finish_reason = data.get("finish_reason")
+
+
+class Delta:
+    """Incremental message content of a streamed choice"""
+    
+    def __init__(self, data: Dict[str, Any]):
+        """Initialize from dict"""
+        self._data = data
+        self.role = data.get("role")
+        self.content = data.get("content")
+
+
+class ChatCompletionStream:
+    """
+    Iterator of ChatCompletionChunk read lazily from the open HTTP response.
+    
+    Breaking out of the loop (or leaving a ``with`` block) closes the
+    response early and returns the connection to the pool.
+    """
+    
+    def __init__(self, chunks: Iterator[ChatCompletionChunk]):
+        self._chunks = chunks
+    
+    def __iter__(self) -> Iterator[ChatCompletionChunk]:
+        return self
+    
+    def __next__(self) -> ChatCompletionChunk:
+        return next(self._chunks)
+    
+    def close(self):
+        """Close the underlying response"""
+        self._chunks.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class AsyncChatCompletionStream:
+    """Async iterator of ChatCompletionChunk; use ``async with`` to close early"""
+    
+    def __init__(self, chunks: AsyncIterator[ChatCompletionChunk]):
+        self._chunks = chunks
+    
+    def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        return self
+    
+    async def __anext__(self) -> ChatCompletionChunk:
+        return await self._chunks.__anext__()
+    
+    async def close(self):
+        """Close the underlying response"""
+        await self._chunks.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -1,10 +1,13 @@
 """
 Semantis AI Client - OpenAI-compatible interface with automatic caching
 """
+import asyncio
 import os
 import sys
+import threading
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 # Try to import OpenAPI client from bundled package first, then from installed package
 try:
@@ -41,15 +44,43 @@ except ImportError:
             ChatMessage = None
 
 from .chat import ChatCompletions
+from .local_cache import LocalCache
 from .query import SimpleQuery
 
 
+if OpenAPIClient is not None:
+    class _LoopLocalClient(OpenAPIClient):
+        """
+        OpenAPI client with one httpx.AsyncClient per running event loop.
+        
+        An httpx.AsyncClient is bound to the loop that first used it, so a
+        client that outlives one asyncio.run() (get_shared_client(), a
+        module-level SemanticCache) would fail with "Event loop is closed"
+        in the next one.
+        """
+        
+        _loops_lock = threading.Lock()
+        
+        def get_async_httpx_client(self):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return super().get_async_httpx_client()
+            with self._loops_lock:
+                clients = self.__dict__.setdefault("_loop_clients", weakref.WeakKeyDictionary())
+                async_client = clients.get(loop)
+                if async_client is None:
+                    self._async_client = None  # let the base class build a fresh one
+                    async_client = clients[loop] = super().get_async_httpx_client()
+                return async_client
+
+
 class ChatCompletionsWrapper:
     """Wrapper to provide OpenAI-compatible chat.completions structure"""
     
-    def __init__(self, openapi_client):
-        """Initialize with OpenAPI client"""
-        self.completions = ChatCompletions(openapi_client)
+    def __init__(self, openapi_client, local_cache: Optional[LocalCache] = None):
+        """Initialize with OpenAPI client and optional in-process cache"""
+        self.completions = ChatCompletions(openapi_client, local_cache)
 
 
 class SemanticCache:
@@ -84,6 +115,8 @@ class SemanticCache:
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         timeout: Optional[float] = None,
+        local_cache: bool = False,
+        local_cache_size: int = 1024,
     ):
         """
         Initialize Semantis AI client.
@@ -93,6 +126,9 @@ class SemanticCache:
                     If not provided, will try to get from SEMANTIS_API_KEY env var
             base_url: API base URL (default: https://api.semantis.ai or http://localhost:8000 for dev)
             timeout: Request timeout in seconds (default: 30.0)
+            local_cache: Keep responses in an in-process LRU so repeated prompts
+                    (same model and messages) skip the network round trip
+            local_cache_size: Maximum number of prompts kept in that LRU (default: 1024)
         """
         if OpenAPIClient is None:
             raise ImportError(
@@ -117,7 +153,7 @@ class SemanticCache:
             api_key = f"Bearer {api_key}"
         
         # Initialize OpenAPI client
-        self._openapi_client = OpenAPIClient(
+        self._openapi_client = _LoopLocalClient(
             base_url=base_url,
             headers={"Authorization": api_key},
             timeout=timeout or 30.0,
@@ -127,13 +163,16 @@ class SemanticCache:
         self._api_key = api_key
         self._base_url = base_url
         
+        # Optional in-process cache shared by chat and query
+        self.local_cache = LocalCache(local_cache_size) if local_cache else None
+        
         # Initialize chat completions (OpenAI-compatible structure)
-        self.chat = ChatCompletionsWrapper(self._openapi_client)
+        self.chat = ChatCompletionsWrapper(self._openapi_client, self.local_cache)
         
         # Initialize simple query
-        self._query_client = SimpleQuery(self._openapi_client)
+        self._query_client = SimpleQuery(self._openapi_client, self.local_cache)
     
-    def query(self, prompt: str, model: str = "gpt-4o-mini"):
+    def query(self, prompt: str, model: str = "gpt-4o-mini", ttl_seconds: int = 604800):
         """
         Simple query method - returns response with answer and cache metadata.
         
@@ -143,6 +182,7 @@ class SemanticCache:
         Args:
             prompt: Query string (e.g., "What is our refund policy?")
             model: Model to use (default: "gpt-4o-mini")
+            ttl_seconds: How long the in-process cache may reuse the answer
         
         Returns:
             QueryResponse with answer, cache_hit, similarity, latency_ms
@@ -155,7 +195,88 @@ class SemanticCache:
             >>> print(f"Similarity: {response.similarity}")
             >>> print(f"Latency: {response.latency_ms}ms")
         """
-        return self._query_client.query(prompt, model)
+        return self._query_client.query(prompt, model, ttl_seconds)
+    
+    async def aquery(self, prompt: str, model: str = "gpt-4o-mini", ttl_seconds: int = 604800):
+        """
+        Async variant of query().
+        
+        Example:
+            >>> response = await cache.aquery("What is AI?")
+            >>> print(response.answer)
+        """
+        return await self._query_client.aquery(prompt, model, ttl_seconds)
+    
+    def lookup(self, prompt: str, model: str = "gpt-4o-mini"):
+        """
+        Check the cache without ever calling the LLM.
+        
+        Use with store() when your application calls the LLM itself, so a
+        miss costs exactly one upstream call.
+        
+        Example:
+            >>> hit = cache.lookup("What is AI?")
+            >>> if hit.answer is None:
+            ...     answer = my_llm("What is AI?")
+            ...     cache.store("What is AI?", answer, lookup_token=hit.lookup_token)
+        """
+        return self._query_client.lookup(prompt, model)
+    
+    async def alookup(self, prompt: str, model: str = "gpt-4o-mini"):
+        """Async variant of lookup()"""
+        return await self._query_client.alookup(prompt, model)
+    
+    def store(
+        self,
+        prompt: str,
+        answer: str,
+        model: str = "gpt-4o-mini",
+        lookup_token: Optional[str] = None,
+        ttl_seconds: int = 604800,
+    ) -> dict:
+        """Write an answer produced by your own LLM call back to the cache"""
+        return self._query_client.store(prompt, answer, model, lookup_token, ttl_seconds)
+    
+    async def astore(
+        self,
+        prompt: str,
+        answer: str,
+        model: str = "gpt-4o-mini",
+        lookup_token: Optional[str] = None,
+        ttl_seconds: int = 604800,
+    ) -> dict:
+        """Async variant of store()"""
+        return await self._query_client.astore(prompt, answer, model, lookup_token, ttl_seconds)
+    
+    def rag_query(
+        self,
+        question: str,
+        context: List[str],
+        doc_ids: Optional[List[str]] = None,
+        model: str = "gpt-4o-mini",
+        min_overlap: float = 1.0,
+        ttl_seconds: int = 604800,
+    ):
+        """
+        RAG query that sends context fingerprints instead of the documents.
+        
+        The server embeds only the question and matches on (question
+        similarity, document set); the documents are uploaded only when
+        nothing cached matches.
+        
+        Example:
+            >>> response = cache.rag_query(
+            ...     "What is the refund window?",
+            ...     context=[doc.text for doc in retrieved],
+            ...     doc_ids=[doc.id for doc in retrieved],
+            ... )
+            >>> print(response.answer, response.cache_hit)
+        """
+        return self._query_client.rag_query(question, context, doc_ids, model, min_overlap, ttl_seconds)
+    
+    def close(self):
+        """Close the underlying HTTP connection pool"""
+        self._openapi_client.get_httpx_client().close()
     
     @property
     def api_key(self) -> str:
@@ -167,3 +288,36 @@ class SemanticCache:
         """Get base URL"""
         return self._base_url
 
+
+_shared_clients: Dict[Tuple[Optional[str], Optional[str], Optional[float]], SemanticCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> SemanticCache:
+    """
+    Process-wide SemanticCache for (api_key, base_url, timeout), created on first use.
+    
+    Integrations (LangChain, LlamaIndex, Lambda, ...) call this instead of
+    constructing a client per call, so every call in the process reuses one
+    keep-alive connection pool (and a warm Lambda container its open TLS
+    connection). Safe to call from multiple threads.
+    
+    Example:
+        >>> from semantis_cache import get_shared_client
+        >>> cache = get_shared_client(api_key="sc-your-key")
+    """
+    key = (api_key or os.getenv("SEMANTIS_API_KEY"), base_url, timeout)
+    cache = _shared_clients.get(key)
+    if cache is None:
+        with _shared_lock:
+            cache = _shared_clients.get(key)
+            if cache is None:
+                cache = SemanticCache(api_key=key[0], base_url=base_url, timeout=timeout)
+                # Create the pooled httpx.Client now, under the lock
+                cache._openapi_client.get_httpx_client()
+                _shared_clients[key] = cache
+    return cache
@@ -1,9 +1,11 @@
 """
 Simple Query API - Simple interface for semantic caching
 """
+import hashlib
 import sys
+import time
 from pathlib import Path
-from typing import Optional, Union, Dict, Any
+from typing import List, Optional, Union, Dict, Any
 
 # Try to import OpenAPI client from bundled package first
 try:
@@ -23,15 +25,18 @@ except ImportError:
         except ImportError:
             simple_query_query_get = None
 
+from .local_cache import LocalCache, local_hit
+
 
 class SimpleQuery:
     """Simple query interface for semantic caching"""
     
-    def __init__(self, openapi_client):
-        """Initialize with OpenAPI client"""
+    def __init__(self, openapi_client, local_cache: Optional[LocalCache] = None):
+        """Initialize with OpenAPI client and optional in-process cache"""
         self._openapi_client = openapi_client
+        self._local_cache = local_cache
     
-    def query(self, prompt: str, model: str = "gpt-4o-mini") -> "QueryResponse":
+    def query(self, prompt: str, model: str = "gpt-4o-mini", ttl_seconds: int = 604800) -> "QueryResponse":
         """
         Simple query method - returns cached or fresh response.
         
@@ -44,6 +49,7 @@ class SimpleQuery:
         Args:
             prompt: Query string (e.g., "What is our refund policy?")
             model: Model to use (default: "gpt-4o-mini")
+            ttl_seconds: How long the in-process cache may reuse the answer
         
         Returns:
             QueryResponse with answer and cache metadata
@@ -56,6 +62,14 @@ class SimpleQuery:
         if simple_query_query_get is None:
             raise ImportError("OpenAPI client not properly installed")
         
+        local = self._local_cache
+        if local is not None:
+            t0 = time.perf_counter()
+            key = local.key("query", model, [{"role": "user", "content": prompt}])
+            cached = local.get(key)
+            if cached is not None:
+                return QueryResponse(local_hit(cached, t0))
+        
         # Make API request (caching happens automatically on server)
         response_data = simple_query_query_get.sync(
             client=self._openapi_client,
@@ -63,8 +77,173 @@ class SimpleQuery:
             model=model
         )
         
+        if local is not None and isinstance(response_data, dict):
+            local.put(key, response_data, response_data.get("meta"), ttl_seconds)
+        
         # Return response object
         return QueryResponse(response_data)
+    
+    async def aquery(self, prompt: str, model: str = "gpt-4o-mini", ttl_seconds: int = 604800) -> "QueryResponse":
+        """Async variant of query(), on the client's httpx.AsyncClient for the running event loop"""
+        if simple_query_query_get is None:
+            raise ImportError("OpenAPI client not properly installed")
+        
+        local = self._local_cache
+        if local is not None:
+            t0 = time.perf_counter()
+            key = local.key("query", model, [{"role": "user", "content": prompt}])
+            cached = local.get(key)
+            if cached is not None:
+                return QueryResponse(local_hit(cached, t0))
+        
+        response_data = await simple_query_query_get.asyncio(
+            client=self._openapi_client,
+            prompt=prompt,
+            model=model
+        )
+        
+        if local is not None and isinstance(response_data, dict):
+            local.put(key, response_data, response_data.get("meta"), ttl_seconds)
+        
+        return QueryResponse(response_data)
+
+    
+    def lookup(self, prompt: str, model: str = "gpt-4o-mini") -> "QueryResponse":
+        """
+        Cache lookup that never calls the LLM.
+        
+        On a miss the answer is None and ``lookup_token`` is set; produce the
+        answer yourself and write it back with store().
+        """
+        response = self._openapi_client.get_httpx_client().get(
+            "/query", params={"prompt": prompt, "model": model, "lookup_only": "true"}
+        )
+        response.raise_for_status()
+        return QueryResponse(response.json())
+    
+    async def alookup(self, prompt: str, model: str = "gpt-4o-mini") -> "QueryResponse":
+        """Async variant of lookup()"""
+        response = await self._openapi_client.get_async_httpx_client().get(
+            "/query", params={"prompt": prompt, "model": model, "lookup_only": "true"}
+        )
+        response.raise_for_status()
+        return QueryResponse(response.json())
+    
+    def store(
+        self,
+        prompt: str,
+        answer: str,
+        model: str = "gpt-4o-mini",
+        lookup_token: Optional[str] = None,
+        ttl_seconds: int = 604800,
+    ) -> Dict[str, Any]:
+        """
+        Write an answer back to the cache (PUT /v1/cache/entries).
+        
+        Pass the lookup_token of the preceding lookup() miss so the server
+        reuses that lookup's embedding instead of computing it again.
+        """
+        response = self._openapi_client.get_httpx_client().put(
+            "/v1/cache/entries", json=self._entry_body(prompt, answer, model, lookup_token, ttl_seconds)
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def astore(
+        self,
+        prompt: str,
+        answer: str,
+        model: str = "gpt-4o-mini",
+        lookup_token: Optional[str] = None,
+        ttl_seconds: int = 604800,
+    ) -> Dict[str, Any]:
+        """Async variant of store()"""
+        response = await self._openapi_client.get_async_httpx_client().put(
+            "/v1/cache/entries", json=self._entry_body(prompt, answer, model, lookup_token, ttl_seconds)
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    @staticmethod
+    def _entry_body(prompt, answer, model, lookup_token, ttl_seconds) -> Dict[str, Any]:
+        return {
+            "prompt": prompt,
+            "response": answer,
+            "model": model,
+            "lookup_token": lookup_token,
+            "ttl_seconds": ttl_seconds,
+        }
+    
+    def rag_query(
+        self,
+        question: str,
+        context: List[str],
+        doc_ids: Optional[List[str]] = None,
+        model: str = "gpt-4o-mini",
+        min_overlap: float = 1.0,
+        ttl_seconds: int = 604800,
+    ) -> "QueryResponse":
+        """
+        RAG query keyed on the question plus fingerprints of the context documents.
+        
+        Only content hashes (and optional document ids) are sent at first; the
+        server embeds just the question and reuses an answer cached for a
+        similar question over the same documents (or, with min_overlap < 1.0,
+        a sufficiently overlapping set). The documents themselves are uploaded
+        only if nothing matched and the server needs them to answer.
+        
+        Args:
+            question: User question
+            context: Retrieved context documents
+            doc_ids: Optional ids of those documents (same order as context)
+            model: Model to use (default: "gpt-4o-mini")
+            min_overlap: Minimum Jaccard overlap of document sets to reuse an answer
+            ttl_seconds: Cache lifetime of the answer
+        
+        Returns:
+            QueryResponse with answer and cache metadata
+        """
+        fingerprints = [
+            {"id": doc_ids[i] if doc_ids else None, "hash": fingerprint(doc)}
+            for i, doc in enumerate(context)
+        ]
+        
+        local = self._local_cache
+        if local is not None:
+            t0 = time.perf_counter()
+            # min_overlap changes which cached answers the server may return
+            key = local.key(f"rag:{min_overlap}", model, [{"role": "context", "content": ",".join(sorted(f["hash"] for f in fingerprints))},
+                                           {"role": "user", "content": question}])
+            cached = local.get(key)
+            if cached is not None:
+                return QueryResponse(local_hit(cached, t0))
+        
+        payload = {
+            "question": question,
+            "context_fingerprints": fingerprints,
+            "model": model,
+            "min_overlap": min_overlap,
+            "ttl_seconds": ttl_seconds,
+        }
+        http = self._openapi_client.get_httpx_client()
+        response = http.post("/v1/rag/query", json=payload)
+        response.raise_for_status()
+        response_data = response.json()
+        if response_data.get("meta", {}).get("context_required"):
+            # Nothing cached for these documents: send them so the server can answer
+            response = http.post("/v1/rag/query", json=dict(payload, context=list(context)))
+            response.raise_for_status()
+            response_data = response.json()
+        
+        if local is not None:
+            local.put(key, response_data, response_data.get("meta"), ttl_seconds)
+        
+        return QueryResponse(response_data)
+
+
+def fingerprint(document: str) -> str:
+    """Content hash identifying a context document in RAG queries"""
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()[:32]
 
 
 class QueryResponse:
@@ -87,7 +266,7 @@ class QueryResponse:
     
     @property
     def cache_hit(self) -> str:
-        """Get cache hit type: 'exact', 'semantic', or 'miss'"""
+        """Get cache hit type: 'exact', 'semantic', 'miss' or 'local'"""
         if isinstance(self.meta, dict):
             return self.meta.get("hit", "miss")
         return getattr(self.meta, "hit", "miss")
@@ -106,6 +285,13 @@ class QueryResponse:
             return self.meta.get("latency_ms", 0.0)
         return getattr(self.meta, "latency_ms", 0.0)
     
+    @property
+    def lookup_token(self) -> Optional[str]:
+        """Token of a lookup-only miss, for writing the answer back with store()"""
+        if isinstance(self.meta, dict):
+            return self.meta.get("lookup_token")
+        return getattr(self.meta, "lookup_token", None)
+    
     def __repr__(self):
-        return f"QueryResponse(answer={self.answer[:50]}..., cache_hit={self.cache_hit})"
+        return f"QueryResponse(answer={(self.answer or '')[:50]}..., cache_hit={self.cache_hit})"
 
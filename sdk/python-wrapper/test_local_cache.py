@@ -0,0 +1,65 @@
+"""
+Unit tests for the in-process L0 cache (semantis_cache.local_cache).
+Run with: python -m pytest -q test_local_cache.py
+"""
+from semantis_cache.local_cache import LocalCache
+
+MESSAGES = [{"role": "user", "content": "What is FAISS?"}]
+
+
+def _body(answer, entry_id="e1", hit="miss"):
+    return {"answer": answer, "meta": {"hit": hit, "entry_id": entry_id}}
+
+
+def test_repeated_prompt_is_served_locally():
+    cache = LocalCache()
+    key = cache.key("query", "gpt-4o-mini", MESSAGES)
+    assert cache.get(key) is None
+    cache.put(key, _body("a vector index"), _body("a vector index")["meta"], ttl_seconds=60)
+    assert cache.get(cache.key("query", "gpt-4o-mini", [{"role": "user", "content": "  what is  faiss? "}]))["answer"] == "a vector index"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_paraphrases_share_one_entry():
+    cache = LocalCache()
+    for prompt in ("What is FAISS?", "Explain FAISS"):
+        key = cache.key("query", "gpt-4o-mini", [{"role": "user", "content": prompt}])
+        body = _body("a vector index", hit="semantic")
+        cache.put(key, body, body["meta"], ttl_seconds=60)
+    assert cache.stats() == {"keys": 2, "entries": 1, "hits": 0, "misses": 0}
+
+
+def test_same_entry_id_under_two_models_keeps_both_answers():
+    cache = LocalCache()
+    mini = cache.key("query", "gpt-4o-mini", MESSAGES)
+    full = cache.key("query", "gpt-4o", MESSAGES)
+    for key, answer in ((mini, "answer from gpt-4o-mini"), (full, "answer from gpt-4o")):
+        body = _body(answer)
+        cache.put(key, body, body["meta"], ttl_seconds=60)
+    assert cache.get(mini)["answer"] == "answer from gpt-4o-mini"
+    assert cache.get(full)["answer"] == "answer from gpt-4o"
+
+
+def test_another_answer_for_a_shared_entry_only_replaces_this_key():
+    cache = LocalCache()
+    first = cache.key("query", "gpt-4o-mini", MESSAGES)
+    second = cache.key("query", "gpt-4o-mini", [{"role": "user", "content": "Explain FAISS"}])
+    cache.put(first, _body("old answer"), _body("old answer")["meta"], ttl_seconds=60)
+    cache.put(second, _body("refreshed answer"), _body("refreshed answer")["meta"], ttl_seconds=60)
+    assert cache.get(first)["answer"] == "old answer"
+    assert cache.get(second)["answer"] == "refreshed answer"
+
+
+def test_degraded_answers_are_not_cached():
+    cache = LocalCache()
+    key = cache.key("query", "gpt-4o-mini", MESSAGES)
+    cache.put(key, _body("stale", hit="degraded"), {"hit": "degraded"}, ttl_seconds=60)
+    assert cache.get(key) is None
+
+
+def test_entries_expire_with_the_server_entry():
+    cache = LocalCache()
+    key = cache.key("query", "gpt-4o-mini", MESSAGES)
+    cache.put(key, _body("soon gone"), {"entry_id": "e1", "expires_at": 1.0}, ttl_seconds=60)
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
@@ -15,18 +15,27 @@ Usage:
 """
 
 from semantis.client import SemantisCache
+from semantis.async_client import AsyncSemantisCache
+from semantis.local_cache import LocalCache
+from semantis.streaming import Stream, AsyncStream
 from semantis.models import (
     ChatCompletion,
     ChatCompletionMessage,
     ChatCompletionChoice,
+    ChatCompletionChunk,
     Usage,
 )
 
 __version__ = "0.1.0"
 __all__ = [
     "SemantisCache",
+    "AsyncSemantisCache",
+    "LocalCache",
+    "Stream",
+    "AsyncStream",
     "ChatCompletion",
     "ChatCompletionMessage",
     "ChatCompletionChoice",
+    "ChatCompletionChunk",
     "Usage",
 ]
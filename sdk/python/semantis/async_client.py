@@ -0,0 +1,224 @@
+"""
+Semantis AI async client - asyncio counterpart of ``SemantisCache``.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import httpx
+
+from semantis.client import (
+    _DEFAULT_BASE_URL,
+    _DEFAULT_TIMEOUT,
+    _MAX_RETRIES,
+    _openai_response_to_dict,
+)
+from semantis.local_cache import LocalCache, local_hit
+from semantis.models import ChatCompletion, ChatCompletionChunk
+from semantis.streaming import AsyncStream, aiter_chunks
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx: pip install semantis[http2])
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+_DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+
+class _AsyncCompletions:
+    """Mirrors openai.AsyncOpenAI().chat.completions interface."""
+
+    def __init__(self, client: "AsyncSemantisCache"):
+        self._client = client
+
+    async def create(
+        self,
+        *,
+        model: str = "gpt-4o-mini",
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        ttl_seconds: int = 604800,
+        stream: bool = False,
+        **kwargs,
+    ) -> Union[ChatCompletion, AsyncStream]:
+        """Create a chat completion (with automatic semantic caching).
+
+        With ``stream=True`` returns an ``AsyncStream`` of
+        ``ChatCompletionChunk`` objects instead::
+
+            async for chunk in await cache.chat.completions.create(..., stream=True):
+                print(chunk.choices[0].delta.content or "", end="")
+        """
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "ttl_seconds": ttl_seconds,
+        }
+        payload.update(kwargs)
+        if stream:
+            payload["stream"] = True
+            return AsyncStream(self._client._stream("/v1/chat/completions", json=payload))
+
+        local = self._client.local_cache
+        if local is not None:
+            t0 = time.perf_counter()
+            key = local.key("chat", model, messages)
+            cached = local.get(key)
+            if cached is not None:
+                return ChatCompletion.from_dict(local_hit(cached, t0))
+
+        data = await self._client._post("/v1/chat/completions", json=payload)
+        if local is not None:
+            local.put(key, data, data.get("meta"), ttl_seconds)
+        return ChatCompletion.from_dict(data)
+
+
+class _AsyncChat:
+    """Mirrors openai.AsyncOpenAI().chat namespace."""
+
+    def __init__(self, client: "AsyncSemantisCache"):
+        self.completions = _AsyncCompletions(client)
+
+
+class AsyncSemantisCache:
+    """Async Semantis AI SDK client.
+
+    Drop-in replacement for ``openai.AsyncOpenAI``. One instance holds one
+    ``httpx.AsyncClient`` connection pool (HTTP/2 when the ``h2`` package is
+    installed), so share it across tasks instead of creating one per request.
+
+    Example::
+
+        from semantis import AsyncSemantisCache
+
+        async with AsyncSemantisCache(api_key="sc-myorg-xxxxxxxx") as cache:
+            resp = await cache.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": "What is ML?"}],
+            )
+            print(resp.choices[0].message.content)
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = _DEFAULT_BASE_URL,
+        timeout: float = _DEFAULT_TIMEOUT,
+        max_retries: int = _MAX_RETRIES,
+        http2: bool = True,
+        limits: Optional[httpx.Limits] = None,
+        local_cache: bool = False,
+        local_cache_size: int = 1024,
+    ):
+        """
+        Args:
+            http2: Negotiate HTTP/2 (multiplexes concurrent requests over few
+                connections). Ignored if the ``h2`` package is not installed.
+            limits: Connection pool limits; defaults to 100 connections with
+                20 kept alive for 30s.
+            local_cache: Keep responses in an in-process LRU so repeated
+                prompts are answered without a network round trip.
+            local_cache_size: Maximum number of prompts kept in that LRU.
+        """
+        if not api_key:
+            raise ValueError("api_key is required")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            http2=http2 and _HTTP2_AVAILABLE,
+            limits=limits or _DEFAULT_LIMITS,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "User-Agent": "semantis-python/0.1.0",
+            },
+        )
+        self.local_cache: Optional[LocalCache] = LocalCache(local_cache_size) if local_cache else None
+        self.chat = _AsyncChat(self)
+
+    async def _post(self, path: str, **kwargs) -> dict:
+        """POST with retry + exponential backoff."""
+        last_exc: Optional[Exception] = None
+        for attempt in range(self.max_retries):
+            try:
+                resp = await self._http.post(path, **kwargs)
+                if resp.status_code == 429:
+                    await asyncio.sleep(min(2 ** attempt, 8))
+                    continue
+                resp.raise_for_status()
+                return resp.json()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code >= 500:
+                    last_exc = e
+                    await asyncio.sleep(min(2 ** attempt, 8))
+                    continue
+                raise
+            except (httpx.ConnectError, httpx.ReadTimeout) as e:
+                last_exc = e
+                # Fallback to direct OpenAI if Semantis is unreachable
+                if attempt == self.max_retries - 1:
+                    return await self._openai_fallback(kwargs)
+                await asyncio.sleep(min(2 ** attempt, 8))
+        if last_exc:
+            raise last_exc
+        raise RuntimeError("Request failed after retries")
+
+    async def _stream(self, path: str, **kwargs) -> AsyncIterator[ChatCompletionChunk]:
+        """POST and yield SSE chunks as they arrive; retried like _post until the first byte."""
+        for attempt in range(self.max_retries):
+            async with self._http.stream("POST", path, **kwargs) as resp:
+                if (resp.status_code == 429 or resp.status_code >= 500) and attempt < self.max_retries - 1:
+                    await asyncio.sleep(min(2 ** attempt, 8))
+                    continue
+                if resp.is_error:
+                    await resp.aread()
+                    resp.raise_for_status()
+                async for chunk in aiter_chunks(resp.aiter_lines()):
+                    yield chunk
+                return
+
+    async def _openai_fallback(self, kwargs: dict) -> dict:
+        """When Semantis is unreachable, fall back to direct OpenAI call."""
+        try:
+            import openai as _openai
+            payload = kwargs.get("json", {})
+            client = _openai.AsyncOpenAI()
+            return _openai_response_to_dict(await client.chat.completions.create(**payload))
+        except ImportError:
+            raise RuntimeError(
+                "Semantis API unreachable and openai package not installed for fallback. "
+                "Install with: pip install semantis[openai]"
+            )
+        except Exception as e:
+            raise RuntimeError(f"Both Semantis and OpenAI fallback failed: {e}")
+
+    # ── Convenience methods ──
+
+    async def health(self) -> dict:
+        """Check Semantis API health."""
+        resp = await self._http.get("/health")
+        resp.raise_for_status()
+        return resp.json()
+
+    async def metrics(self) -> dict:
+        """Get cache metrics for the authenticated tenant."""
+        resp = await self._http.get("/metrics")
+        resp.raise_for_status()
+        return resp.json()
+
+    async def close(self):
+        """Close the underlying HTTP client and its connection pool."""
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -3,11 +3,13 @@ Semantis AI Client - OpenAI-compatible interface with automatic semantic caching
 """
 
 import time
-from typing import Optional, List, Dict, Any
+from typing import Iterator, Optional, List, Dict, Any, Union
 
 import httpx
 
-from semantis.models import ChatCompletion
+from semantis.local_cache import LocalCache, local_hit
+from semantis.models import ChatCompletion, ChatCompletionChunk
+from semantis.streaming import Stream, iter_chunks
 
 
 _DEFAULT_BASE_URL = "https://api.semantis.ai"
@@ -28,14 +30,29 @@ class _Completions:
         messages: List[Dict[str, str]],
         temperature: float = 0.2,
         ttl_seconds: int = 604800,
+        stream: bool = False,
         **kwargs,
-    ) -> ChatCompletion:
+    ) -> Union[ChatCompletion, Stream]:
         """Create a chat completion (with automatic semantic caching).
 
         Accepts the same parameters as ``openai.chat.completions.create``.
         Extra kwargs are forwarded to the Semantis API but may be ignored
         if not supported by the current server version.
+
+        With ``stream=True`` returns a ``Stream`` of ``ChatCompletionChunk``
+        objects, parsed as the server sends them::
+
+            for chunk in cache.chat.completions.create(..., stream=True):
+                print(chunk.choices[0].delta.content or "", end="")
         """
+        local = self._client.local_cache
+        if local is not None and not stream:
+            t0 = time.perf_counter()
+            key = local.key("chat", model, messages)
+            cached = local.get(key)
+            if cached is not None:
+                return ChatCompletion.from_dict(local_hit(cached, t0))
+
         payload: Dict[str, Any] = {
             "model": model,
             "messages": messages,
@@ -43,11 +60,40 @@ class _Completions:
             "ttl_seconds": ttl_seconds,
         }
         payload.update(kwargs)
+        if stream:
+            payload["stream"] = True
+            return Stream(self._client._stream("/v1/chat/completions", json=payload))
 
         data = self._client._post("/v1/chat/completions", json=payload)
+        if local is not None:
+            local.put(key, data, data.get("meta"), ttl_seconds)
         return ChatCompletion.from_dict(data)
 
 
+def _openai_response_to_dict(resp) -> dict:
+    """Convert an openai ChatCompletion into the Semantis response shape."""
+    return {
+        "id": resp.id,
+        "object": resp.object,
+        "created": resp.created,
+        "model": resp.model,
+        "choices": [
+            {
+                "index": c.index,
+                "message": {"role": c.message.role, "content": c.message.content},
+                "finish_reason": c.finish_reason,
+            }
+            for c in resp.choices
+        ],
+        "usage": {
+            "prompt_tokens": resp.usage.prompt_tokens if resp.usage else None,
+            "completion_tokens": resp.usage.completion_tokens if resp.usage else None,
+            "total_tokens": resp.usage.total_tokens if resp.usage else None,
+        },
+        "meta": {"hit": "fallback", "similarity": 0.0, "latency_ms": 0, "strategy": "openai_fallback"},
+    }
+
+
 class _Chat:
     """Mirrors openai.chat namespace."""
 
@@ -79,7 +125,16 @@ class SemantisCache:
         base_url: str = _DEFAULT_BASE_URL,
         timeout: float = _DEFAULT_TIMEOUT,
         max_retries: int = _MAX_RETRIES,
+        local_cache: bool = False,
+        local_cache_size: int = 1024,
     ):
+        """
+        Args:
+            local_cache: Also keep responses in an in-process LRU so repeated
+                prompts (same model and messages) are answered without a
+                network round trip, for up to ``ttl_seconds``.
+            local_cache_size: Maximum number of prompts kept in that LRU.
+        """
         if not api_key:
             raise ValueError("api_key is required")
         self.api_key = api_key
@@ -95,6 +150,7 @@ class SemantisCache:
                 "User-Agent": "semantis-python/0.1.0",
             },
         )
+        self.local_cache: Optional[LocalCache] = LocalCache(local_cache_size) if local_cache else None
         self.chat = _Chat(self)
 
     def _post(self, path: str, **kwargs) -> dict:
@@ -125,33 +181,26 @@ class SemantisCache:
             raise last_exc
         raise RuntimeError("Request failed after retries")
 
+    def _stream(self, path: str, **kwargs) -> Iterator[ChatCompletionChunk]:
+        """POST and yield SSE chunks as they arrive; retried like _post until the first byte."""
+        for attempt in range(self.max_retries):
+            with self._http.stream("POST", path, **kwargs) as resp:
+                if (resp.status_code == 429 or resp.status_code >= 500) and attempt < self.max_retries - 1:
+                    time.sleep(min(2 ** attempt, 8))
+                    continue
+                if resp.is_error:
+                    resp.read()
+                    resp.raise_for_status()
+                yield from iter_chunks(resp.iter_lines())
+                return
+
     def _openai_fallback(self, path: str, kwargs: dict) -> dict:
         """When Semantis is unreachable, fall back to direct OpenAI call."""
         try:
             import openai as _openai
             payload = kwargs.get("json", {})
             client = _openai.OpenAI()
-            resp = client.chat.completions.create(**payload)
-            return {
-                "id": resp.id,
-                "object": resp.object,
-                "created": resp.created,
-                "model": resp.model,
-                "choices": [
-                    {
-                        "index": c.index,
-                        "message": {"role": c.message.role, "content": c.message.content},
-                        "finish_reason": c.finish_reason,
-                    }
-                    for c in resp.choices
-                ],
-                "usage": {
-                    "prompt_tokens": resp.usage.prompt_tokens if resp.usage else None,
-                    "completion_tokens": resp.usage.completion_tokens if resp.usage else None,
-                    "total_tokens": resp.usage.total_tokens if resp.usage else None,
-                },
-                "meta": {"hit": "fallback", "similarity": 0.0, "latency_ms": 0, "strategy": "openai_fallback"},
-            }
+            return _openai_response_to_dict(client.chat.completions.create(**payload))
         except ImportError:
             raise RuntimeError(
                 "Semantis API unreachable and openai package not installed for fallback. "
@@ -162,9 +211,19 @@ class SemantisCache:
 
     # ── Convenience methods ──
 
-    def query(self, prompt: str, model: str = "gpt-4o-mini") -> dict:
+    def query(self, prompt: str, model: str = "gpt-4o-mini", ttl_seconds: int = 604800) -> dict:
         """Simple query interface (non-OpenAI-compatible)."""
-        return self._post(f"/query?prompt={httpx.QueryParams({'prompt': prompt, 'model': model})}")
+        local = self.local_cache
+        if local is not None:
+            t0 = time.perf_counter()
+            key = local.key("query", model, [{"role": "user", "content": prompt}])
+            cached = local.get(key)
+            if cached is not None:
+                return local_hit(cached, t0)
+        data = self._post(f"/query?prompt={httpx.QueryParams({'prompt': prompt, 'model': model})}")
+        if local is not None:
+            local.put(key, data, data.get("meta"), ttl_seconds)
+        return data
 
     def health(self) -> dict:
         """Check Semantis API health."""
@@ -0,0 +1,130 @@
+"""In-process L0 cache: repeated prompts are answered without a network round trip.
+
+This module is kept byte-identical in sdk/python (semantis) and
+sdk/python-wrapper (semantis-cache): the two packages are published
+separately and neither depends on the other.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Server decisions that are not backed by a cache entry and must not be reused
+_UNCACHEABLE_HITS = {"fallback", "degraded"}
+
+
+def _norm(text: str) -> str:
+    # Same normalization the server applies for its exact-match tier
+    return " ".join(str(text).strip().split()).lower()
+
+
+def _field(message: Any, name: str) -> str:
+    if isinstance(message, dict):
+        return message.get(name) or ""
+    return getattr(message, name, None) or ""
+
+
+def _answer(response: Any) -> Any:
+    """The answer in a chat completion or query response body (ids, usage and meta vary per call)."""
+    if isinstance(response, dict):
+        choices = response.get("choices")
+        if choices:
+            return _field(choices[0].get("message") or {}, "content")
+        return response.get("answer")
+    return response
+
+
+class LocalCache:
+    """Exact-match LRU of responses, keyed by model and normalized messages.
+
+    Entries live for the request's ``ttl_seconds``, or until the server-side
+    entry expires if the server reports that earlier. When the server
+    identifies the entry it served (``meta.entry_id``), prompts of the same
+    kind and model that resolved to the same entry (e.g. paraphrases that
+    were semantic hits) share one stored response, so a small cache covers
+    every phrasing seen so far. A key that gets another answer for a shared
+    entry (refreshed on the server since) keeps it to itself.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # prompt key -> (expires_at, entry id), in LRU order
+        self._keys: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # entry id -> [response, number of keys pointing at it]
+        self._entries: Dict[str, List[Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, model: str, messages: List[Any]) -> str:
+        parts = [kind, model]
+        for m in messages:
+            parts.append(f"{_field(m, 'role')}:{_norm(_field(m, 'content'))}")
+        return "\x1f".join(parts)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            hit = self._keys.get(key)
+            if hit is not None:
+                expires_at, entry_id = hit
+                if expires_at > time.time():
+                    self._keys.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[entry_id][0]
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: Any, meta: Optional[Dict[str, Any]], ttl_seconds: float) -> None:
+        meta = meta or {}
+        if self.max_entries <= 0 or meta.get("hit") in _UNCACHEABLE_HITS:
+            return
+        expires_at = time.time() + ttl_seconds
+        if meta.get("expires_at"):
+            expires_at = min(expires_at, float(meta["expires_at"]))
+        entry_id = key
+        if meta.get("entry_id"):
+            # Shared only between keys of the same kind and model: "<kind>\x1f<model>\x1f<entry id>"
+            entry_id = "\x1f".join(key.split("\x1f", 2)[:2] + [str(meta["entry_id"])])
+        with self._lock:
+            if key in self._keys:
+                self._drop(key)
+            entry = self._entries.get(entry_id)
+            if entry is not None and _answer(entry[0]) != _answer(response):
+                entry_id, entry = key, None
+            if entry is None:
+                self._entries[entry_id] = [response, 1]
+            else:
+                entry[1] += 1
+            self._keys[key] = (expires_at, entry_id)
+            while len(self._keys) > self.max_entries:
+                self._drop(next(iter(self._keys)))
+
+    def _drop(self, key: str) -> None:
+        _, entry_id = self._keys.pop(key)
+        entry = self._entries[entry_id]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[entry_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "keys": len(self._keys),
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def local_hit(data: Dict[str, Any], t0: float) -> Dict[str, Any]:
+    """A cached response body re-labelled as served by the in-process cache (t0: perf_counter at lookup)."""
+    latency = round((time.perf_counter() - t0) * 1000, 3)
+    return dict(data, meta={"hit": "local", "similarity": 1.0, "latency_ms": latency, "strategy": "local"})
@@ -0,0 +1,91 @@
+"""Streamed chat completions: incremental SSE parsing and OpenAI-style stream objects."""
+
+import json
+from typing import AsyncIterator, Iterator, Optional
+
+from semantis.models import ChatCompletionChunk
+
+
+def parse_sse_line(line: str) -> Optional[dict]:
+    """Payload of one SSE line; None for blank/comment lines, {} for the [DONE] marker."""
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return {}
+    return json.loads(data)
+
+
+def iter_chunks(lines: Iterator[str]) -> Iterator[ChatCompletionChunk]:
+    for line in lines:
+        data = parse_sse_line(line)
+        if data is None:
+            continue
+        if not data:
+            return
+        yield ChatCompletionChunk.from_dict(data)
+
+
+async def aiter_chunks(lines: AsyncIterator[str]) -> AsyncIterator[ChatCompletionChunk]:
+    async for line in lines:
+        data = parse_sse_line(line)
+        if data is None:
+            continue
+        if not data:
+            return
+        yield ChatCompletionChunk.from_dict(data)
+
+
+class Stream:
+    """Iterator of ``ChatCompletionChunk`` read lazily from an open HTTP response.
+
+    Breaking out of the loop (or leaving a ``with`` block) closes the
+    response, so the connection goes back to the pool without reading the
+    rest of the body.
+    """
+
+    def __init__(self, chunks: Iterator[ChatCompletionChunk]):
+        self._chunks = chunks
+
+    def __iter__(self) -> Iterator[ChatCompletionChunk]:
+        return self
+
+    def __next__(self) -> ChatCompletionChunk:
+        return next(self._chunks)
+
+    def close(self) -> None:
+        self._chunks.close()
+
+    def __enter__(self) -> "Stream":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class AsyncStream:
+    """Async counterpart of ``Stream``; use ``async with`` to close early."""
+
+    def __init__(self, chunks: AsyncIterator[ChatCompletionChunk]):
+        self._chunks = chunks
+
+    def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        return self
+
+    async def __anext__(self) -> ChatCompletionChunk:
+        return await self._chunks.__anext__()
+
+    async def close(self) -> None:
+        await self._chunks.aclose()
+
+    async def __aenter__(self) -> "AsyncStream":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()